@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'drf_spectacular',
     'rest_framework_simplejwt',
@@ -58,12 +59,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.PrometheusMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.TrafficCaptureMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -114,6 +121,9 @@ CACHES = {
 
 CACHE_TTL = 60 * 10
 
+# Tag and ingredient suggestions for hot prefixes
+SUGGEST_CACHE_TTL = 30
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -169,10 +179,107 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+
+}
+
+# Keyset pagination for list apis
 
+API_PAGE_SIZE = int(config('API_PAGE_SIZE', default=100))
+API_MAX_PAGE_SIZE = int(config('API_MAX_PAGE_SIZE', default=1000))
+
+# Serialize recipe list and detail responses from values() rows
+API_FAST_READ = bool(int(config('API_FAST_READ', default=1)))
+
+# Most recipes accepted by one bulk create request
+API_MAX_BULK_SIZE = int(config('API_MAX_BULK_SIZE', default=1000))
+
+# Server-Timing header for every request, not only staff, and structured
+# timing logs
+
+SERVER_TIMING = bool(int(config('SERVER_TIMING', default=0)))
+SERVER_TIMING_LOG = bool(int(config('SERVER_TIMING_LOG', default=0)))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.timing.JSONFormatter'},
+    },
+    'handlers': {
+        'json_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['json_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.querybudget': {
+            'handlers': ['json_console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
+# Queries slower than SLOW_QUERY_MS are stored, a sample with their plan,
+# 0 turns the log off
+
+SLOW_QUERY_MS = float(config('SLOW_QUERY_MS', default=1000))
+SLOW_QUERY_EXPLAIN_RATE = float(
+    config('SLOW_QUERY_EXPLAIN_RATE', default=0.1))
+SLOW_QUERY_MAX_PENDING = int(config('SLOW_QUERY_MAX_PENDING', default=100))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(
+    config('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', default=30000))
+
+# Requests over the query_budget of their view log a warning, or fail
+# in strict mode
+
+QUERY_BUDGETS = bool(int(config('QUERY_BUDGETS', default=1)))
+QUERY_BUDGET_STRICT = bool(int(config('QUERY_BUDGET_STRICT', default=0)))
+
+# Staff requests with an X-Profile header or profile param are sampled
+# and stored as flame graph stacks
+
+PROFILING = bool(int(config('PROFILING', default=1)))
+PROFILING_INTERVAL_MS = float(config('PROFILING_INTERVAL_MS', default=1))
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Clients allowed to read /metrics. Scrapes go through the proxy, which
+# only lets METRICS_ALLOWED_CIDR through and passes the client address
+# on. Only localhost by default, set both to the network of the
+# Prometheus server, as requests through a load balancer or the docker
+# network come from private addresses too.
+
+METRICS_ALLOWED_NETWORKS = config(
+    'METRICS_ALLOWED_NETWORKS', default='127.0.0.1/32').split(',')
+
+# Opt in sampling of requests to rotating JSONL files for replay_traffic
+
+TRAFFIC_CAPTURE_RATE = float(config('TRAFFIC_CAPTURE_RATE', default=0))
+TRAFFIC_CAPTURE_PATH = config(
+    'TRAFFIC_CAPTURE_PATH',
+    default=str(BASE_DIR / 'capture' / 'traffic-{pid}.jsonl'),
+)
+TRAFFIC_CAPTURE_MAX_BYTES = int(
+    config('TRAFFIC_CAPTURE_MAX_BYTES', default=50 * 1024 * 1024))
+TRAFFIC_CAPTURE_BACKUPS = int(config('TRAFFIC_CAPTURE_BACKUPS', default=5))
+TRAFFIC_CAPTURE_MAX_BODY = int(
+    config('TRAFFIC_CAPTURE_MAX_BODY', default=64 * 1024))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -49,3 +49,17 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    """
+    Define admin pages for slow queries
+    """
+    ordering = ['-created_at']
+    list_display = ['created_at', 'view', 'duration_ms', 'fingerprint']
+    list_filter = ['view']
+    readonly_fields = [
+        'created_at', 'view', 'duration_ms', 'fingerprint', 'sql', 'plan']
+
+
+admin.site.register(models.SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,176 @@
+"""
+Helpers for load generation, latency statistics and baselines
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Lower is better for every measure except throughput
+MEASURES = {
+    'p50': -1,
+    'p95': -1,
+    'p99': -1,
+    'queries': -1,
+    'throughput': 1,
+}
+
+# Upper bounds in ms of the latency histogram buckets
+HISTOGRAM_BOUNDS = [
+    1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, math.inf]
+
+
+def percentile(values, pct):
+    """
+    Return the nearest rank percentile of sorted values
+    """
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize(samples, elapsed):
+    """
+    Return latency percentiles in ms, throughput and queries per request
+
+    Each sample is a (seconds, queries, ok) tuple of one request.
+    """
+    timings = sorted(seconds * 1000 for seconds, queries, ok in samples)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': sum(not ok for seconds, queries, ok in samples),
+        'p50': round(percentile(timings, 50), 3),
+        'p95': round(percentile(timings, 95), 3),
+        'p99': round(percentile(timings, 99), 3),
+        'mean': round(sum(timings) / count, 3) if count else 0.0,
+        'throughput': round(count / elapsed, 2) if elapsed else 0.0,
+        'queries': round(
+            sum(queries for seconds, queries, ok in samples) / count, 2)
+        if count else 0.0,
+    }
+
+
+def histogram(timings, bounds=HISTOGRAM_BOUNDS):
+    """
+    Return (upper bound, count) of every bucket of latencies in ms
+    """
+    counts = [0] * len(bounds)
+    for value in timings:
+        counts[bisect.bisect_left(bounds, value)] += 1
+    return list(zip(bounds, counts))
+
+
+def measure(func, *args):
+    """
+    Run one request and return its sample
+
+    func returns whether the request succeeded.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        ok = func(*args)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries), ok
+
+
+def run_load(func, requests, concurrency, make_state=None):
+    """
+    Call func(state, index) `requests` times from concurrent threads
+
+    Every thread gets its own state, such as an api client, and its own
+    database connection. With a concurrency of 1 the requests run inline
+    on the calling thread and its connection. Returns the samples and the
+    wall clock seconds of the run.
+    """
+    samples = []
+    indexes = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker(close):
+        state = make_state() if make_state else None
+        try:
+            while True:
+                with lock:
+                    index = next(indexes, None)
+                if index is None:
+                    return
+                sample = measure(func, state, index)
+                with lock:
+                    samples.append(sample)
+        finally:
+            if close:
+                connection.close()
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        worker(close=False)
+    else:
+        threads = [
+            threading.Thread(target=worker, args=(True,))
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return samples, time.perf_counter() - start
+
+
+def load_baseline(path):
+    """
+    Return the results stored in a baseline file, or None
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, baseline):
+    """
+    Atomically write a baseline file
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
+    os.replace(f'{path}.tmp', path)
+
+
+def compare(baseline, results, threshold, min_delta=1.0):
+    """
+    Return (name, measure, before, after) of results worse than baseline
+
+    A measure regresses when it is more than `threshold` (a fraction)
+    worse than the baseline. Latencies must also be `min_delta` ms
+    slower, so jitter of sub millisecond routes is not flagged. Query
+    counts barely vary between runs, so half an extra query per request
+    on average is already a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for measure_name, direction in MEASURES.items():
+            old, new = before.get(measure_name), result.get(measure_name)
+            if old is None or new is None:
+                continue
+            if measure_name == 'queries':
+                worse = new - old >= 0.5
+            elif direction < 0:
+                worse = new > max(old * (1 + threshold), old + min_delta)
+            else:
+                worse = new < old * (1 - threshold)
+            if worse:
+                regressions.append((name, measure_name, old, new))
+    return regressions
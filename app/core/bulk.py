@@ -0,0 +1,49 @@
+"""
+Helpers for loading rows in bulk
+"""
+import csv
+import io
+from decimal import Decimal
+
+from core.models import Recipe
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Load rows into a table with a single COPY
+
+    Every value is quoted, so empty strings stay empty strings. Columns
+    left out of `columns` get their default.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def create_recipes(user, count, tags=(), ingredients=(), title='Recipe',
+                   **params):
+    """
+    Bulk create recipes linked to every given tag and ingredient
+    """
+    defaults = {
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    recipes = Recipe.objects.bulk_create([
+        Recipe(created_by=user, title=f'{title} {i}', **defaults)
+        for i in range(count)
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags
+    ])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(recipe=recipe, ingredient=ingredient)
+        for recipe in recipes for ingredient in ingredients
+    ])
+    return recipes
@@ -2,6 +2,8 @@ from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
 from django.core.cache import caches
 
+from core import metrics, timing
+
 
 class CacheMixin:
     """
@@ -38,10 +40,17 @@ class Cache:
         self.key = key
 
     def get(self):
-        return self.cache.get(self.key)
+        with timing.timed('cache'):
+            value = self.cache.get(self.key)
+        result = 'miss' if value is None else 'hit'
+        timing.record(f'cache_{result}')
+        metrics.CACHE_REQUESTS.labels('default', result).inc()
+        return value
 
     def set(self, value, timeout=300):
-        self.cache.set(self.key, value, timeout)
+        with timing.timed('cache'):
+            self.cache.set(self.key, value, timeout)
 
     def clear_cache(self):
-        self.cache.delete_many(keys=self.cache.keys(self.key))
+        with timing.timed('cache'):
+            self.cache.delete_many(keys=self.cache.keys(self.key))
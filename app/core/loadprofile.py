@@ -0,0 +1,123 @@
+"""
+Load profiles built from the Thunder Client collection
+"""
+import json
+import os
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+VARIABLE_RE = re.compile(r'{{\s*([\w.-]+)\s*}}')
+TOKEN_PATH = '/api/user/token/create/'
+
+
+def substitute(value, variables):
+    """
+    Replace {{name}} placeholders, leaving unknown names untouched
+    """
+    if isinstance(value, str):
+        return VARIABLE_RE.sub(
+            lambda match: str(variables.get(match[1], match[0])), value)
+    if isinstance(value, dict):
+        return {key: substitute(item, variables)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    return value
+
+
+def _read(directory, name, default):
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return default
+    with open(path) as file:
+        return json.load(file) or default
+
+
+def _enabled(items):
+    return [item for item in items or [] if not item.get('isDisabled')]
+
+
+def _body(body):
+    """
+    Return the body type and payload of a Thunder Client request body
+    """
+    body = body or {}
+    kind = body.get('type', 'none')
+    if kind in ('formdata', 'formencoded'):
+        return 'form', {
+            item['name']: item.get('value', '')
+            for item in _enabled(body.get('form'))
+        }
+    if kind == 'json':
+        return 'json', json.loads(body['raw']) if body.get('raw') else None
+    if body.get('raw'):
+        return 'raw', body['raw']
+    return 'none', None
+
+
+def _key(request):
+    return request['method'].upper(), request['url']
+
+
+def load_thunder_collection(directory, environment=None):
+    """
+    Convert a Thunder Client collection directory to a load profile
+
+    Every request becomes a weighted entry of the profile. Weights count
+    how often a request was run by hand in the activity history, so the
+    profile follows the real traffic mix, and are 1 without history.
+    The token request also becomes the profile's login.
+    """
+    requests = _read(directory, 'thunderclient.json', [])
+    if not requests:
+        raise ValueError(f'No requests in {directory}')
+    collections = {
+        collection['_id']: collection['colName']
+        for collection in _read(directory, 'thunderCollection.json', [])
+    }
+    environments = _read(directory, 'thunderEnvironment.json', [])
+    chosen = [
+        env for env in environments
+        if env['name'] == environment
+        or (environment is None and env.get('default'))
+    ]
+    if environment and not chosen:
+        raise ValueError(f'Unknown environment {environment}')
+    variables = {
+        item['name']: item['value']
+        for env in chosen[:1] for item in _enabled(env.get('data'))
+    }
+    activity = Counter(
+        _key(request) for request in _read(
+            directory, 'thunderActivity.json', []))
+
+    profile = {'base_url': variables.get('url'), 'login': None,
+               'requests': []}
+    for request in sorted(requests, key=lambda item: item.get('sortNum', 0)):
+        url = urlsplit(substitute(request['url'], variables))
+        path = url.path + (f'?{url.query}' if url.query else '')
+        body_type, body = _body(request.get('body'))
+        headers = {
+            item['name']: substitute(item['value'], variables)
+            for item in _enabled(request.get('headers'))
+        }
+        auth = request.get('auth') or {}
+        if auth.get('type') == 'bearer' and auth.get('bearer'):
+            headers['Authorization'] = 'Bearer ' + substitute(
+                auth['bearer'], variables)
+        entry = {
+            'name': request['name'],
+            'collection': collections.get(request.get('colId')),
+            'method': request['method'].upper(),
+            'path': path,
+            'headers': headers,
+            'body_type': body_type,
+            'body': substitute(body, variables),
+            'weight': activity[_key(request)] or 1,
+        }
+        if url.path == TOKEN_PATH and profile['login'] is None:
+            profile['login'] = {
+                key: entry[key] for key in ['path', 'body_type', 'body']}
+        profile['requests'].append(entry)
+    return profile
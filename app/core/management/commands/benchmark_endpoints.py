@@ -0,0 +1,401 @@
+"""
+Django command to benchmark every api endpoint under concurrent load
+"""
+
+import io
+import os
+import tempfile
+import uuid
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.benchmark import (
+    compare,
+    load_baseline,
+    run_load,
+    save_baseline,
+    summarize,
+)
+from core.bulk import create_recipes
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+# `client` names the user of the request, None for anonymous requests.
+# `requests(count)` returns the path and payload of every request and
+# runs any setup, such as creating the recipes to delete, untimed.
+Scenario = namedtuple(
+    'Scenario', ['name', 'method', 'client', 'status', 'requests', 'format'],
+    defaults=['json'],
+)
+
+WRITER_EMAIL = 'benchmark-endpoints@example.com'
+WRITER_PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    """
+    Drive every api route concurrently and compare against a baseline
+    """
+    help = (
+        'Benchmark every api route with a local concurrent load generator. '
+        'Seeds the database up to the chosen scale, records p50/p95/p99 '
+        'latency, throughput and queries per request, and compares them '
+        'with the stored baseline. Exits with an error on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Users seeded when the database has too few recipes')
+        parser.add_argument(
+            '--recipes', type=int, default=100000,
+            help='Recipes the database should hold before benchmarking')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of the generated data')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Measured requests per route')
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Unmeasured requests per route before measuring')
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Threads sending requests, each with its own connection')
+        parser.add_argument(
+            '--scenarios', nargs='*',
+            help='Only run routes whose name starts with one of these')
+        parser.add_argument(
+            '--baseline', default=os.path.join('benchmarks', 'endpoints.json'),
+            help='JSON file of the baseline results')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Fraction a measure may worsen before it is a regression')
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Milliseconds a latency must also worsen by to regress')
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Store the results as the new baseline')
+
+    def _seed(self, options):
+        """
+        Generate recipes until the database holds the chosen number
+        """
+        missing = options['recipes'] - Recipe.objects.count()
+        if missing > 0:
+            call_command(
+                'seed_data',
+                users=options['users'],
+                recipes=missing,
+                seed=options['seed'],
+                stdout=self.stdout,
+            )
+
+    def _get_users(self):
+        """
+        Return the user with the most recipes and a user for writes
+        """
+        top = Recipe.objects.values('created_by').annotate(
+            count=Count('id')).order_by('-count').first()
+        if top is None:
+            raise CommandError('There are no recipes to benchmark')
+        reader = get_user_model().objects.get(pk=top['created_by'])
+        writer = get_user_model().objects.filter(email=WRITER_EMAIL).first()
+        if writer:
+            # Left over by an interrupted run
+            writer.delete()
+        writer = get_user_model().objects.create_user(
+            email=WRITER_EMAIL,
+            password=WRITER_PASSWORD,
+            name='Benchmark',
+        )
+        return reader, writer
+
+    def _most_used(self, model, user):
+        """
+        Return the name of the item of a user linked to most recipes
+        """
+        item = model.objects.filter(created_by=user).annotate(
+            count=Count('recipe')).order_by('-count', 'id').first()
+        return item.name if item else 'missing'
+
+    def _image(self):
+        """
+        Return the bytes of a small JPEG
+        """
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def _create_recipes(self, user, count):
+        return create_recipes(user, count, title='Benchmark recipe')
+
+    def _create_items(self, model, user, count):
+        prefix = f'Benchmark {model._meta.model_name} {uuid.uuid4().hex}'
+        return model.objects.bulk_create([
+            model(created_by=user, name=f'{prefix} {i}')
+            for i in range(count)
+        ])
+
+    def _get_scenarios(self, reader, writer):
+        """
+        Return a scenario for every api route
+        """
+        recipe_uuids = list(Recipe.objects.filter(
+            created_by=reader).order_by('-id').values_list(
+                'uuid', flat=True)[:100])
+        tag = self._most_used(Tag, reader)
+        ingredient = self._most_used(Ingredient, reader)
+        image = self._image()
+        refresh = str(RefreshToken.for_user(writer))
+
+        def repeat(path, data=None):
+            return lambda count: [(path, data)] * count
+
+        def recipe_url(recipe_uuid, name='recipe-detail'):
+            return reverse(f'recipe:{name}', args=[recipe_uuid])
+
+        def each(objects, path, data=lambda i: None):
+            return lambda count: [
+                (path(obj), data(i))
+                for i, obj in enumerate(objects(count))
+            ]
+
+        recipes = reverse('recipe:recipe-list')
+        recipe = {
+            'title': 'Benchmark curry',
+            'time_minutes': 30,
+            'price': '7.50',
+            'description': 'Rice and lentils',
+            'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}],
+            'ingredients': [{'name': 'Rice'}, {'name': 'Lentils'}],
+        }
+        scenarios = [
+            Scenario('health-check', 'get', None, status.HTTP_200_OK,
+                     repeat(reverse('health-check'))),
+            Scenario(
+                'user-create', 'post', None, status.HTTP_201_CREATED,
+                lambda count: [(reverse('user:create'), {
+                    'email': f'{self.user_prefix}{i}@example.com',
+                    'password': WRITER_PASSWORD,
+                    'name': 'Benchmark',
+                }) for i in range(count)]),
+            Scenario('user-token-create', 'post', None, status.HTTP_200_OK,
+                     repeat(reverse('user:token-create'), {
+                         'email': WRITER_EMAIL, 'password': WRITER_PASSWORD})),
+            Scenario('user-token-refresh', 'post', None, status.HTTP_200_OK,
+                     repeat(reverse('user:token-refresh'),
+                            {'refresh': refresh})),
+            Scenario('user-token-verify', 'post', None, status.HTTP_200_OK,
+                     repeat(reverse('user:token-verify'),
+                            {'token': refresh})),
+            Scenario('user-self', 'get', 'reader', status.HTTP_200_OK,
+                     repeat(reverse('user:self'))),
+            Scenario('user-self-update', 'patch', 'writer', status.HTTP_200_OK,
+                     repeat(reverse('user:self'), {'name': 'Benchmark'})),
+            Scenario('recipe-list', 'get', 'reader', status.HTTP_200_OK,
+                     repeat(recipes)),
+            Scenario('recipe-list-tags', 'get', 'reader', status.HTTP_200_OK,
+                     repeat(recipes, {'tags': tag})),
+            Scenario('recipe-list-ingredients', 'get', 'reader',
+                     status.HTTP_200_OK,
+                     repeat(recipes, {'ingredients': ingredient})),
+            Scenario('recipe-list-search', 'get', 'reader',
+                     status.HTTP_200_OK, repeat(recipes, {'search': 'curry'})),
+            Scenario('recipe-list-fields', 'get', 'reader', status.HTTP_200_OK,
+                     repeat(recipes, {'fields': 'uuid,title'})),
+            Scenario('recipe-detail', 'get', 'reader', status.HTTP_200_OK,
+                     lambda count: [
+                         (recipe_url(recipe_uuids[i % len(recipe_uuids)]),
+                          None)
+                         for i in range(count)
+                     ]),
+            Scenario('recipe-create', 'post', 'writer',
+                     status.HTTP_201_CREATED, repeat(recipes, recipe)),
+            Scenario('recipe-bulk-create', 'post', 'writer',
+                     status.HTTP_201_CREATED,
+                     repeat(reverse('recipe:recipe-bulk'), [recipe] * 10)),
+            Scenario('recipe-update', 'put', 'writer', status.HTTP_200_OK,
+                     each(lambda count: self._create_recipes(writer, count),
+                          lambda obj: recipe_url(obj.uuid),
+                          lambda i: recipe)),
+            Scenario('recipe-partial-update', 'patch', 'writer',
+                     status.HTTP_200_OK,
+                     each(lambda count: self._create_recipes(writer, count),
+                          lambda obj: recipe_url(obj.uuid),
+                          lambda i: {'title': f'Benchmark {i}'})),
+            Scenario('recipe-delete', 'delete', 'writer',
+                     status.HTTP_204_NO_CONTENT,
+                     each(lambda count: self._create_recipes(writer, count),
+                          lambda obj: recipe_url(obj.uuid))),
+            Scenario('recipe-upload-image', 'post', 'writer',
+                     status.HTTP_200_OK,
+                     each(lambda count: self._create_recipes(writer, count),
+                          lambda obj: recipe_url(
+                              obj.uuid, 'recipe-upload-image'),
+                          lambda i: {'image': SimpleUploadedFile(
+                              'image.jpg', image, 'image/jpeg')}),
+                     'multipart'),
+        ]
+        for model, name in [(Tag, tag), (Ingredient, ingredient)]:
+            item = model._meta.model_name
+            url = reverse(f'recipe:{item}-list')
+            scenarios += [
+                Scenario(f'{item}-list', 'get', 'reader', status.HTTP_200_OK,
+                         repeat(url)),
+                Scenario(f'{item}-suggest', 'get', 'reader',
+                         status.HTTP_200_OK,
+                         repeat(reverse(f'recipe:{item}-suggest'),
+                                {'q': name[:4]})),
+                Scenario(
+                    f'{item}-update', 'patch', 'writer', status.HTTP_200_OK,
+                    each(lambda count, model=model: self._create_items(
+                        model, writer, count),
+                        lambda obj, item=item: reverse(
+                            f'recipe:{item}-detail', args=[obj.uuid]),
+                        lambda i: {'name': f'Benchmark {uuid.uuid4().hex}'})),
+                Scenario(
+                    f'{item}-delete', 'delete', 'writer',
+                    status.HTTP_204_NO_CONTENT,
+                    each(lambda count, model=model: self._create_items(
+                        model, writer, count),
+                        lambda obj, item=item: reverse(
+                            f'recipe:{item}-detail', args=[obj.uuid]))),
+            ]
+        return scenarios
+
+    def _run(self, scenario, users, requests, warmup, concurrency):
+        """
+        Warm up and measure one scenario, returning its summary
+        """
+        items = scenario.requests(warmup + requests)
+        self.errors = []
+
+        def make_clients():
+            clients = {None: APIClient()}
+            for name, user in users.items():
+                token = RefreshToken.for_user(user).access_token
+                clients[name] = APIClient()
+                clients[name].credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            return clients
+
+        def send(clients, index):
+            path, data = items[index]
+            response = getattr(clients[scenario.client], scenario.method)(
+                path, data, format=scenario.format)
+            if response.status_code != scenario.status:
+                self.errors.append(response)
+                return False
+            return True
+
+        run_load(send, warmup, 1, make_clients)
+        samples, elapsed = run_load(
+            lambda clients, index: send(clients, warmup + index),
+            requests, concurrency, make_clients)
+        if self.errors:
+            response = self.errors[0]
+            self.stderr.write(
+                f'{scenario.name}: {len(self.errors)} unexpected responses, '
+                f'first {response.status_code} {response.content[:200]!r}')
+        return summarize(samples, elapsed)
+
+    def _write_results(self, results, regressions):
+        self.stdout.write('{:<25} {:>6} {:>9} {:>9} {:>9} {:>8} {:>7}'.format(
+            'route', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s',
+            'queries'))
+        flagged = {}
+        for name, measure, before, after in regressions:
+            flagged.setdefault(name, []).append(measure)
+        for name, result in results.items():
+            line = '{:<25} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>8.1f} {:>7.2f}'
+            line = line.format(
+                name, result['errors'], result['p50'], result['p95'],
+                result['p99'], result['throughput'], result['queries'])
+            if name in flagged:
+                line += ' REGRESSED ' + ', '.join(flagged[name])
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        self._seed(options)
+        reader, writer = self._get_users()
+        self.user_prefix = f'benchmark-{uuid.uuid4().hex[:12]}-'
+        media_root = tempfile.TemporaryDirectory()
+        results = {}
+        try:
+            # Requests are built by the test client, uploads go to a
+            # temporary directory
+            with override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    MEDIA_ROOT=media_root.name):
+                for scenario in self._get_scenarios(reader, writer):
+                    if options['scenarios'] and not scenario.name.startswith(
+                            tuple(options['scenarios'])):
+                        continue
+                    results[scenario.name] = self._run(
+                        scenario,
+                        {'reader': reader, 'writer': writer},
+                        options['requests'],
+                        options['warmup'],
+                        options['concurrency'],
+                    )
+        finally:
+            get_user_model().objects.filter(
+                email__startswith=self.user_prefix).delete()
+            writer.delete()
+            media_root.cleanup()
+
+        meta = {
+            'recipes': Recipe.objects.count(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'created_at': timezone.now().isoformat(),
+        }
+        baseline = load_baseline(options['baseline'])
+        regressions = []
+        if baseline and not options['save']:
+            for key in ['recipes', 'requests', 'concurrency']:
+                if baseline['meta'].get(key) != meta[key]:
+                    self.stderr.write(
+                        f'Baseline {key} was {baseline["meta"].get(key)}, '
+                        f'now {meta[key]}, results may not be comparable')
+            regressions = compare(
+                baseline['results'], results, options['threshold'],
+                options['min_delta'])
+
+        self._write_results(results, regressions)
+
+        if baseline is None or options['save']:
+            save_baseline(options['baseline'], {
+                'meta': meta,
+                'results': {**(baseline or {}).get('results', {}), **results},
+            })
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved baseline to {options["baseline"]}'))
+        elif regressions:
+            for name, measure, before, after in regressions:
+                self.stderr.write(
+                    f'{name}: {measure} regressed from {before} to {after}')
+            raise CommandError(
+                f'{len(regressions)} regressions beyond '
+                f'{options["threshold"]:.0%} of {options["baseline"]}')
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions'))
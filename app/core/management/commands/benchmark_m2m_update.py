@@ -0,0 +1,133 @@
+"""
+Django command to benchmark recipe tag/ingredient updates
+"""
+
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+class RowCounter:
+    """
+    Database execute wrapper counting statements and written rows
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        if sql.lstrip().upper().startswith(('INSERT', 'DELETE', 'UPDATE')):
+            self.rows += max(context['cursor'].rowcount, 0)
+        return result
+
+
+class Command(BaseCommand):
+    """
+    Compare clear-and-re-add against diff based many to many updates
+    """
+    help = (
+        'Benchmark replacing one tag and one ingredient on large recipes. '
+        'Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--items', type=int, default=30,
+            help='Tags and ingredients linked to the recipe')
+        parser.add_argument(
+            '--rounds', type=int, default=50,
+            help='Updates to run for each strategy')
+
+    def _clear_and_add(self, recipe, tags, ingredients):
+        """
+        Previous update strategy, rewriting every link
+        """
+        recipe.tags.clear()
+        for tag in tags:
+            recipe.tags.add(tag)
+        recipe.ingredients.clear()
+        for ingredient in ingredients:
+            recipe.ingredients.add(ingredient)
+
+    def _diff(self, recipe, tags, ingredients):
+        """
+        Current update strategy, only touching changed links
+        """
+        recipe.tags.set(tags)
+        recipe.ingredients.set(ingredients)
+
+    def _run(self, strategy, recipe, variants, rounds):
+        """
+        Apply alternating link sets and return the measurements
+        """
+        counter = RowCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for i in range(rounds):
+                strategy(recipe, *variants[i % 2])
+        elapsed = time.perf_counter() - start
+        return elapsed, counter
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        items, rounds = options['items'], options['rounds']
+
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark-m2m@example.com',
+                password=None,
+            )
+            recipe = Recipe.objects.create(
+                created_by=user,
+                title='Benchmark recipe',
+                time_minutes=10,
+                price=Decimal('1.00'),
+            )
+            tags = Tag.objects.bulk_create([
+                Tag(created_by=user, name=f'Tag {i}')
+                for i in range(items + 1)
+            ])
+            ingredients = Ingredient.objects.bulk_create([
+                Ingredient(created_by=user, name=f'Ingredient {i}')
+                for i in range(items + 1)
+            ])
+            # Each round swaps the last tag and ingredient for another
+            variants = [
+                (tags[:items], ingredients[:items]),
+                (tags[:items - 1] + tags[items:],
+                 ingredients[:items - 1] + ingredients[items:]),
+            ]
+            self._diff(recipe, *variants[1])
+
+            for name, strategy in [
+                ('clear-and-add', self._clear_and_add),
+                ('diff', self._diff),
+            ]:
+                elapsed, counter = self._run(
+                    strategy, recipe, variants, rounds)
+                self.stdout.write(
+                    '{:<14} {:>8.2f} ms/update {:>6.1f} queries/update '
+                    '{:>6.1f} rows written/update'.format(
+                        name,
+                        elapsed * 1000 / rounds,
+                        counter.queries / rounds,
+                        counter.rows / rounds,
+                    ))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
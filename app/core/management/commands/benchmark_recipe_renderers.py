@@ -0,0 +1,165 @@
+"""
+Django command to benchmark JSON rendering of recipe endpoints
+"""
+
+import io
+import json
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.bulk import create_recipes
+from core.models import (
+    Tag,
+    Ingredient,
+)
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """
+    Compare the stdlib JSON renderer and parser against the fast ones
+    """
+    help = (
+        'Benchmark recipe list and detail responses with each JSON '
+        'renderer. Runs inside a transaction that is rolled back.'
+    )
+    strategies = [
+        ('stdlib', JSONRenderer, JSONParser),
+        ('fast', FastJSONRenderer, FastJSONParser),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1000,
+            help='Recipes in the list response')
+        parser.add_argument(
+            '--rounds', type=int, default=20,
+            help='Requests of each endpoint per renderer')
+
+    def _create_data(self, rows):
+        """
+        Bulk create recipes linked to a few tags and ingredients
+        """
+        user = get_user_model().objects.create_user(
+            email='benchmark-renderers@example.com',
+            password=None,
+        )
+        tags = Tag.objects.bulk_create([
+            Tag(created_by=user, name=f'Tag {i}') for i in range(3)])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(created_by=user, name=f'Ingredient {i}')
+            for i in range(3)
+        ])
+        recipes = create_recipes(
+            user, rows, tags, ingredients,
+            description='Benchmark recipe ' * 20,
+            link='http://example.com/recipe.pdf',
+        )
+        return user, recipes[0]
+
+    def _time(self, func, rounds):
+        """
+        Return the median run of a function in milliseconds
+        """
+        timings = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    def _request(self, view, user, path, params=None, **kwargs):
+        """
+        Return a function running a rendered request against a view
+        """
+        factory = APIRequestFactory()
+
+        def run():
+            request = factory.get(path, params)
+            force_authenticate(request, user=user)
+            response = view(request, **kwargs)
+            response.render()
+            return response
+
+        return run
+
+    def _default_calls(self, data):
+        """
+        Return the types the fast renderer hands to default=, by count
+        """
+        calls = Counter()
+
+        class Encoder(FastJSONRenderer.encoder_class):
+            def default(self, obj):
+                calls[type(obj).__name__] += 1
+                return super().default(obj)
+
+        class Renderer(FastJSONRenderer):
+            encoder_class = Encoder
+
+        Renderer().render(data)
+        return calls
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        rows, rounds = options['rows'], options['rounds']
+
+        # Requests are built by the test request factory
+        with override_settings(ALLOWED_HOSTS=['testserver']), \
+                transaction.atomic():
+            user, recipe = self._create_data(rows)
+            results = {}
+            for name, renderer, parser in self.strategies:
+                list_view = RecipeViewSet.as_view(
+                    {'get': 'list'}, renderer_classes=[renderer])
+                detail_view = RecipeViewSet.as_view(
+                    {'get': 'retrieve'}, renderer_classes=[renderer])
+                list_request = self._request(
+                    list_view, user, reverse('recipe:recipe-list'),
+                    {'page_size': rows})
+                data = list_request().data
+                body = json.dumps(data['results']).encode()
+                if renderer is FastJSONRenderer:
+                    default_calls = self._default_calls(data)
+                results[name] = {
+                    'list': self._time(list_request, rounds),
+                    'detail': self._time(self._request(
+                        detail_view, user,
+                        reverse('recipe:recipe-detail', args=[recipe.uuid]),
+                        uuid=str(recipe.uuid),
+                    ), rounds),
+                    'render': self._time(
+                        lambda: renderer().render(data), rounds),
+                    'parse': self._time(
+                        lambda: parser().parse(io.BytesIO(body)), rounds),
+                }
+
+            self.stdout.write('{:<8} {:>10} {:>10} {:>8}'.format(
+                'ms', 'stdlib', 'fast', 'speedup'))
+            for measure in ['list', 'detail', 'render', 'parse']:
+                before = results['stdlib'][measure]
+                after = results['fast'][measure]
+                self.stdout.write('{:<8} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(
+                    measure, before, after, before / after))
+            self.stdout.write('default= calls per list: {}'.format(
+                ', '.join(
+                    f'{count} {name}'
+                    for name, count in default_calls.most_common())
+                or 'none'))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
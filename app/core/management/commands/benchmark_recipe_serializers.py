@@ -0,0 +1,122 @@
+"""
+Django command to benchmark recipe list serialization
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from core.bulk import create_recipes
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeReadSerializer,
+)
+
+
+class Command(BaseCommand):
+    """
+    Compare RecipeSerializer against the values() based read serializer
+    """
+    help = (
+        'Benchmark serializing a large recipe list response. '
+        'Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=10000,
+            help='Recipes in the response')
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Tags and ingredients linked to each recipe')
+        parser.add_argument(
+            '--rounds', type=int, default=3,
+            help='Runs of each strategy, the fastest is reported')
+
+    def _create_data(self, rows, items):
+        """
+        Bulk create recipes linked to a few tags and ingredients
+        """
+        user = get_user_model().objects.create_user(
+            email='benchmark-serializers@example.com',
+            password=None,
+        )
+        tags = Tag.objects.bulk_create([
+            Tag(created_by=user, name=f'Tag {i}') for i in range(items)])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(created_by=user, name=f'Ingredient {i}')
+            for i in range(items)
+        ])
+        create_recipes(
+            user, rows, tags, ingredients,
+            description='Benchmark recipe',
+            link='http://example.com/recipe.pdf',
+        )
+        return user
+
+    def _model_serializer(self, user):
+        """
+        Serialize model instances with RecipeSerializer
+        """
+        recipes = Recipe.objects.filter(created_by=user).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredients', queryset=Ingredient.objects.order_by('id')),
+        ).order_by('-id')
+        return RecipeSerializer(recipes, many=True).data
+
+    def _read_serializer(self, user):
+        """
+        Serialize values() rows with RecipeReadSerializer
+        """
+        serializer = RecipeReadSerializer(RecipeSerializer)
+        rows = Recipe.objects.filter(created_by=user).order_by(
+            '-id').values('id', *serializer.columns)
+        return serializer.to_representation(list(rows))
+
+    def _time(self, strategy, user, rounds):
+        """
+        Return the fastest run in seconds and the serialized data
+        """
+        timings = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            data = strategy(user)
+            timings.append(time.perf_counter() - start)
+        return min(timings), data
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        rows, rounds = options['rows'], options['rounds']
+
+        with transaction.atomic():
+            user = self._create_data(rows, options['items'])
+            model_time, model_data = self._time(
+                self._model_serializer, user, rounds)
+            read_time, read_data = self._time(
+                self._read_serializer, user, rounds)
+
+            for name, elapsed in [
+                ('serializer', model_time),
+                ('values', read_time),
+            ]:
+                self.stdout.write('{:<11} {:>9.1f} ms {:>7.2f} us/row'.format(
+                    name, elapsed * 1000, elapsed * 1000000 / rows))
+            self.stdout.write('speedup     {:>9.1f}x'.format(
+                model_time / read_time))
+            if list(model_data) != read_data:
+                self.stderr.write('Outputs differ')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
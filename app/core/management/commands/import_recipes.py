@@ -0,0 +1,340 @@
+"""
+Django command to import recipes from a JSONL file
+"""
+
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.bulk import copy_rows
+from recipe.serializers import RecipeDetailSerializer
+
+# Recipes without a uuid get one derived from the file name and line, so
+# importing a line twice never creates a second recipe.
+IMPORT_NAMESPACE = uuid.UUID('e67f260b-4c71-4582-98e5-769c5381b5dc')
+
+STAGING_SQL = """
+CREATE TEMPORARY TABLE IF NOT EXISTS import_recipe (
+    line integer,
+    uuid uuid,
+    user_id bigint,
+    title text,
+    description text,
+    time_minutes integer,
+    price numeric(5, 2),
+    link text
+);
+CREATE TEMPORARY TABLE IF NOT EXISTS import_recipe_tag (
+    line integer,
+    recipe_uuid uuid,
+    user_id bigint,
+    name text
+);
+CREATE TEMPORARY TABLE IF NOT EXISTS import_recipe_ingredient (
+    LIKE import_recipe_tag
+);
+TRUNCATE import_recipe, import_recipe_tag, import_recipe_ingredient;
+"""
+
+MERGE_ITEMS_SQL = """
+INSERT INTO {table} (uuid, name, created_by_id, created_at, updated_at)
+SELECT DISTINCT ON (user_id, lower(name))
+    gen_random_uuid(), name, user_id, %(now)s, %(now)s
+FROM {staging}
+ORDER BY user_id, lower(name), line
+ON CONFLICT (created_by_id, lower(name)) DO NOTHING
+"""
+
+LINK_ITEMS_SQL = """
+INSERT INTO {through} (recipe_id, {column})
+SELECT DISTINCT inserted.id, item.id
+FROM inserted
+JOIN {staging} staged ON staged.recipe_uuid = inserted.uuid
+JOIN {table} item ON item.created_by_id = inserted.created_by_id
+    AND lower(item.name) = lower(staged.name)
+ON CONFLICT DO NOTHING
+"""
+
+MERGE_RECIPES_SQL = """
+WITH inserted AS (
+    INSERT INTO core_recipe (
+        uuid, created_by_id, title, description, time_minutes, price, link,
+        tag_ids, ingredient_ids, created_at, updated_at
+    )
+    SELECT uuid, user_id, title, description, time_minutes, price, link,
+        ARRAY[]::bigint[], ARRAY[]::bigint[], %(now)s, %(now)s
+    FROM import_recipe
+    ON CONFLICT (uuid) DO NOTHING
+    RETURNING id, uuid, created_by_id
+),
+tag_links AS ({tag_links}),
+ingredient_links AS ({ingredient_links})
+SELECT count(*) FROM inserted
+""".format(
+    tag_links=LINK_ITEMS_SQL.format(
+        through='core_recipe_tags',
+        column='tag_id',
+        staging='import_recipe_tag',
+        table='core_tag',
+    ),
+    ingredient_links=LINK_ITEMS_SQL.format(
+        through='core_recipe_ingredients',
+        column='ingredient_id',
+        staging='import_recipe_ingredient',
+        table='core_ingredient',
+    ),
+)
+
+
+def parse_lines(source, lines):
+    """
+    Parse and validate (line number, text) pairs of a JSONL file
+
+    Runs in the worker processes and never touches the database.
+    Returns the valid recipes as plain rows and the errors by line.
+    """
+    # One serializer builds its fields once for the whole batch
+    serializer = RecipeDetailSerializer()
+    recipes, errors = [], []
+    for number, text in lines:
+        try:
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object.')
+            recipe_uuid = uuid.UUID(str(data['uuid'])) if data.get(
+                'uuid') else uuid.uuid5(IMPORT_NAMESPACE, f'{source}:{number}')
+        except ValueError as exc:
+            errors.append((number, str(exc)))
+            continue
+
+        # Exports carry image urls, images are not imported
+        data.pop('image', None)
+        try:
+            recipe = serializer.run_validation(data)
+        except ValidationError as exc:
+            errors.append((number, json.dumps(exc.detail)))
+            continue
+
+        recipes.append({
+            'line': number,
+            'uuid': str(recipe_uuid),
+            'user': data.get('user'),
+            'title': recipe['title'],
+            'description': recipe.get('description', ''),
+            'time_minutes': recipe['time_minutes'],
+            'price': str(recipe['price']),
+            'link': recipe.get('link', ''),
+            'tags': [item['name'] for item in recipe.get('tags', [])],
+            'ingredients': [
+                item['name'] for item in recipe.get('ingredients', [])],
+        })
+    return recipes, errors
+
+
+class Command(BaseCommand):
+    """
+    Bulk import recipes through COPY and set based merges
+    """
+    help = (
+        'Import recipes from a JSONL file of RecipeDetailSerializer '
+        'objects. Lines may name their owner in a "user" email field. '
+        'Progress is saved next to the file and an interrupted import '
+        'resumes from it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file to import')
+        parser.add_argument(
+            '--user',
+            help='Email of the owner of lines without a "user" field')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Lines loaded per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes parsing and validating lines, 1 parses inline')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore saved progress and start from the first line')
+
+    def _read_batches(self, path, offset, line, batch_size):
+        """
+        Yield batches of (line number, text) with the offset after them
+        """
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            batch = []
+            for raw in file:
+                offset += len(raw)
+                line += 1
+                if raw.strip():
+                    batch.append((line, raw))
+                if len(batch) >= batch_size:
+                    yield batch, offset, line
+                    batch = []
+            if batch:
+                yield batch, offset, line
+
+    def _load_state(self, state_path):
+        """
+        Return the saved byte offset and line number to resume from
+        """
+        if self.restart or not os.path.exists(state_path):
+            return 0, 0
+        with open(state_path) as file:
+            state = json.load(file)
+        self.stdout.write(f'Resuming after line {state["line"]}')
+        return state['offset'], state['line']
+
+    def _save_state(self, state_path, offset, line):
+        """
+        Atomically record the position of the last committed batch
+        """
+        with open(f'{state_path}.tmp', 'w') as file:
+            json.dump({'offset': offset, 'line': line}, file)
+        os.replace(f'{state_path}.tmp', state_path)
+
+    def _get_user_ids(self, recipes):
+        """
+        Return user ids by email for the owners of the recipes
+        """
+        emails = {recipe['user'] or self.default_user for recipe in recipes}
+        missing = emails - set(self.user_ids) - {None}
+        if missing:
+            self.user_ids.update(get_user_model().objects.filter(
+                email__in=missing).values_list('email', 'id'))
+        return self.user_ids
+
+    def _merge(self, recipes):
+        """
+        Stage the recipes and merge them, returning how many were new
+        """
+        now = timezone.now()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(STAGING_SQL)
+            copy_rows(cursor, 'import_recipe', [
+                'line', 'uuid', 'user_id', 'title', 'description',
+                'time_minutes', 'price', 'link',
+            ], [
+                [recipe['line'], recipe['uuid'], recipe['user_id'],
+                 recipe['title'], recipe['description'],
+                 recipe['time_minutes'], recipe['price'], recipe['link']]
+                for recipe in recipes
+            ])
+            for field, table, staging in [
+                ('tags', 'core_tag', 'import_recipe_tag'),
+                ('ingredients', 'core_ingredient', 'import_recipe_ingredient'),
+            ]:
+                copy_rows(
+                    cursor,
+                    staging,
+                    ['line', 'recipe_uuid', 'user_id', 'name'],
+                    [
+                        [recipe['line'], recipe['uuid'], recipe['user_id'],
+                         name]
+                        for recipe in recipes for name in recipe[field]
+                    ],
+                )
+                cursor.execute(f'ANALYZE {staging}')
+                cursor.execute(
+                    MERGE_ITEMS_SQL.format(table=table, staging=staging),
+                    {'now': now},
+                )
+            cursor.execute('ANALYZE import_recipe')
+            cursor.execute(MERGE_RECIPES_SQL, {'now': now})
+            return cursor.fetchone()[0]
+
+    def _load(self, future, offset, line):
+        """
+        Merge a parsed batch, save progress and report the rate
+        """
+        recipes, errors = future.result()
+        lines = len(recipes) + len(errors)
+        user_ids = self._get_user_ids(recipes)
+        valid = []
+        for recipe in recipes:
+            recipe['user_id'] = user_ids.get(
+                recipe['user'] or self.default_user)
+            if recipe['user_id'] is None:
+                errors.append((recipe['line'], 'Unknown or missing user.'))
+            else:
+                valid.append(recipe)
+
+        imported = self._merge(valid) if valid else 0
+        self._save_state(self.state_path, offset, line)
+
+        for number, error in sorted(errors):
+            self.stderr.write(f'line {number}: {error}')
+        self.stats['lines'] += lines
+        self.stats['imported'] += imported
+        self.stats['existing'] += len(valid) - imported
+        self.stats['invalid'] += len(errors)
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(
+            'line {line}: {imported} imported, {existing} existing, '
+            '{invalid} invalid, {rate:.0f} rows/s'.format(
+                line=line,
+                rate=self.stats['lines'] / elapsed,
+                **self.stats,
+            ))
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        self.default_user = options['user']
+        self.restart = options['restart']
+        self.state_path = f'{path}.progress'
+        self.user_ids = {}
+        self.stats = dict.fromkeys(
+            ['lines', 'imported', 'existing', 'invalid'], 0)
+        self.start = time.perf_counter()
+        source = os.path.basename(path)
+        workers = max(options['workers'] or 1, 1)
+        offset, line = self._load_state(self.state_path)
+
+        # Forked workers only parse and validate, the database connection
+        # stays with this process.
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        pending = deque()
+        try:
+            for batch, offset, line in self._read_batches(
+                    path, offset, line, options['batch_size']):
+                if executor:
+                    future = executor.submit(parse_lines, source, batch)
+                else:
+                    future = Future()
+                    future.set_result(parse_lines(source, batch))
+                pending.append((future, offset, line))
+                # Keep every worker busy without reading the whole file
+                if len(pending) > workers:
+                    self._load(*pending.popleft())
+            while pending:
+                self._load(*pending.popleft())
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {imported} recipes from {lines} lines in {elapsed:.1f}s '
+            '({rate:.0f} rows/s), {existing} existing, {invalid} invalid'
+            .format(
+                elapsed=elapsed,
+                rate=self.stats['lines'] / max(elapsed, 1e-9),
+                **self.stats,
+            )))
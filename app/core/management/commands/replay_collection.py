@@ -0,0 +1,134 @@
+"""
+Django command to replay the Thunder Client collection as a load test
+"""
+
+import json
+import os
+import random
+
+from django.core.management.base import CommandError
+
+from core.benchmark import save_baseline
+from core.loadprofile import load_thunder_collection
+from core.replay import ReplayCommand
+
+
+class Command(ReplayCommand):
+    """
+    Replay a weighted request mix at a fixed rate against a server
+    """
+    help = (
+        'Convert the Thunder Client collection into a weighted load profile '
+        'and replay it at a target request rate against a running server. '
+        'Requests are scheduled open loop, so latency includes time spent '
+        'waiting when the server falls behind. Reports a latency histogram '
+        'per request name.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--collection',
+            help='Thunder Client directory to convert, such as '
+                 '.postman/thunder-tests of a checkout, required without '
+                 '--profile')
+        parser.add_argument(
+            '--environment',
+            help='Thunder Client environment, the default one if omitted')
+        parser.add_argument(
+            '--profile',
+            help='Replay a profile JSON written by --export instead')
+        parser.add_argument(
+            '--export',
+            help='Write the converted profile to this file and exit')
+        parser.add_argument(
+            '--weight', action='append', default=[], metavar='NAME=WEIGHT',
+            help='Override the weight of a request, may be repeated')
+        parser.add_argument(
+            '--rate', type=float, default=20,
+            help='Requests started per second')
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Seconds to replay for')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of the request order')
+
+    def _load_profile(self, options):
+        """
+        Return the profile to replay with the command line overrides
+        """
+        collection = options['collection']
+        if not options['profile']:
+            if not collection:
+                raise CommandError('Give a --collection or a --profile')
+            if not os.path.isdir(collection):
+                raise CommandError(
+                    f'Thunder Client collection {collection} not found')
+        try:
+            if options['profile']:
+                with open(options['profile']) as file:
+                    profile = json.load(file)
+            else:
+                profile = load_thunder_collection(
+                    collection, options['environment'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        weights = {}
+        for item in options['weight']:
+            name, sep, weight = item.rpartition('=')
+            try:
+                weights[name] = float(weight)
+            except ValueError:
+                sep = ''
+            if not sep:
+                raise CommandError(f'Invalid weight {item}, use NAME=WEIGHT')
+        unknown = set(weights) - {
+            request['name'] for request in profile['requests']}
+        if unknown:
+            raise CommandError(f'Unknown requests {", ".join(unknown)}')
+        for request in profile['requests']:
+            request['weight'] = weights.get(request['name'], request['weight'])
+
+        self.set_credentials(profile, options)
+        return profile
+
+    def _schedule(self, profile, options):
+        """
+        Return the weighted requests at evenly spaced start times
+        """
+        requests = [
+            request for request in profile['requests']
+            if request['weight'] > 0]
+        if not requests:
+            raise CommandError('No requests have a weight above 0')
+        total = max(int(options['rate'] * options['duration']), 1)
+        chosen = random.Random(options['seed']).choices(
+            requests, weights=[request['weight'] for request in requests],
+            k=total)
+        return [
+            (index / options['rate'], request)
+            for index, request in enumerate(chosen)
+        ]
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        profile = self._load_profile(options)
+        if options['export']:
+            save_baseline(options['export'], profile)
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote profile of {len(profile["requests"])} requests to '
+                f'{options["export"]}'))
+            return
+        if options['rate'] <= 0:
+            raise CommandError('--rate must be above 0')
+
+        self.replay(
+            profile,
+            self._schedule(profile, options),
+            options,
+            meta={'rate': options['rate'], 'seed': options['seed']},
+        )
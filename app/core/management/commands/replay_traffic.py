@@ -0,0 +1,134 @@
+"""
+Django command to replay captured traffic against a test instance
+"""
+
+import datetime
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import CommandError
+
+from core.loadprofile import TOKEN_PATH
+from core.middleware import REDACTED, SENSITIVE_RE
+from core.replay import ReplayCommand
+
+
+class Command(ReplayCommand):
+    """
+    Re-issue requests recorded by TrafficCaptureMiddleware
+    """
+    help = (
+        'Replay JSONL files written by the traffic capture middleware '
+        'against a running test instance, keeping the original gaps '
+        'between requests divided by --speed. Authenticated requests use '
+        'the token of the --email user, redacted passwords are replaced '
+        'with --password. Reports a latency histogram per route.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            'paths', nargs='+',
+            help='Capture files, including rotated ones, to replay')
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Replay this many times faster than captured')
+        parser.add_argument(
+            '--limit', type=int,
+            help='Replay at most this many of the first requests')
+
+    def _read(self, paths):
+        """
+        Return the captured records of all files ordered by time
+        """
+        records = []
+        for path in paths:
+            try:
+                with open(path) as file:
+                    for number, line in enumerate(file, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            self.stderr.write(
+                                f'{path}:{number}: invalid JSON, skipped')
+            except OSError as exc:
+                raise CommandError(exc)
+        return sorted(records, key=lambda record: record['time'])
+
+    def _unredact(self, data, password):
+        """
+        Fill redacted passwords and drop other redacted values
+        """
+        if isinstance(data, dict):
+            result = {}
+            for key, value in data.items():
+                if value == REDACTED:
+                    if password and 'password' in key.lower():
+                        result[key] = password
+                else:
+                    result[key] = self._unredact(value, password)
+            return result
+        if isinstance(data, list):
+            return [self._unredact(item, password) for item in data]
+        return data
+
+    def _request(self, record, password):
+        """
+        Return the request of a record, or None if it can't be replayed
+        """
+        if record['body_type'] not in ('json', 'form', 'none'):
+            return None
+        query = {
+            key: value for key, value in (record.get('query') or {}).items()
+            if not SENSITIVE_RE.search(key)
+        }
+        path = record['path']
+        if query:
+            path += '?' + urlencode(query, doseq=True)
+        return {
+            'name': f'{record["method"]} {record.get("route") or path}',
+            'method': record['method'],
+            'path': path,
+            'headers': {},
+            'body_type': record['body_type'],
+            'body': self._unredact(record.get('body'), password),
+        }
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        if options['speed'] <= 0:
+            raise CommandError('--speed must be above 0')
+        records = self._read(options['paths'])[:options['limit']]
+        profile = {'login': None, 'requests': []}
+        if options['email']:
+            profile['login'] = {
+                'path': TOKEN_PATH, 'body_type': 'json', 'body': {}}
+
+        schedule, skipped = [], 0
+        start = None
+        for record in records:
+            request = self._request(record, options['password'])
+            if request is None:
+                skipped += 1
+                continue
+            captured = datetime.datetime.fromisoformat(record['time'])
+            start = start or captured
+            profile['requests'].append(request)
+            schedule.append((
+                (captured - start).total_seconds() / options['speed'],
+                request,
+            ))
+        if skipped:
+            self.stderr.write(
+                f'Skipped {skipped} requests with bodies that were not '
+                f'captured, such as file uploads')
+
+        self.set_credentials(profile, options)
+        self.replay(
+            profile, schedule, options,
+            meta={'speed': options['speed'], 'requests': len(schedule)},
+        )
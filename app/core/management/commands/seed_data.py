@@ -0,0 +1,300 @@
+"""
+Django command to generate synthetic data at production scale
+"""
+
+import datetime
+import random
+import time
+import uuid
+from collections import Counter
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.bulk import copy_rows
+
+TAG_WORDS = [
+    'Vegan', 'Vegetarian', 'Quick', 'Easy', 'Dinner', 'Lunch', 'Breakfast',
+    'Dessert', 'Spicy', 'Healthy', 'Gluten free', 'Low carb', 'Keto',
+    'Comfort food', 'Italian', 'Mexican', 'Indian', 'Thai', 'Chinese',
+    'Japanese', 'French', 'Greek', 'Baking', 'Grill', 'Slow cooker',
+    'One pot', 'Budget', 'Party', 'Kids', 'Summer', 'Winter', 'Holiday',
+]
+INGREDIENT_WORDS = [
+    'Salt', 'Pepper', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Flour',
+    'Sugar', 'Egg', 'Milk', 'Rice', 'Tomato', 'Chicken', 'Beef', 'Pork',
+    'Potato', 'Carrot', 'Lemon', 'Ginger', 'Chilli', 'Cumin', 'Basil',
+    'Parsley', 'Cheese', 'Cream', 'Yogurt', 'Honey', 'Soy sauce',
+    'Mushroom', 'Spinach', 'Beans', 'Lentils', 'Pasta', 'Noodles', 'Tofu',
+    'Coconut milk', 'Bell pepper', 'Broccoli', 'Salmon', 'Shrimp',
+]
+DISH_WORDS = [
+    'curry', 'soup', 'salad', 'stew', 'pie', 'bowl', 'stir fry', 'bake',
+    'pasta', 'tacos', 'burger', 'risotto', 'cake', 'roast', 'skewers',
+]
+# Fixed reference time, so the same seed always writes the same rows
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def zipf_cum_weights(n, skew):
+    """
+    Return cumulative Zipf weights of ranks 1..n for random.choices
+    """
+    return list(accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+def name_pool(words, size):
+    """
+    Return `size` distinct names, the plain words first
+    """
+    names = list(words[:size])
+    number = 2
+    while len(names) < size:
+        names.extend(f'{word} {number}' for word in words)
+        number += 1
+    return names[:size]
+
+
+class Command(BaseCommand):
+    """
+    Generate users, recipes, tags, ingredients and links with COPY
+    """
+    help = (
+        'Generate skewed synthetic data for performance testing. Recipe '
+        'counts per user follow a long tail and tags and ingredients are '
+        'Zipf distributed, both globally and within each user. The same '
+        '--seed always generates the same rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10000,
+            help='Users to create')
+        parser.add_argument(
+            '--recipes', type=int, default=1000000,
+            help='Recipes to create across all users')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed, also part of the generated emails')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of recipes per user and name popularity')
+        parser.add_argument(
+            '--max-tags', type=int, default=60,
+            help='Most distinct tags of one user')
+        parser.add_argument(
+            '--max-ingredients', type=int, default=250,
+            help='Most distinct ingredients of one user')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Users written per transaction')
+        parser.add_argument(
+            '--no-analyze', action='store_false', dest='analyze',
+            help='Skip refreshing planner statistics at the end')
+
+    def _next_ids(self, cursor):
+        """
+        Return the first free id of every table written with explicit ids
+        """
+        ids = {}
+        for table in ['core_user', 'core_tag', 'core_ingredient',
+                      'core_recipe']:
+            cursor.execute(f'SELECT COALESCE(max(id), 0) + 1 FROM {table}')
+            ids[table] = cursor.fetchone()[0]
+        return ids
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _timestamp(self):
+        """
+        Return a creation time within the two years before EPOCH
+        """
+        return (EPOCH - datetime.timedelta(
+            seconds=self.rng.randrange(2 * 365 * 24 * 3600))).isoformat()
+
+    def _vocabulary(self, pool, pool_weights, size):
+        """
+        Return `size` distinct names of a user, popular names more likely
+        """
+        names = {}
+        while len(names) < size:
+            for name in self.rng.choices(
+                    pool, cum_weights=pool_weights, k=size):
+                names.setdefault(name)
+        return list(names)[:size]
+
+    def _pick(self, items, counts, count_weights):
+        """
+        Return distinct items for one recipe, skewed to the first items
+        """
+        count = min(
+            self.rng.choices(counts, weights=count_weights)[0], len(items))
+        weights = self.rank_weights[len(items)]
+        return {
+            items[index] for index in self.rng.choices(
+                range(len(items)), cum_weights=weights, k=count)
+        }
+
+    def _items(self, user_id, recipe_count, kind, now):
+        """
+        Create the tags or ingredients of a user, returning their ids
+        """
+        pool, pool_weights, limit = self.pools[kind]
+        size = min(limit, len(pool), 3 + int(
+            self.rng.paretovariate(1.2) * max(recipe_count, 1) ** 0.5))
+        ids = []
+        for name in self._vocabulary(pool, pool_weights, size):
+            item_id = self.next_ids[f'core_{kind}']
+            self.next_ids[f'core_{kind}'] += 1
+            self.rows[f'core_{kind}'].append(
+                [item_id, self._uuid(), now, now, name, user_id])
+            ids.append(item_id)
+        return ids
+
+    def _user(self, recipe_count):
+        """
+        Generate one user with their tags, ingredients and recipes
+        """
+        user_id = self.next_ids['core_user']
+        self.next_ids['core_user'] += 1
+        self.rows['core_user'].append([
+            user_id, '!seed', 'f',
+            f'seed-{self.seed}-{user_id}@example.com',
+            f'Seed User {user_id}', 't', 'f',
+        ])
+        now = self._timestamp()
+        tag_ids = self._items(user_id, recipe_count, 'tag', now)
+        ingredient_ids = self._items(user_id, recipe_count, 'ingredient', now)
+
+        rng = self.rng
+        for _ in range(recipe_count):
+            recipe_id = self.next_ids['core_recipe']
+            self.next_ids['core_recipe'] += 1
+            tags = sorted(self._pick(
+                tag_ids, range(6), [10, 25, 30, 20, 10, 5]))
+            ingredients = sorted(self._pick(
+                ingredient_ids, range(3, 13), [4, 8, 12, 14, 14, 12, 10, 8,
+                                               6, 4]))
+            created_at = self._timestamp()
+            dish = rng.choice(DISH_WORDS)
+            main = rng.choice(INGREDIENT_WORDS).lower()
+            self.rows['core_recipe'].append([
+                recipe_id,
+                self._uuid(),
+                created_at,
+                created_at,
+                f'{rng.choice(TAG_WORDS)} {main} {dish}',
+                f'A {dish} with {main}.' if rng.random() < 0.7 else '',
+                int(rng.lognormvariate(3.3, 0.6)) + 1,
+                f'{min(rng.lognormvariate(2.3, 0.7), 999.99):.2f}',
+                f'https://example.com/recipes/{recipe_id}'
+                if rng.random() < 0.3 else '',
+                user_id,
+                '{}',
+                '{}',
+            ])
+            self.rows['core_recipe_tags'].extend(
+                [recipe_id, tag_id] for tag_id in tags)
+            self.rows['core_recipe_ingredients'].extend(
+                [recipe_id, ingredient_id] for ingredient_id in ingredients)
+
+    def _flush(self):
+        """
+        COPY the generated rows of a chunk of users in one transaction
+
+        The link triggers fill the tag and ingredient id arrays of the
+        recipes once per COPY.
+        """
+        columns = {
+            'core_user': [
+                'id', 'password', 'is_superuser', 'email', 'name',
+                'is_active', 'is_staff'],
+            'core_tag': [
+                'id', 'uuid', 'created_at', 'updated_at', 'name',
+                'created_by_id'],
+            'core_ingredient': [
+                'id', 'uuid', 'created_at', 'updated_at', 'name',
+                'created_by_id'],
+            'core_recipe': [
+                'id', 'uuid', 'created_at', 'updated_at', 'title',
+                'description', 'time_minutes', 'price', 'link',
+                'created_by_id', 'tag_ids', 'ingredient_ids'],
+            'core_recipe_tags': ['recipe_id', 'tag_id'],
+            'core_recipe_ingredients': ['recipe_id', 'ingredient_id'],
+        }
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table, table_columns in columns.items():
+                copy_rows(cursor, table, table_columns, self.rows[table])
+                self.counts[table] += len(self.rows[table])
+                self.rows[table] = []
+            for table, next_id in self.next_ids.items():
+                # Sequences cannot be set to 0, an empty table restarts at 1
+                cursor.execute(
+                    'SELECT setval(pg_get_serial_sequence(%s, %s), %s, %s)',
+                    [table, 'id', max(next_id - 1, 1), next_id > 1],
+                )
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        self.seed = options['seed']
+        self.rng = random.Random(self.seed)
+        skew = options['skew']
+        users = options['users']
+        start = time.perf_counter()
+
+        tag_pool = name_pool(TAG_WORDS, 20 * len(TAG_WORDS))
+        ingredient_pool = name_pool(
+            INGREDIENT_WORDS, 50 * len(INGREDIENT_WORDS))
+        self.pools = {
+            'tag': (tag_pool, zipf_cum_weights(len(tag_pool), skew),
+                    options['max_tags']),
+            'ingredient': (
+                ingredient_pool,
+                zipf_cum_weights(len(ingredient_pool), skew),
+                options['max_ingredients'],
+            ),
+        }
+        largest = max(options['max_tags'], options['max_ingredients'])
+        self.rank_weights = {
+            size: zipf_cum_weights(size, skew)
+            for size in range(1, largest + 1)
+        }
+
+        # Long tail of recipes per user, heavy users spread over the ids
+        ranks = list(range(users))
+        self.rng.shuffle(ranks)
+        recipe_counts = Counter(self.rng.choices(
+            ranks, cum_weights=zipf_cum_weights(users, skew),
+            k=options['recipes']))
+
+        with connection.cursor() as cursor:
+            self.next_ids = self._next_ids(cursor)
+        self.rows = {table: [] for table in [
+            'core_user', 'core_tag', 'core_ingredient', 'core_recipe',
+            'core_recipe_tags', 'core_recipe_ingredients']}
+        self.counts = Counter()
+
+        for user in range(users):
+            self._user(recipe_counts[user])
+            if (user + 1) % options['chunk_size'] == 0 or user + 1 == users:
+                self._flush()
+                elapsed = time.perf_counter() - start
+                rows = sum(self.counts.values())
+                self.stdout.write(
+                    f'{user + 1}/{users} users, '
+                    f'{self.counts["core_recipe"]} recipes, '
+                    f'{rows} rows, {rows / elapsed:.0f} rows/s')
+
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE ' + ', '.join(self.rows))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(
+                f'{count} {table}' for table, count in self.counts.items())
+            + f' in {elapsed:.1f}s'))
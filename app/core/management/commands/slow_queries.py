@@ -0,0 +1,96 @@
+"""
+Django command to summarise the slow query log
+"""
+from datetime import timedelta
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from core.models import SlowQuery
+
+ORDERS = {
+    'total': '-total_ms',
+    'count': '-count',
+    'max': '-max_ms',
+    'mean': '-mean_ms',
+}
+
+
+class Command(BaseCommand):
+    """
+    Report the slow queries costing the most time
+    """
+    help = (
+        'Group the slow query log by SQL fingerprint and report the '
+        'queries costing the most time, with the views running them and '
+        'optionally their latest plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float, default=24,
+            help='Only summarise queries of the last hours')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Number of fingerprints to report')
+        parser.add_argument(
+            '--order', choices=list(ORDERS), default='total',
+            help='Measure the fingerprints are ranked by')
+        parser.add_argument(
+            '--view', help='Only queries of this URL name')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Print the latest plan of every fingerprint')
+        parser.add_argument(
+            '--prune', type=float, metavar='DAYS',
+            help='Delete queries older than this many days and exit')
+
+    def handle(self, *args, **options):
+        """
+        Command entrypoint
+        """
+        now = timezone.now()
+        if options['prune'] is not None:
+            deleted, _ = SlowQuery.objects.filter(
+                created_at__lt=now - timedelta(days=options['prune']),
+            ).delete()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} slow queries'))
+            return
+        if options['limit'] <= 0:
+            raise CommandError('--limit must be above 0')
+
+        queries = SlowQuery.objects.filter(
+            created_at__gte=now - timedelta(hours=options['hours']))
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+        offenders = queries.values('fingerprint').annotate(
+            count=Count('id'),
+            total_ms=Sum('duration_ms'),
+            mean_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+            sql=Max('sql'),
+            views=ArrayAgg('view', distinct=True, ordering='view'),
+        ).order_by(ORDERS[options['order']], 'fingerprint')[
+            :options['limit']]
+
+        if not offenders:
+            self.stdout.write(
+                f'No slow queries in the last {options["hours"]:g} hours')
+            return
+        for rank, offender in enumerate(offenders, 1):
+            self.stdout.write(
+                '{rank}. {fingerprint}: {count} queries, '
+                'total {total_ms:.1f} ms, mean {mean_ms:.1f} ms, '
+                'max {max_ms:.1f} ms'.format(rank=rank, **offender))
+            self.stdout.write(f'   views: {", ".join(offender["views"])}')
+            self.stdout.write(f'   {offender["sql"][:500]}')
+            if options['plans']:
+                latest = queries.filter(
+                    fingerprint=offender['fingerprint'],
+                ).exclude(plan='').order_by('-created_at').first()
+                self.stdout.write('   plan:')
+                for line in (latest.plan if latest else '-').splitlines():
+                    self.stdout.write(f'     {line}')
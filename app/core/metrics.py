@@ -0,0 +1,107 @@
+"""
+Prometheus metrics of the API workers
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory before the workers
+start and every process writes its values to memory mapped files there,
+which the /metrics view adds up across processes.
+"""
+import atexit
+import os
+import resource
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    'api_request_duration_seconds',
+    'Time to respond to a request',
+    ['view', 'action', 'method', 'status'],
+    buckets=(
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+        float('inf')),
+)
+REQUEST_QUERIES = Histogram(
+    'api_request_db_queries',
+    'Database queries run by a request',
+    ['view', 'action'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, float('inf')),
+)
+CACHE_REQUESTS = Counter(
+    'api_cache_requests',
+    'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    'api_image_upload_bytes',
+    'Size of uploaded recipe images',
+    buckets=(
+        16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2,
+        10 * 1024 ** 2, float('inf')),
+)
+WORKER_MEMORY = Gauge(
+    'api_worker_resident_memory_bytes',
+    'Resident memory of a worker process',
+    multiprocess_mode='liveall',
+)
+
+# Seconds between readings of the worker memory
+MEMORY_INTERVAL = 10
+
+_memory_read_at = 0.0
+
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def resident_memory():
+    """
+    Return the resident memory of this process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+        return pages * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # Peak rather than current memory, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def update_worker_memory():
+    """
+    Read the memory of this process at most every MEMORY_INTERVAL
+    """
+    global _memory_read_at
+    now = time.monotonic()
+    if now - _memory_read_at >= MEMORY_INTERVAL:
+        _memory_read_at = now
+        WORKER_MEMORY.set(resident_memory())
+
+
+def export():
+    """
+    Return the content type and text of all metrics
+    """
+    registry = REGISTRY
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return CONTENT_TYPE_LATEST, generate_latest(registry)
+
+
+@atexit.register
+def _mark_process_dead():
+    """
+    Drop the live gauges of a worker that exits
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,434 @@
+"""
+Middleware for the app
+"""
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core import metrics, timing
+from core.profiling import Sampler
+from core.slowqueries import SlowQueryLog, normalize
+
+timing_logger = logging.getLogger('core.timing')
+budget_logger = logging.getLogger('core.querybudget')
+
+REDACTED = '[REDACTED]'
+SENSITIVE_RE = re.compile(
+    r'password|passwd|secret|token|access|refresh|authorization|api_?key',
+    re.IGNORECASE)
+
+
+def redact(value):
+    """
+    Replace the values of sensitive keys in nested data
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if SENSITIVE_RE.search(str(key)) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def get_capture_logger(path, max_bytes, backups):
+    """
+    Return a logger appending lines to a rotating file
+
+    `{pid}` in the path is replaced, so every server process writes its
+    own file and rotation never races between processes.
+    """
+    path = path.format(pid=os.getpid())
+    logger = logging.getLogger(f'core.traffic.{path}')
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class TrafficCaptureMiddleware:
+    """
+    Record a sample of requests to JSONL files for replay_traffic
+
+    Off unless TRAFFIC_CAPTURE_RATE is above 0. Sensitive query params
+    and body fields are redacted and the Authorization header is never
+    recorded. Only JSON and form bodies up to TRAFFIC_CAPTURE_MAX_BODY
+    bytes are kept, other bodies are recorded by type and size.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = settings.TRAFFIC_CAPTURE_RATE
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        self.max_body = settings.TRAFFIC_CAPTURE_MAX_BODY
+        self.logger = get_capture_logger(
+            settings.TRAFFIC_CAPTURE_PATH,
+            settings.TRAFFIC_CAPTURE_MAX_BYTES,
+            settings.TRAFFIC_CAPTURE_BACKUPS,
+        )
+
+    def _get_body(self, request):
+        """
+        Return the body type and redacted body of the request
+        """
+        content_type = request.content_type or ''
+        size = int(request.META.get('CONTENT_LENGTH') or 0)
+        if not size:
+            return 'none', None
+        if size <= self.max_body:
+            try:
+                if content_type == 'application/json':
+                    return 'json', redact(json.loads(request.body))
+                if content_type == 'application/x-www-form-urlencoded':
+                    return 'form', redact(dict(parse_qsl(
+                        request.body.decode(), keep_blank_values=True)))
+            except ValueError:
+                pass
+        return content_type or 'raw', {'size': size}
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+
+        body_type, body = self._get_body(request)
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started_at = timezone.now()
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        self.logger.info(json.dumps({
+            'time': started_at.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'view': match.view_name if match else None,
+            'query': redact(dict(request.GET.lists())),
+            'body_type': body_type,
+            'body': body,
+            'authenticated': 'HTTP_AUTHORIZATION' in request.META,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 3),
+            'queries': queries,
+        }, default=str))
+        return response
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper recording the time of every query
+    """
+    begin = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.record('db', time.perf_counter() - begin)
+
+
+class ServerTimingMiddleware:
+    """
+    Time database, cache, serializer and view work of every request
+
+    Staff users get a Server-Timing header, everyone does when
+    SERVER_TIMING is set. SERVER_TIMING_LOG logs the same measures as
+    fields of a core.timing record. Only a few clock reads per query,
+    cache call and serialized object are added, so it can stay on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = timing.start()
+        begin = time.perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            timing.stop(token)
+        timings.add('view', time.perf_counter() - begin)
+
+        # Rest framework sets the user it authenticated on the request
+        user = getattr(request, 'user', None)
+        if settings.SERVER_TIMING or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = self._header(timings)
+        if settings.SERVER_TIMING_LOG:
+            self._log(request, response, timings)
+        return response
+
+    def _header(self, timings):
+        durations, counts = timings.durations, timings.counts
+        entries = []
+        for name, desc in [
+            ('db', f'{counts.get("db", 0)} queries'),
+            ('cache', '{} hits / {} misses'.format(
+                counts.get('cache_hit', 0), counts.get('cache_miss', 0))),
+            ('serializer', None),
+            ('view', None),
+        ]:
+            entry = f'{name};dur={durations.get(name, 0.0) * 1000:.2f}'
+            if desc:
+                entry += f';desc="{desc}"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+    def _log(self, request, response, timings):
+        durations, counts = timings.durations, timings.counts
+        match = request.resolver_match
+        timing_logger.info('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'status': response.status_code,
+            'db_queries': counts.get('db', 0),
+            'db_ms': round(durations.get('db', 0.0) * 1000, 3),
+            'cache_hits': counts.get('cache_hit', 0),
+            'cache_misses': counts.get('cache_miss', 0),
+            'cache_ms': round(durations.get('cache', 0.0) * 1000, 3),
+            'serializer_ms': round(
+                durations.get('serializer', 0.0) * 1000, 3),
+            'view_ms': round(durations['view'] * 1000, 3),
+        })
+
+
+class PrometheusMiddleware:
+    """
+    Record request latency and query counts per view and action
+
+    Views are labelled by URL name and actions by viewset action, or by
+    method for other views. Must come after ServerTimingMiddleware,
+    whose query counts it reads.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        begin = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - begin
+
+        method = request.method.lower()
+        match = request.resolver_match
+        if match:
+            view = match.view_name
+            actions = getattr(match.func, 'actions', None) or {}
+            action = actions.get(method, method)
+        else:
+            view, action = 'unmatched', method
+        metrics.REQUEST_DURATION.labels(
+            view, action, request.method, response.status_code,
+        ).observe(elapsed)
+        timings = timing.current()
+        if timings is not None:
+            metrics.REQUEST_QUERIES.labels(view, action).observe(
+                timings.counts.get('db', 0))
+        metrics.update_worker_memory()
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Store queries slower than SLOW_QUERY_MS with the view running them
+
+    A SLOW_QUERY_EXPLAIN_RATE sample of them is run again with EXPLAIN
+    (ANALYZE, BUFFERS) by a background thread. Off when SLOW_QUERY_MS
+    is 0, see the slow_queries command for the summary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.SLOW_QUERY_MS <= 0:
+            raise MiddlewareNotUsed
+        self.log = SlowQueryLog(
+            settings.SLOW_QUERY_MS,
+            settings.SLOW_QUERY_EXPLAIN_RATE,
+            settings.SLOW_QUERY_MAX_PENDING,
+            settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+        )
+
+    def __call__(self, request):
+        def get_view():
+            match = request.resolver_match
+            return match.view_name if match else request.path
+
+        with connection.execute_wrapper(self.log.watch(get_view)):
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests of staff users on demand
+
+    A request with an X-Profile header or a profile query param, from a
+    staff user, is sampled every PROFILING_INTERVAL_MS. The stacks are
+    stored in PROFILING_DIR in the folded flame graph format and the
+    file name is returned in the X-Profile header. With `download` as
+    the trigger value the stacks are returned instead of the response.
+    Other requests only pay for the trigger lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+
+    def _is_staff(self, request):
+        """
+        Authenticate the request as its view would
+        """
+        authenticators = [
+            authentication()
+            for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+        return user.is_staff
+
+    def __call__(self, request):
+        trigger = (
+            request.META.get('HTTP_X_PROFILE')
+            or request.GET.get('profile'))
+        if not trigger or not self._is_staff(request):
+            return self.get_response(request)
+
+        with Sampler(settings.PROFILING_INTERVAL_MS / 1000) as sampler:
+            response = self.get_response(request)
+        stacks = sampler.folded()
+
+        if trigger == 'download':
+            response = HttpResponse(stacks, content_type='text/plain')
+            response['Content-Disposition'] = (
+                'attachment; filename="profile.folded"')
+            return response
+        match = request.resolver_match
+        name = '{}-{}-{}.folded'.format(
+            timezone.now().strftime('%Y%m%dT%H%M%S'),
+            re.sub(r'[^\w.-]+', '_', match.view_name if match else 'none'),
+            get_random_string(8))
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        with open(os.path.join(settings.PROFILING_DIR, name), 'w') as file:
+            file.write(stacks)
+        response['X-Profile'] = name
+        return response
+
+
+def get_query_budget(view_func, method):
+    """
+    Return the most queries a view declares for a request method
+
+    Views set `query_budget` to a count, or to counts by viewset action
+    or method name. None means the view has no budget.
+    """
+    budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    if isinstance(budget, dict):
+        method = method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(method), budget.get(method))
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Warn when a request runs more queries than its view's query_budget
+
+    The warning on the core.querybudget logger lists the most repeated
+    SQL fingerprints. With QUERY_BUDGET_STRICT the request fails with a
+    500 response instead, for staging. Changes the request made are not
+    rolled back. Only requests of views with a budget are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.QUERY_BUDGETS:
+            raise MiddlewareNotUsed
+        self.strict = settings.QUERY_BUDGET_STRICT
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = get_query_budget(view_func, request.method)
+        if budget is None:
+            return None
+        queries = []
+
+        def collect_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        connection.execute_wrappers.append(collect_query)
+        request.query_budget = (budget, queries, collect_query)
+        return None
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            tracked = getattr(request, 'query_budget', None)
+            if tracked:
+                connection.execute_wrappers.remove(tracked[2])
+        if tracked and len(tracked[1]) > tracked[0]:
+            return self._exceeded(request, response, *tracked[:2])
+        return response
+
+    def _exceeded(self, request, response, budget, queries):
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        fingerprints = [
+            {'count': count, 'sql': sql}
+            for sql, count in Counter(map(normalize, queries)).most_common(5)
+        ]
+        budget_logger.warning(
+            '%s %s ran %d queries over its budget of %d:\n%s',
+            request.method, view, len(queries), budget,
+            '\n'.join(
+                f'  {item["count"]} x {item["sql"]}'
+                for item in fingerprints),
+            extra={
+                'view': view,
+                'method': request.method,
+                'queries': len(queries),
+                'budget': budget,
+                'fingerprints': fingerprints,
+            },
+        )
+        if not self.strict:
+            return response
+        return JsonResponse({
+            'detail': 'Query budget exceeded.',
+            'view': view,
+            'queries': len(queries),
+            'budget': budget,
+            'fingerprints': fingerprints,
+        }, status=500)
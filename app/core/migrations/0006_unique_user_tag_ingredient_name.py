@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+MERGE_DUPLICATES_SQL = """
+CREATE TEMPORARY TABLE {table}_duplicates ON COMMIT DROP AS
+SELECT id, keep_id FROM (
+    SELECT id, min(id) OVER (
+        PARTITION BY created_by_id, lower(name)) AS keep_id
+    FROM {table}
+    WHERE created_by_id IS NOT NULL
+) ranked
+WHERE id <> keep_id;
+
+INSERT INTO {through} (recipe_id, {column})
+SELECT link.recipe_id, duplicate.keep_id
+FROM {through} link
+JOIN {table}_duplicates duplicate ON link.{column} = duplicate.id
+ON CONFLICT (recipe_id, {column}) DO NOTHING;
+
+DELETE FROM {through} link
+USING {table}_duplicates duplicate
+WHERE link.{column} = duplicate.id;
+
+DELETE FROM {table} item
+USING {table}_duplicates duplicate
+WHERE item.id = duplicate.id;
+
+-- Run the deferred foreign key checks now, CREATE INDEX refuses to
+-- run on a table with pending trigger events.
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+UNIQUE_NAME_SQL = """
+CREATE UNIQUE INDEX {table}_created_by_lower_name_uniq
+ON {table} (created_by_id, lower(name));
+"""
+
+DROP_UNIQUE_NAME_SQL = """
+DROP INDEX IF EXISTS {table}_created_by_lower_name_uniq;
+"""
+
+
+def operations_for(table, through, column):
+    """
+    Merge case-insensitive duplicates then enforce per user uniqueness
+    """
+    names = {'table': table, 'through': through, 'column': column}
+    return [
+        migrations.RunSQL(
+            MERGE_DUPLICATES_SQL.format(**names),
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            UNIQUE_NAME_SQL.format(**names),
+            DROP_UNIQUE_NAME_SQL.format(**names),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = (
+        operations_for('core_tag', 'core_recipe_tags', 'tag_id')
+        + operations_for(
+            'core_ingredient', 'core_recipe_ingredients', 'ingredient_id')
+    )
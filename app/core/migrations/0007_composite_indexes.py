@@ -0,0 +1,55 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+REVERSE_INDEX_SQL = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+ON {table} ({column}, recipe_id);
+"""
+
+DROP_REVERSE_INDEX_SQL = """
+DROP INDEX CONCURRENTLY IF EXISTS {name};
+"""
+
+
+def reverse_index(table, column, name):
+    """
+    Index a through table from the tag/ingredient side to the recipe
+    """
+    names = {'table': table, 'column': column, 'name': name}
+    return migrations.RunSQL(
+        REVERSE_INDEX_SQL.format(**names),
+        DROP_REVERSE_INDEX_SQL.format(**names),
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_unique_user_tag_ingredient_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['created_by', '-id'], name='core_recipe_created_by_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['created_by', 'name', 'id'], name='core_tag_created_by_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['created_by', 'name', 'id'], name='core_ingr_created_by_name_idx'),
+        ),
+        reverse_index(
+            'core_recipe_tags', 'tag_id', 'core_recipe_tags_tag_recipe_idx'),
+        reverse_index(
+            'core_recipe_ingredients',
+            'ingredient_id',
+            'core_recipe_ingr_ingr_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,78 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+SYNC_FUNCTION_SQL = """
+CREATE FUNCTION {table}_sync() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_recipe recipe
+    SET {field} = ARRAY(
+        SELECT link.{column} FROM {table} link
+        WHERE link.recipe_id = recipe.id
+        ORDER BY link.{column}
+    )
+    WHERE recipe.id IN (SELECT DISTINCT recipe_id FROM changed);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_sync_insert
+AFTER INSERT ON {table}
+REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_sync();
+
+CREATE TRIGGER {table}_sync_delete
+AFTER DELETE ON {table}
+REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_sync();
+
+UPDATE core_recipe recipe
+SET {field} = ARRAY(
+    SELECT link.{column} FROM {table} link
+    WHERE link.recipe_id = recipe.id
+    ORDER BY link.{column}
+);
+"""
+
+DROP_SYNC_FUNCTION_SQL = """
+DROP TRIGGER IF EXISTS {table}_sync_insert ON {table};
+DROP TRIGGER IF EXISTS {table}_sync_delete ON {table};
+DROP FUNCTION IF EXISTS {table}_sync();
+"""
+
+
+def sync_links(table, column, field):
+    """
+    Keep a recipe array field equal to its links in a through table
+
+    Statement level triggers update each touched recipe once, however
+    many links a single INSERT or DELETE changes.
+    """
+    names = {'table': table, 'column': column, 'field': field}
+    return migrations.RunSQL(
+        SYNC_FUNCTION_SQL.format(**names),
+        DROP_SYNC_FUNCTION_SQL.format(**names),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None),
+        ),
+        sync_links('core_recipe_tags', 'tag_id', 'tag_ids'),
+        sync_links(
+            'core_recipe_ingredients', 'ingredient_id', 'ingredient_ids'),
+    ]
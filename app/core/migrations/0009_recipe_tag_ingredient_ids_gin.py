@@ -0,0 +1,24 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_tag_ingredient_ids'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=GinIndex(fields=['tag_ids'], name='core_recipe_tag_ids_gin'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=GinIndex(fields=['ingredient_ids'], name='core_recipe_ingredient_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_EXPRESSION = """
+setweight(to_tsvector('pg_catalog.english', coalesce({row}title, '')), 'A')
+|| setweight(
+    to_tsvector('pg_catalog.english', coalesce({row}description, '')), 'B')
+"""
+
+SEARCH_TRIGGER_SQL = """
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {new_expression};
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_vector_update
+BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+FOR EACH ROW EXECUTE FUNCTION core_recipe_search_vector_update();
+
+UPDATE core_recipe SET search_vector = {expression};
+""".format(
+    new_expression=SEARCH_VECTOR_EXPRESSION.format(row='NEW.'),
+    expression=SEARCH_VECTOR_EXPRESSION.format(row=''),
+)
+
+DROP_SEARCH_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS core_recipe_search_vector_update ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_tag_ingredient_ids_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER_SQL, DROP_SEARCH_TRIGGER_SQL),
+    ]
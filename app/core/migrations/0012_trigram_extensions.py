@@ -0,0 +1,17 @@
+from django.contrib.postgres.operations import (
+    BtreeGinExtension,
+    TrigramExtension,
+)
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_search_vector_gin'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        TrigramExtension(),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_trigram_extensions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tag',
+            index=GinIndex(fields=['created_by', 'name'], name='core_tag_name_trgm_gin', opclasses=['int8_ops', 'gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=GinIndex(fields=['created_by', 'name'], name='core_ingr_name_trgm_gin', opclasses=['int8_ops', 'gin_trgm_ops']),
+        ),
+    ]
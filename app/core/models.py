@@ -3,8 +3,13 @@ Database models
 """
 import uuid
 import os
+import re
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -53,6 +58,102 @@ class UserManager(BaseUserManager):
         return user
 
 
+UPSERT_NAMES_SQL = """
+WITH input AS (
+    SELECT * FROM unnest(%(uuids)s::uuid[], %(names)s::text[])
+        WITH ORDINALITY AS input (uuid, name, position)
+), inserted AS (
+    INSERT INTO {table} (uuid, name, created_by_id, created_at, updated_at)
+    SELECT DISTINCT ON (lower(name)) uuid, name, %(user_id)s, %(now)s, %(now)s
+    FROM input
+    ORDER BY lower(name), position
+    ON CONFLICT (created_by_id, lower(name)) DO NOTHING
+    RETURNING *
+), found AS (
+    SELECT * FROM inserted
+    UNION ALL
+    SELECT * FROM {table}
+    WHERE created_by_id = %(user_id)s
+    AND lower(name) IN (SELECT lower(name) FROM input)
+)
+SELECT found.*, array(
+    SELECT input.name FROM input WHERE lower(input.name) = lower(found.name)
+) AS input_names
+FROM found
+"""
+
+
+SUGGEST_NAMES_SQL = """
+SELECT * FROM {table}
+WHERE created_by_id = %(user_id)s
+AND (name ILIKE %(prefix)s OR name %%> %(query)s OR name %% %(query)s)
+ORDER BY name ILIKE %(prefix)s DESC,
+    greatest(word_similarity(%(query)s, name), similarity(%(query)s, name))
+    DESC,
+    name
+LIMIT %(limit)s
+"""
+
+
+class NamedItemManager(models.Manager):
+    """
+    Manager for tags and ingredients, unique per user by name
+    """
+
+    def get_or_create_by_names(self, user, names):
+        """
+        Return the user's objects for names, inserting missing ones
+
+        Names match case-insensitively. Runs a single
+        INSERT ... ON CONFLICT DO NOTHING statement, which is safe
+        against concurrent requests creating the same names. Every
+        object has the given names it matched as `input_names`, as
+        folded by the database, which can differ from str.lower().
+        """
+        pending = list(dict.fromkeys(names))
+
+        objs = {}
+        # A row committed by a concurrent insert after this statement's
+        # snapshot is skipped by ON CONFLICT but not yet visible to the
+        # SELECT; the second pass picks it up.
+        for attempt in range(2):
+            if not pending:
+                break
+            for obj in self.raw(
+                UPSERT_NAMES_SQL.format(table=self.model._meta.db_table),
+                {
+                    'user_id': user.pk,
+                    'now': timezone.now(),
+                    'uuids': [str(uuid.uuid4()) for name in pending],
+                    'names': pending,
+                },
+            ):
+                objs[obj.pk] = obj
+            matched = {
+                name for obj in objs.values() for name in obj.input_names}
+            pending = [name for name in pending if name not in matched]
+        return list(objs.values())
+
+    def suggest(self, user, query, limit=10):
+        """
+        Return the user's items best matching a partial, misspelled name
+
+        Prefix matches come first, then the closest trigram word or
+        whole name similarity. Every condition is served by the trigram
+        GIN index.
+        """
+        prefix = re.sub(r'([\\%_])', r'\\\1', query) + '%'
+        return list(self.raw(
+            SUGGEST_NAMES_SQL.format(table=self.model._meta.db_table),
+            {
+                'user_id': user.pk,
+                'query': query,
+                'prefix': prefix,
+                'limit': limit,
+            },
+        ))
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """
     System User
@@ -109,10 +210,56 @@ class Recipe(BaseModel):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Copies of the tags/ingredients links kept in sync by database
+    # triggers, used for GIN indexed containment filters
+    tag_ids = ArrayField(
+        models.BigIntegerField(), default=list, editable=False)
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(), default=list, editable=False)
+    # Weighted title and description lexemes, set by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    TRIGGER_MANAGED_FIELDS = ('tag_ids', 'ingredient_ids', 'search_vector')
+    SEARCH_CONFIG = 'english'
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_by', '-id'],
+                name='core_recipe_created_by_id_idx',
+            ),
+            GinIndex(fields=['tag_ids'], name='core_recipe_tag_ids_gin'),
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='core_recipe_ingredient_ids_gin',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='core_recipe_search_vector_gin',
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Save recipe without overwriting the trigger managed fields
+        """
+        updating = (
+            not self._state.adding
+            and not args
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        )
+        if updating:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.TRIGGER_MANAGED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Tag(BaseModel):
     """
@@ -120,6 +267,21 @@ class Tag(BaseModel):
     """
     name = models.CharField(max_length=255)
 
+    objects = NamedItemManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_by', 'name', 'id'],
+                name='core_tag_created_by_name_idx',
+            ),
+            GinIndex(
+                fields=['created_by', 'name'],
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                name='core_tag_name_trgm_gin',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -130,5 +292,43 @@ class Ingredient(BaseModel):
     """
     name = models.CharField(max_length=255)
 
+    objects = NamedItemManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_by', 'name', 'id'],
+                name='core_ingr_created_by_name_idx',
+            ),
+            GinIndex(
+                fields=['created_by', 'name'],
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                name='core_ingr_name_trgm_gin',
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class SlowQuery(models.Model):
+    """
+    Query slower than SLOW_QUERY_MS, with the plan of a sample of them
+    """
+    fingerprint = models.CharField(max_length=32)
+    sql = models.TextField()
+    view = models.CharField(max_length=255, blank=True)
+    duration_ms = models.FloatField()
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['fingerprint', '-created_at'],
+                name='core_slowquery_fp_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.view} {self.duration_ms:.0f} ms'
@@ -0,0 +1,55 @@
+"""
+Sampling profiler writing flame graph stacks
+"""
+import sys
+import threading
+from collections import Counter
+
+
+def frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+class Sampler:
+    """
+    Sample the stack of the current thread from a background thread
+
+    Stacks are counted in the folded format, one `root;...;leaf count`
+    line per stack, read by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name='profile-sampler', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+                self.samples += 1
+
+    def folded(self):
+        """
+        Return the sampled stacks in the folded format
+        """
+        return ''.join(
+            f'{stack} {count}\n'
+            for stack, count in sorted(self.stacks.items()))
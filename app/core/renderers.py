@@ -0,0 +1,53 @@
+"""
+Fast JSON renderer for the rest api
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer using orjson when installed, the stdlib otherwise
+
+    orjson writes UUID, date and time values natively, OPT_UTC_Z gives
+    the trailing Z of the DRF encoder. It has no Decimal type, those and
+    other DRF types go through the DRF encoder as default=. Serializers
+    already give Decimals and datetimes as strings, so API responses make
+    no default= calls. Pretty printed, ascii only or non compact output
+    uses the stdlib.
+
+    Unlike JSONRenderer, NaN and infinite floats render as null instead
+    of raising under STRICT_JSON, as looking for them in the data costs
+    more than orjson saves.
+    """
+    options = orjson.OPT_UTC_Z if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render `data` into JSON, returning a bytestring
+        """
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=self.options,
+            )
+        except TypeError:
+            # orjson rejects what the stdlib accepts, such as big ints
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        # Keep the output a strict javascript subset like JSONRenderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
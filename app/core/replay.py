@@ -0,0 +1,256 @@
+"""
+Base command replaying scheduled requests against a running server
+"""
+import http.client
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import (
+    compare,
+    histogram,
+    load_baseline,
+    save_baseline,
+    summarize,
+)
+from core.loadprofile import TOKEN_PATH, substitute
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'form': 'application/x-www-form-urlencoded',
+    'raw': 'text/plain',
+}
+
+
+class ReplayCommand(BaseCommand):
+    """
+    Send requests at scheduled times and report latency per request name
+
+    Subclasses build a profile of `base_url`, `login` and `requests` and
+    a schedule of (seconds from start, request) pairs, then call replay.
+    Requests are scheduled open loop, so latency includes time spent
+    waiting when the server falls behind.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            help='Server to replay against')
+        parser.add_argument(
+            '--email', help='Login email of the replayed requests')
+        parser.add_argument(
+            '--password', help='Login password of the replayed requests')
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Most requests in flight, one connection each')
+        parser.add_argument(
+            '--timeout', type=float, default=10,
+            help='Seconds before a request fails')
+        parser.add_argument(
+            '--baseline',
+            help='Compare with, or create, a JSON baseline of the results')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Fraction a measure may worsen before it is a regression')
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Store the results as the new baseline')
+
+    def set_credentials(self, profile, options):
+        """
+        Apply --email and --password to the login and token requests
+        """
+        for request in [profile.get('login'), *profile['requests']]:
+            if (request and request['path'] == TOKEN_PATH
+                    and request['body_type'] in ('json', 'form')):
+                request['body'] = dict(request['body'] or {})
+                for field in ['email', 'password']:
+                    if options[field]:
+                        request['body'][field] = options[field]
+
+    def _connect(self):
+        connection_class = (
+            http.client.HTTPSConnection if self.url.scheme == 'https'
+            else http.client.HTTPConnection)
+        return connection_class(self.url.netloc, timeout=self.timeout)
+
+    def _send(self, connection, request, token=None):
+        """
+        Send one request and return the status and response body
+        """
+        body = request.get('body')
+        headers = dict(request.get('headers') or {})
+        if body is not None and request['body_type'] in CONTENT_TYPES:
+            headers.setdefault(
+                'Content-Type', CONTENT_TYPES[request['body_type']])
+            if request['body_type'] == 'json':
+                body = json.dumps(body)
+            elif request['body_type'] == 'form':
+                body = urlencode(body)
+            body = body.encode()
+        if token:
+            headers = substitute(headers, {'token': token, 'access': token})
+            headers.setdefault('Authorization', f'Bearer {token}')
+        connection.request(
+            request.get('method', 'POST'),
+            self.url.path.rstrip('/') + request['path'],
+            body=body,
+            headers=headers,
+        )
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def _login(self, expired=None):
+        """
+        Return an access token, logging in again if `expired` is current
+        """
+        with self.token_lock:
+            if self.login and self.token == expired:
+                connection = self._connect()
+                try:
+                    status, content = self._send(connection, self.login)
+                finally:
+                    connection.close()
+                if status != 200:
+                    raise CommandError(
+                        f'Login failed with {status}: {content[:200]!r}')
+                self.token = json.loads(content)['access']
+            return self.token
+
+    def _worker(self, tasks, samples):
+        """
+        Send scheduled requests until the queue is drained
+        """
+        connection = self._connect()
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                scheduled, request = task
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                token = self.token
+                try:
+                    status, content = self._send(connection, request, token)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = self._connect()
+                    status = None
+                elapsed = time.perf_counter() - scheduled
+                if status == 401 and token:
+                    # The access token expired, the next requests log in
+                    try:
+                        self._login(expired=token)
+                    except CommandError as exc:
+                        self.stderr.write(str(exc))
+                ok = status is not None and status < 400
+                with self.lock:
+                    samples.setdefault(request['name'], []).append(
+                        (elapsed, 0, ok))
+        finally:
+            connection.close()
+
+    def _run(self, schedule, concurrency):
+        """
+        Send the scheduled requests and return samples by name
+        """
+        samples = {}
+        tasks = queue.Queue()
+        threads = [
+            threading.Thread(target=self._worker, args=(tasks, samples))
+            for i in range(max(concurrency, 1))
+        ]
+        start = time.perf_counter() + 0.1
+        for offset, request in schedule:
+            tasks.put((start + offset, request))
+        for thread in threads:
+            tasks.put(None)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    def _write_results(self, samples, results, regressions):
+        flagged = {}
+        for name, measure, before, after in regressions:
+            flagged.setdefault(name, []).append(measure)
+        for name, result in results.items():
+            self.stdout.write(
+                '{name}: {requests} requests, {errors} errors, '
+                'p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms, '
+                '{throughput:.1f} req/s'.format(name=name, **result))
+            if name in flagged:
+                self.stdout.write(
+                    '  REGRESSED ' + ', '.join(flagged[name]))
+            timings = [
+                seconds * 1000 for seconds, queries, ok in samples[name]]
+            buckets = histogram(timings)
+            most = max(count for bound, count in buckets)
+            for bound, count in buckets:
+                if count:
+                    self.stdout.write('  {:>9} {:>7} {}'.format(
+                        f'<{bound:g} ms' if bound != float('inf')
+                        else 'slower', count,
+                        '#' * max(round(40 * count / most), 1)))
+
+    def replay(self, profile, schedule, options, meta=None):
+        """
+        Log in, send the schedule and report or compare the results
+        """
+        if not schedule:
+            raise CommandError('There are no requests to replay')
+        self.url = urlsplit(
+            options['base_url'] or profile.get('base_url')
+            or 'http://localhost:8000')
+        self.timeout = options['timeout']
+        self.lock = threading.Lock()
+        self.token_lock = threading.Lock()
+        self.login = profile.get('login')
+        self.token = None
+        self._login()
+
+        samples, elapsed = self._run(schedule, options['concurrency'])
+        baseline = (
+            load_baseline(options['baseline']) if options['baseline']
+            else None)
+        results = {}
+        # Report names in the order they are first scheduled
+        for offset, request in schedule:
+            name = request['name']
+            if name in samples and name not in results:
+                # Queries are only counted by in-process benchmarks
+                results[name] = summarize(samples[name], elapsed)
+                del results[name]['queries']
+        regressions = []
+        if baseline and not options['save']:
+            regressions = compare(
+                baseline['results'], results, options['threshold'])
+        self._write_results(samples, results, regressions)
+
+        planned = schedule[-1][0]
+        self.stdout.write(
+            f'{len(schedule)} requests in {elapsed:.1f}s, '
+            f'{len(schedule) / elapsed:.1f} req/s, '
+            f'scheduled over {planned:.1f}s')
+        if elapsed > planned * 1.1 + 0.5:
+            self.stderr.write(
+                'The schedule was not kept, the server or the '
+                'concurrency limit is the bottleneck')
+
+        if options['baseline'] and (baseline is None or options['save']):
+            save_baseline(options['baseline'], {
+                'meta': meta or {},
+                'results': results,
+            })
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved baseline to {options["baseline"]}'))
+        elif regressions:
+            raise CommandError(
+                f'{len(regressions)} regressions beyond '
+                f'{options["threshold"]:.0%} of {options["baseline"]}')
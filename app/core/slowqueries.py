@@ -0,0 +1,164 @@
+"""
+Log of slow queries with plans captured off the request path
+"""
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from django.db import DatabaseError, connection, transaction
+
+from core.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_RES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'\[\s*\?(?:\s*,\s*\?)*\s*\]'), '[?+]'),
+    (re.compile(r'VALUES\s*\(\?\+\)(?:\s*,\s*\(\?\+\))*', re.IGNORECASE),
+     'VALUES (?+), ...'),
+    (re.compile(r'\s+'), ' '),
+]
+
+# Row locking clauses, analyzing these would take the locks again
+LOCKING_RE = re.compile(
+    r'\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b',
+    re.IGNORECASE)
+
+
+def normalize(sql):
+    """
+    Return the SQL with literals and placeholders replaced by ?
+
+    IN lists and arrays of any length become (?+) and [?+], and rows of
+    multi row inserts collapse, so queries differing only in their
+    values share a fingerprint.
+    """
+    for pattern, replacement in FINGERPRINT_RES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()
+
+
+class SlowQueryLog:
+    """
+    Store queries slower than a threshold from a background thread
+
+    Queries only pay for a clock read. Slow ones are queued, and a
+    thread of the process saves them with its own connection, running
+    EXPLAIN (ANALYZE, BUFFERS) on a sample of the SELECT queries first.
+    Locking selects get a plain EXPLAIN without running them. Queries
+    are dropped while max_pending are waiting.
+    """
+
+    def __init__(self, threshold_ms, explain_rate=0.1, max_pending=100,
+                 explain_timeout_ms=30000):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.explain_timeout_ms = explain_timeout_ms
+        self.queue = queue.Queue(max_pending)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.dropped = 0
+
+    def watch(self, get_view):
+        """
+        Return an execute wrapper recording slow queries of a view
+
+        `get_view` is called for slow queries only, once the view is
+        known.
+        """
+        def execute_wrapper(execute, sql, params, many, context):
+            begin = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                elapsed = time.perf_counter() - begin
+                if elapsed >= self.threshold and not many:
+                    self.record(sql, params, elapsed, get_view())
+        return execute_wrapper
+
+    def record(self, sql, params, seconds, view):
+        """
+        Queue a slow query to be saved
+        """
+        explain = (
+            sql.lstrip()[:6].upper() == 'SELECT'
+            and random.random() < self.explain_rate)
+        try:
+            self.queue.put_nowait({
+                'sql': sql,
+                'params': params,
+                'seconds': seconds,
+                'view': view or '',
+                'explain': explain,
+            })
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.start()
+
+    def start(self):
+        """
+        Start the thread saving queries, again in forked workers
+        """
+        with self.lock:
+            if self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(
+                    target=self._run, name='slow-query-log', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            try:
+                self.save(**entry)
+            except Exception:
+                logger.exception('Could not save a slow query')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+                self.queue.task_done()
+
+    def explain(self, sql, params):
+        """
+        Return the plan of running the query, rolled back afterwards
+
+        Selects locking rows are planned without being run.
+        """
+        options = '' if LOCKING_RE.search(sql) else '(ANALYZE, BUFFERS) '
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SET LOCAL statement_timeout = %s',
+                        [self.explain_timeout_ms])
+                    cursor.execute(
+                        f'EXPLAIN {options}' + sql, params)
+                    plan = '\n'.join(row[0] for row in cursor.fetchall())
+                transaction.set_rollback(True)
+        except DatabaseError as exc:
+            return f'EXPLAIN failed: {exc}'
+        return plan
+
+    def save(self, sql, params, seconds, view, explain=False):
+        """
+        Store a slow query, with its plan when explain is set
+        """
+        return SlowQuery.objects.create(
+            fingerprint=fingerprint(sql),
+            sql=normalize(sql),
+            view=view[:255],
+            duration_ms=round(seconds * 1000, 3),
+            plan=self.explain(sql, params) if explain else '',
+        )
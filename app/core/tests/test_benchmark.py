@@ -0,0 +1,117 @@
+"""
+Test the load generation and baseline helpers
+"""
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from core.benchmark import (
+    compare,
+    load_baseline,
+    percentile,
+    run_load,
+    save_baseline,
+    summarize,
+)
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    """
+    Test statistics and regression checks
+    """
+
+    def test_percentile(self):
+        """
+        Test nearest rank percentiles of sorted values
+        """
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize(self):
+        """
+        Test latency is reported in ms with errors, rate and queries
+        """
+        samples = [(0.001 * i, 2, i != 4) for i in range(1, 5)]
+
+        result = summarize(samples, elapsed=2)
+
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['p50'], 2.0)
+        self.assertEqual(result['p99'], 4.0)
+        self.assertEqual(result['throughput'], 2.0)
+        self.assertEqual(result['queries'], 2.0)
+
+    def test_compare(self):
+        """
+        Test only changes beyond the threshold are regressions
+        """
+        baseline = {'list': {
+            'p50': 10.0, 'p95': 20.0, 'p99': 30.0,
+            'throughput': 100.0, 'queries': 3.0,
+        }}
+        results = {'list': {
+            'p50': 11.0, 'p95': 30.0, 'p99': 30.5,
+            'throughput': 70.0, 'queries': 4.0,
+        }, 'new': {'p50': 1.0}}
+
+        regressions = compare(baseline, results, threshold=0.2)
+
+        self.assertEqual(regressions, [
+            ('list', 'p95', 20.0, 30.0),
+            ('list', 'queries', 3.0, 4.0),
+            ('list', 'throughput', 100.0, 70.0),
+        ])
+
+    def test_compare_ignores_jitter(self):
+        """
+        Test sub millisecond slowdowns of fast routes are not flagged
+        """
+        regressions = compare(
+            {'health': {'p50': 0.5}}, {'health': {'p50': 0.9}}, 0.2)
+
+        self.assertEqual(regressions, [])
+
+    def test_baseline_round_trip(self):
+        """
+        Test baselines are written to new directories and read back
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmarks', 'endpoints.json')
+
+            self.assertIsNone(load_baseline(path))
+            save_baseline(path, {'results': {'list': {'p50': 1.0}}})
+
+            self.assertEqual(
+                load_baseline(path), {'results': {'list': {'p50': 1.0}}})
+
+
+class RunLoadTests(TestCase):
+    """
+    Test the concurrent load generator
+    """
+
+    def test_run_load(self):
+        """
+        Test every request runs once with a state per thread
+        """
+        for concurrency in [1, 3]:
+            calls = []
+
+            def send(state, index):
+                calls.append((state, index))
+                return True
+
+            samples, elapsed = run_load(send, 10, concurrency, object)
+
+            self.assertEqual(len(samples), 10)
+            self.assertEqual(
+                sorted(index for state, index in calls), list(range(10)))
+            self.assertLessEqual(
+                len({state for state, index in calls}), concurrency)
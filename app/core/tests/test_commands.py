@@ -2,11 +2,34 @@
 Tests custom django management commands
 """
 
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import Count
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.management.commands.import_recipes import Command as ImportCommand
+from core.models import Recipe, Tag, Ingredient, SlowQuery
+from core.tests.test_loadprofile import (
+    TOKEN_REQUEST,
+    thunder_request,
+    write_collection,
+)
+from core.tests.test_models import (
+    create_user,
+    create_recipe,
+    create_tag,
+)
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -34,3 +57,567 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesCommandTests(TestCase):
+    """
+    Test importing recipes from JSONL files
+    """
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com')
+        self.other_user = create_user(email='other@example.com')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'recipes.jsonl')
+
+    def _write(self, lines):
+        """
+        Write recipes and raw lines to the JSONL file
+        """
+        with open(self.path, 'w') as file:
+            for line in lines:
+                file.write(line if isinstance(line, str) else json.dumps(line))
+                file.write('\n')
+
+    def _recipe(self, i, **params):
+        """
+        Return a recipe line in the RecipeDetailSerializer format
+        """
+        return dict({
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.50',
+            'tags': [{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+            'ingredients': [{'name': 'Rice'}],
+        }, **params)
+
+    def _import(self, **options):
+        """
+        Run the import and return its output and errors
+        """
+        out, err = StringIO(), StringIO()
+        options = dict({'user': 'test@example.com', 'workers': 1}, **options)
+        call_command(
+            'import_recipes', self.path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_recipes(self):
+        """
+        Test valid lines are merged with the users' existing names
+        """
+        create_tag(user=self.user, name='vegan')
+        self._write([
+            self._recipe(0, description='First'),
+            '',
+            self._recipe(1, tags=[{'name': 'VEGAN'}, {'name': 'vegan'}]),
+            self._recipe(2, user='other@example.com'),
+            'not json',
+            self._recipe(3, time_minutes='soon'),
+            self._recipe(4, user='missing@example.com'),
+        ])
+
+        out, err = self._import()
+
+        self.assertIn('Imported 3 recipes from 6 lines', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 5:', err)
+        self.assertIn('line 6: {"time_minutes"', err)
+        self.assertIn('line 7: Unknown or missing user.', err)
+        recipes = Recipe.objects.order_by('title')
+        self.assertEqual(
+            [(recipe.title, recipe.created_by) for recipe in recipes],
+            [('Recipe 0', self.user), ('Recipe 1', self.user),
+             ('Recipe 2', self.other_user)])
+        self.assertEqual(recipes[0].description, 'First')
+        self.assertEqual(
+            sorted(tag.name for tag in recipes[0].tags.all()),
+            ['Tag 0', 'vegan'])
+        self.assertEqual(
+            [tag.name for tag in recipes[1].tags.all()], ['vegan'])
+        self.assertEqual(len(recipes[2].tag_ids), 2)
+        self.assertEqual(len(recipes[2].ingredient_ids), 1)
+        self.assertEqual(
+            Tag.objects.filter(created_by=self.user).count(), 2)
+        self.assertFalse(os.path.exists(f'{self.path}.progress'))
+
+    def test_import_exported_image(self):
+        """
+        Test exported lines with an image url are imported without it
+        """
+        self._write([self._recipe(
+            0, description='', link='',
+            image='http://testserver/media/uploads/recipe/image.jpg')])
+
+        out, err = self._import()
+
+        self.assertIn('Imported 1 recipes from 1 lines', out)
+        self.assertEqual(err, '')
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.title, 'Recipe 0')
+        self.assertFalse(recipe.image)
+
+    def test_import_twice(self):
+        """
+        Test importing the same file again creates nothing
+        """
+        self._write([self._recipe(i) for i in range(3)])
+        self._import()
+
+        out, err = self._import()
+
+        self.assertIn('Imported 0 recipes from 3 lines', out)
+        self.assertIn('3 existing', out)
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_import_resumes(self):
+        """
+        Test an interrupted import continues after the last batch
+        """
+        self._write([self._recipe(i) for i in range(5)])
+        merge = ImportCommand._merge
+        calls = []
+
+        def interrupted_merge(command, recipes):
+            calls.append(recipes)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return merge(command, recipes)
+
+        with patch.object(ImportCommand, '_merge', interrupted_merge):
+            with self.assertRaises(KeyboardInterrupt):
+                self._import(batch_size=2)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        with open(f'{self.path}.progress') as file:
+            self.assertEqual(json.load(file)['line'], 2)
+
+        out, err = self._import(batch_size=2)
+
+        self.assertIn('Resuming after line 2', out)
+        self.assertIn('Imported 3 recipes from 3 lines', out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [f'Recipe {i}' for i in range(5)])
+
+    def test_import_process_pool(self):
+        """
+        Test lines parsed by worker processes are imported in order
+        """
+        self._write([self._recipe(i) for i in range(7)])
+
+        out, err = self._import(workers=2, batch_size=2)
+
+        self.assertIn('Imported 7 recipes from 7 lines', out)
+        self.assertEqual(Recipe.objects.count(), 7)
+
+
+class SeedDataCommandTests(TestCase):
+    """
+    Test generating synthetic data
+    """
+
+    def _seed(self, seed):
+        """
+        Seed a small dataset and return what was generated
+
+        Statistics are not refreshed, ANALYZE outlives the test rollback.
+        """
+        call_command(
+            'seed_data', users=20, recipes=300, seed=seed, chunk_size=7,
+            analyze=False, stdout=StringIO())
+        return {
+            'users': list(get_user_model().objects.order_by(
+                'id').values_list('email', flat=True)),
+            'recipes': [
+                (recipe.uuid, recipe.title, recipe.price,
+                 recipe.created_by.email,
+                 sorted(tag.name for tag in recipe.tags.all()))
+                for recipe in Recipe.objects.order_by('id').select_related(
+                    'created_by').prefetch_related('tags')
+            ],
+        }
+
+    def _seed_and_rollback(self, seed):
+        """
+        Return the data of a seed run, then undo the run
+        """
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                data = self._seed(seed)
+                raise RuntimeError
+        return data
+
+    def test_seed_data(self):
+        """
+        Test rows are created with links matching the id arrays
+        """
+        self._seed(0)
+
+        self.assertEqual(get_user_model().objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 300)
+        self.assertTrue(Tag.objects.exists())
+        self.assertTrue(Ingredient.objects.exists())
+        for recipe in Recipe.objects.prefetch_related('tags', 'ingredients'):
+            self.assertEqual(
+                recipe.tag_ids, sorted(tag.id for tag in recipe.tags.all()))
+            self.assertEqual(
+                recipe.ingredient_ids,
+                sorted(item.id for item in recipe.ingredients.all()))
+            for item in [*recipe.tags.all(), *recipe.ingredients.all()]:
+                self.assertEqual(item.created_by_id, recipe.created_by_id)
+        # Sequences continue after the explicit ids
+        self.assertGreater(
+            create_user(email='new@example.com').id,
+            Recipe.objects.order_by('-created_by_id')[0].created_by_id)
+
+    def test_seed_data_deterministic(self):
+        """
+        Test the same seed generates the same data and another seed differs
+        """
+        data = self._seed_and_rollback(1)
+
+        self.assertEqual(self._seed_and_rollback(1), data)
+        self.assertNotEqual(self._seed_and_rollback(2), data)
+
+    def test_seed_users_without_recipes(self):
+        """
+        Test seeding empty tables leaves their sequences starting at 1
+        """
+        call_command(
+            'seed_data', users=3, recipes=0, seed=0, analyze=False,
+            stdout=StringIO())
+
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertFalse(Recipe.objects.exists())
+        user = get_user_model().objects.first()
+        self.assertIsNotNone(create_recipe(user).id)
+
+    def test_recipes_per_user_skewed(self):
+        """
+        Test a few users own most of the recipes
+        """
+        self._seed(0)
+
+        counts = sorted(
+            Recipe.objects.values('created_by').annotate(
+                count=Count('id')).values_list('count', flat=True),
+            reverse=True)
+        self.assertGreater(sum(counts[:4]), 150)
+
+
+class BenchmarkRecipeCommandTests(TestCase):
+    """
+    Test the recipe benchmark commands
+    """
+
+    def test_benchmark_m2m_update(self):
+        """
+        Test benchmark reports both strategies and leaves no data behind
+        """
+        out = StringIO()
+        call_command('benchmark_m2m_update', items=5, rounds=2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('clear-and-add', output)
+        self.assertIn('diff', output)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_serializers(self):
+        """
+        Test benchmark reports both serializers with matching output
+        """
+        out = StringIO()
+        err = StringIO()
+        call_command(
+            'benchmark_recipe_serializers',
+            rows=20,
+            rounds=1,
+            stdout=out,
+            stderr=err,
+        )
+
+        output = out.getvalue()
+        self.assertIn('serializer', output)
+        self.assertIn('speedup', output)
+        self.assertEqual(err.getvalue(), '')
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_renderers(self):
+        """
+        Test benchmark reports every measure and leaves no data behind
+        """
+        out = StringIO()
+        call_command(
+            'benchmark_recipe_renderers', rows=5, rounds=1, stdout=out)
+
+        output = out.getvalue()
+        for measure in ['list', 'detail', 'render', 'parse']:
+            self.assertIn(measure, output)
+        self.assertIn('default= calls per list: none', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkEndpointsCommandTests(TestCase):
+    """
+    Test benchmarking the api endpoints
+    """
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com')
+        recipe = create_recipe(self.user, title='Red curry')
+        recipe.tags.add(create_tag(user=self.user, name='Vegan'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'endpoints.json')
+
+    def _benchmark(self, **options):
+        out = StringIO()
+        call_command(
+            'benchmark_endpoints', recipes=0, requests=2, warmup=1,
+            concurrency=1, baseline=self.path, stdout=out, stderr=StringIO(),
+            **options)
+        return out.getvalue()
+
+    def test_saves_baseline(self):
+        """
+        Test every route succeeds and the first run becomes the baseline
+        """
+        out = self._benchmark()
+
+        self.assertIn('Saved baseline', out)
+        with open(self.path) as file:
+            results = json.load(file)['results']
+        for name in [
+            'health-check', 'user-create', 'user-token-create', 'user-self',
+            'recipe-list-tags', 'recipe-detail', 'recipe-delete',
+            'recipe-upload-image', 'tag-suggest', 'ingredient-delete',
+        ]:
+            self.assertEqual(results[name]['requests'], 2)
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+        # Everything the run created is removed again
+        self.assertEqual(list(get_user_model().objects.all()), [self.user])
+
+    def test_flags_regressions(self):
+        """
+        Test results worse than the baseline fail the command
+        """
+        self._benchmark(scenarios=['health-check'])
+        with open(self.path) as file:
+            baseline = json.load(file)
+        baseline['results']['health-check'].update(p50=0.0001, queries=-1)
+        with open(self.path, 'w') as file:
+            json.dump(baseline, file)
+
+        with self.assertRaisesMessage(CommandError, 'regressions'):
+            self._benchmark(scenarios=['health-check'], min_delta=0)
+
+    def test_no_regressions(self):
+        """
+        Test comparing against a generous baseline passes
+        """
+        self._benchmark(scenarios=['health-check'])
+
+        out = self._benchmark(scenarios=['health-check'], threshold=1000)
+
+        self.assertIn('No regressions', out)
+
+
+class ReplayCollectionCommandTests(LiveServerTestCase):
+    """
+    Test replaying a Thunder Client collection against a live server
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        create_recipe(self.user, title='Red curry')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        write_collection(self.directory, [
+            TOKEN_REQUEST,
+            thunder_request('List Recipes', '{{url}}/api/recipes/'),
+            thunder_request('Missing', '{{url}}/api/missing/'),
+        ])
+
+    def _replay(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'replay_collection', collection=self.directory,
+            base_url=self.live_server_url, rate=50, duration=0.6,
+            concurrency=2, stdout=out, stderr=err, **options)
+        return out.getvalue()
+
+    def test_replay(self):
+        """
+        Test the weighted mix is replayed with histograms per request
+        """
+        out = self._replay(weight=['List Recipes=3', 'Missing=0'])
+
+        self.assertIn('30 requests in', out)
+        self.assertNotIn('Missing', out)
+        self.assertRegex(out, r'List Recipes: \d+ requests, 0 errors')
+        self.assertRegex(out, r'Get JWT: \d+ requests, 0 errors')
+        self.assertRegex(out, r'<\d+ ms +\d+ #+')
+
+    def test_replay_counts_errors(self):
+        """
+        Test failing requests are reported as errors
+        """
+        out = self._replay(weight=['Get JWT=0', 'List Recipes=0'])
+
+        self.assertIn('Missing: 30 requests, 30 errors', out)
+
+    def test_bad_credentials(self):
+        """
+        Test a failing login stops the replay
+        """
+        with self.assertRaisesMessage(CommandError, 'Login failed with 401'):
+            self._replay(password='wrong_password')
+
+    def test_missing_collection(self):
+        """
+        Test replaying without an existing collection fails clearly
+        """
+        with self.assertRaisesMessage(
+                CommandError, 'Give a --collection or a --profile'):
+            call_command('replay_collection', base_url=self.live_server_url)
+
+        missing = os.path.join(self.directory, 'missing')
+        with self.assertRaisesMessage(
+                CommandError, f'Thunder Client collection {missing} not '
+                'found'):
+            call_command(
+                'replay_collection', collection=missing,
+                base_url=self.live_server_url)
+
+    def test_export_profile(self):
+        """
+        Test the converted profile can be exported and replayed
+        """
+        path = os.path.join(self.directory, 'profile.json')
+
+        self._replay(export=path)
+        with open(path) as file:
+            profile = json.load(file)
+        out = self._replay(profile=path, weight=['Missing=0'])
+
+        self.assertEqual(len(profile['requests']), 3)
+        self.assertRegex(out, r'List Recipes: \d+ requests, 0 errors')
+
+
+class ReplayTrafficCommandTests(LiveServerTestCase):
+    """
+    Test replaying captured traffic against a live server
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        create_recipe(self.user, title='Red curry')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traffic.jsonl')
+        records = [
+            {'method': 'POST', 'path': '/api/user/token/create/',
+             'route': 'api/user/token/create/', 'query': {},
+             'body_type': 'json',
+             'body': {'email': 'someone@example.com',
+                      'password': '[REDACTED]'}},
+            {'method': 'GET', 'path': '/api/recipes/',
+             'route': 'api/recipes/',
+             'query': {'search': ['curry'], 'token': '[REDACTED]'},
+             'body_type': 'none', 'body': None},
+            {'method': 'POST', 'path': '/api/recipes/x/upload-image/',
+             'route': 'api/recipes/<uuid>/upload-image/', 'query': {},
+             'body_type': 'multipart/form-data', 'body': {'size': 10}},
+            {'method': 'GET', 'path': '/api/tags/', 'route': 'api/tags/',
+             'query': {}, 'body_type': 'none', 'body': None},
+        ]
+        with open(self.path, 'w') as file:
+            for second, record in enumerate(records):
+                record['time'] = f'2024-01-01T00:00:0{second}+00:00'
+                file.write(json.dumps(record) + '\n')
+
+    def test_replay_traffic(self):
+        """
+        Test captured requests are replayed with the test user's token
+        """
+        out, err = StringIO(), StringIO()
+
+        call_command(
+            'replay_traffic', self.path, base_url=self.live_server_url,
+            email='test@example.com', password='test_password', speed=10,
+            stdout=out, stderr=err)
+
+        out = out.getvalue()
+        self.assertIn('Skipped 1 requests', err.getvalue())
+        self.assertIn('3 requests in', out)
+        for name in [
+            'POST api/user/token/create/', 'GET api/recipes/',
+            'GET api/tags/',
+        ]:
+            self.assertIn(f'{name}: 1 requests, 0 errors', out)
+
+
+class SlowQueriesCommandTests(TestCase):
+    """
+    Test summarising the slow query log
+    """
+
+    def setUp(self):
+        for view, duration_ms, sql, plan in [
+            ('recipe:recipe-list', 900, 'SELECT * FROM a WHERE id = ?', ''),
+            ('recipe:recipe-list', 1100, 'SELECT * FROM a WHERE id = ?',
+             'Seq Scan on a'),
+            ('recipe:tag-list', 1500, 'SELECT * FROM b', ''),
+        ]:
+            SlowQuery.objects.create(
+                fingerprint=sql[:32], sql=sql, view=view,
+                duration_ms=duration_ms, plan=plan)
+
+    def test_summary(self):
+        """
+        Test fingerprints are ranked by total time with their plan
+        """
+        out = StringIO()
+
+        call_command('slow_queries', '--plans', stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('1. SELECT * FROM a WHERE id = ?'))
+        self.assertIn('2 queries, total 2000.0 ms, mean 1000.0 ms', lines[0])
+        self.assertEqual(lines[1], '   views: recipe:recipe-list')
+        self.assertEqual(lines[4], '     Seq Scan on a')
+        self.assertTrue(lines[5].startswith('2. SELECT * FROM b'))
+
+    def test_order_and_view(self):
+        """
+        Test ranking by the slowest query and filtering by view
+        """
+        by_max, by_view = StringIO(), StringIO()
+
+        call_command('slow_queries', '--order', 'max', stdout=by_max)
+        call_command(
+            'slow_queries', '--view', 'recipe:tag-list', stdout=by_view)
+
+        self.assertTrue(by_max.getvalue().startswith('1. SELECT * FROM b'))
+        self.assertIn('1 queries', by_view.getvalue())
+        self.assertNotIn('FROM a', by_view.getvalue())
+
+    def test_prune(self):
+        """
+        Test old queries are deleted
+        """
+        SlowQuery.objects.filter(view='recipe:tag-list').update(
+            created_at=timezone.now() - timedelta(days=10))
+
+        call_command('slow_queries', '--prune', '7', stdout=StringIO())
+        out = StringIO()
+        call_command(
+            'slow_queries', '--view', 'recipe:tag-list', stdout=out)
+
+        self.assertEqual(SlowQuery.objects.count(), 2)
+        self.assertIn('No slow queries', out.getvalue())
@@ -0,0 +1,159 @@
+"""
+Test the planner uses the composite indexes for api queries
+"""
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import F, Value
+from django.test import TestCase
+
+from core.models import (
+    SUGGEST_NAMES_SQL,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core.tests.test_models import (
+    create_user,
+    create_recipe,
+    create_tag,
+    create_ingredient,
+)
+from recipe.pagination import RowComparison
+
+
+class CompositeIndexTests(TestCase):
+    """
+    Test EXPLAIN plans of the hot queries
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+        )
+        self.tag = create_tag(user=self.user, name='Vegan')
+        self.ingredient = create_ingredient(user=self.user, name='Rice')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+
+        # Test tables are tiny, make sequential scans unattractive so the
+        # plan shows which index the planner considers for the query.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_recipe_list_uses_index(self):
+        """
+        Test recipe list by user newest first reads the index in order
+        """
+        queryset = Recipe.objects.filter(
+            created_by=self.user).order_by('-id')[:100]
+
+        self.assertUsesIndex(queryset, 'core_recipe_created_by_id_idx')
+
+    def test_name_keyset_page_uses_index(self):
+        """
+        Test tag and ingredient cursor pages seek the index
+        """
+        for model, index_name in [
+            (Tag, 'core_tag_created_by_name_idx'),
+            (Ingredient, 'core_ingr_created_by_name_idx'),
+        ]:
+            # On a test sized table the planner can prefer the foreign
+            # key index plus a sort, drop it for this transaction only.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT indexname FROM pg_indexes WHERE tablename = %s '
+                    "AND indexdef LIKE '%%(created_by_id)'",
+                    [model._meta.db_table],
+                )
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f'DROP INDEX {name}')
+            queryset = model.objects.filter(
+                RowComparison(
+                    [F('name'), F('id')], '<', [Value('Zucchini'), Value(1)]),
+                created_by=self.user,
+            ).order_by('-name', '-id')[:100]
+
+            self.assertUsesIndex(queryset, index_name)
+
+    def test_through_tables_use_reverse_index(self):
+        """
+        Test looking up recipes of a tag or ingredient uses its index
+        """
+        tag_links = Recipe.tags.through.objects.filter(
+            tag=self.tag).values_list('recipe_id', flat=True)
+        ingredient_links = Recipe.ingredients.through.objects.filter(
+            ingredient=self.ingredient).values_list('recipe_id', flat=True)
+
+        self.assertUsesIndex(tag_links, 'core_recipe_tags_tag_recipe_idx')
+        self.assertUsesIndex(
+            ingredient_links, 'core_recipe_ingr_ingr_recipe_idx')
+
+    def test_recipe_filter_uses_gin_index(self):
+        """
+        Test filtering on several tags is a single GIN index lookup
+        """
+        tag_ids = [self.tag.id] + [
+            create_tag(user=self.user, name=f'Tag {i}').id for i in range(4)]
+        # GIN indexes are only read through bitmap scans
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_bitmapscan = on')
+        queryset = Recipe.objects.filter(tag_ids__contains=tag_ids)
+        plan = queryset.explain()
+
+        self.assertIn('core_recipe_tag_ids_gin', plan)
+        self.assertNotIn('Join', plan)
+
+    def test_recipe_search_uses_gin_index(self):
+        """
+        Test full text search reads the search vector GIN index
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_bitmapscan = on')
+        queryset = Recipe.objects.filter(
+            search_vector=SearchQuery('curry', config=Recipe.SEARCH_CONFIG))
+
+        self.assertIn('core_recipe_search_vector_gin', queryset.explain())
+
+    def test_suggest_uses_trigram_index(self):
+        """
+        Test tag and ingredient suggestions can read the trigram GIN index
+        """
+        with connection.cursor() as cursor:
+            # The trigram index is only read through bitmap scans
+            cursor.execute('SET LOCAL enable_bitmapscan = on')
+            for model, index_name in [
+                (Tag, 'core_tag_name_trgm_gin'),
+                (Ingredient, 'core_ingr_name_trgm_gin'),
+            ]:
+                table = model._meta.db_table
+                # On a test sized table the plain created_by indexes are
+                # always cheaper, drop them for this transaction only.
+                cursor.execute(
+                    'SELECT indexname FROM pg_indexes '
+                    'WHERE tablename = %s AND indexname <> %s '
+                    "AND indexdef LIKE '%%(created_by_id%%'",
+                    [table, index_name],
+                )
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f'DROP INDEX {name}')
+                cursor.execute(
+                    'EXPLAIN ' + SUGGEST_NAMES_SQL.format(table=table),
+                    {
+                        'user_id': self.user.pk,
+                        'query': 'chiken',
+                        'prefix': 'chiken%',
+                        'limit': 10,
+                    },
+                )
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+                self.assertIn(index_name, plan)
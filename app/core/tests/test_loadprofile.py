@@ -0,0 +1,147 @@
+"""
+Test converting the Thunder Client collection to a load profile
+"""
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.loadprofile import load_thunder_collection, substitute
+
+
+def write_collection(directory, requests, activity=(), environments=None):
+    """
+    Write Thunder Client collection files to a directory
+    """
+    files = {
+        'thunderclient.json': requests,
+        'thunderCollection.json': [{'_id': 'col', 'colName': 'Users'}],
+        'thunderEnvironment.json': environments or [{
+            'name': 'Development',
+            'default': True,
+            'data': [{'name': 'url', 'value': 'http://localhost:8000'}],
+        }],
+        'thunderActivity.json': list(activity),
+    }
+    for name, data in files.items():
+        with open(os.path.join(directory, name), 'w') as file:
+            json.dump(data, file)
+
+
+def thunder_request(name, url, method='GET', sort=0, **params):
+    """
+    Return a Thunder Client request
+    """
+    return {
+        '_id': name, 'colId': 'col', 'name': name, 'url': url,
+        'method': method, 'sortNum': sort, 'headers': [], 'params': [],
+        **params,
+    }
+
+
+TOKEN_REQUEST = thunder_request(
+    'Get JWT', '{{url}}/api/user/token/create/', 'POST',
+    body={'type': 'formdata', 'raw': '', 'form': [
+        {'name': 'email', 'value': 'test@example.com'},
+        {'name': 'password', 'value': 'test_password'},
+        {'name': 'unused', 'value': 'x', 'isDisabled': True},
+    ]},
+)
+
+
+class LoadProfileTests(SimpleTestCase):
+    """
+    Test load profiles built from Thunder Client files
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_substitute(self):
+        """
+        Test known placeholders are replaced in nested values
+        """
+        value = {'a': ['{{url}}/x', '{{ missing }}'], 'b': 1}
+
+        self.assertEqual(
+            substitute(value, {'url': 'http://host'}),
+            {'a': ['http://host/x', '{{ missing }}'], 'b': 1})
+
+    def test_convert_collection(self):
+        """
+        Test requests, bodies, headers and the login are converted
+        """
+        write_collection(self.directory, [
+            thunder_request(
+                'Search', '{{url}}/api/recipes/?search=curry', sort=2,
+                headers=[{'name': 'Accept', 'value': 'application/json'}],
+                auth={'type': 'bearer', 'bearer': '{{token}}'}),
+            thunder_request(
+                'Create', '{{url}}/api/recipes/', 'POST', sort=3,
+                body={'type': 'json', 'raw': '{"title": "Curry"}'}),
+            dict(TOKEN_REQUEST, sortNum=1),
+        ])
+
+        profile = load_thunder_collection(self.directory)
+
+        self.assertEqual(profile['base_url'], 'http://localhost:8000')
+        self.assertEqual(profile['login'], {
+            'path': '/api/user/token/create/',
+            'body_type': 'form',
+            'body': {'email': 'test@example.com', 'password': 'test_password'},
+        })
+        login, search, create = profile['requests']
+        self.assertEqual(login['name'], 'Get JWT')
+        self.assertEqual(search['path'], '/api/recipes/?search=curry')
+        self.assertEqual(search['collection'], 'Users')
+        self.assertEqual(search['headers'], {
+            'Accept': 'application/json',
+            'Authorization': 'Bearer {{token}}',
+        })
+        self.assertEqual(search['body_type'], 'none')
+        self.assertEqual(create['method'], 'POST')
+        self.assertEqual(create['body_type'], 'json')
+        self.assertEqual(create['body'], {'title': 'Curry'})
+
+    def test_weights_follow_activity(self):
+        """
+        Test requests run more often by hand get larger weights
+        """
+        search = thunder_request('Search', '{{url}}/api/recipes/?search=a')
+        write_collection(
+            self.directory, [TOKEN_REQUEST, search],
+            activity=[search, search, dict(search, name='Renamed')])
+
+        profile = load_thunder_collection(self.directory)
+
+        self.assertEqual(
+            {request['name']: request['weight']
+             for request in profile['requests']},
+            {'Get JWT': 1, 'Search': 3})
+
+    def test_environment(self):
+        """
+        Test a named environment replaces the default one
+        """
+        write_collection(self.directory, [TOKEN_REQUEST], environments=[
+            {'name': 'Development', 'default': True,
+             'data': [{'name': 'url', 'value': 'http://localhost:8000'}]},
+            {'name': 'Staging',
+             'data': [{'name': 'url', 'value': 'https://staging:8443'}]},
+        ])
+
+        profile = load_thunder_collection(self.directory, 'Staging')
+
+        self.assertEqual(profile['base_url'], 'https://staging:8443')
+        with self.assertRaises(ValueError):
+            load_thunder_collection(self.directory, 'Production')
+
+    def test_empty_collection(self):
+        """
+        Test a directory without requests is rejected
+        """
+        with self.assertRaises(ValueError):
+            load_thunder_collection(self.directory)
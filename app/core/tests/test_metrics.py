@@ -0,0 +1,153 @@
+"""
+Test Prometheus metrics of the workers
+"""
+import io
+import os
+import tempfile
+from unittest import mock
+
+from PIL import Image
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY, Counter, values
+from rest_framework.test import APIClient
+
+from core.tests.test_models import create_user, create_recipe
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample(name, **labels):
+    """
+    Return the current value of a sample, 0 if not recorded yet
+    """
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class MetricsTests(TestCase):
+    """
+    Test recording and exporting metrics
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_request_metrics(self):
+        """
+        Test latency and queries are recorded per view and action
+        """
+        create_recipe(self.user)
+        labels = {'view': 'recipe:recipe-list', 'action': 'list'}
+        requests = sample(
+            'api_request_duration_seconds_count',
+            method='GET', status='200', **labels)
+        queries = sample('api_request_db_queries_sum', **labels)
+
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(sample(
+            'api_request_duration_seconds_count',
+            method='GET', status='200', **labels), requests + 1)
+        self.assertGreater(
+            sample('api_request_db_queries_sum', **labels), queries)
+        self.assertGreater(sample('api_worker_resident_memory_bytes'), 0)
+
+    def test_cache_metrics(self):
+        """
+        Test hits and misses of the default cache are counted
+        """
+        url = reverse('recipe:tag-suggest')
+        hits = sample(
+            'api_cache_requests_total', cache='default', result='hit')
+        misses = sample(
+            'api_cache_requests_total', cache='default', result='miss')
+
+        self.client.get(url, {'q': 'veg'})
+        self.client.get(url, {'q': 'veg'})
+
+        self.assertEqual(sample(
+            'api_cache_requests_total', cache='default', result='hit'),
+            hits + 1)
+        self.assertEqual(sample(
+            'api_cache_requests_total', cache='default', result='miss'),
+            misses + 1)
+
+    def test_image_upload_metrics(self):
+        """
+        Test sizes of uploaded images are observed
+        """
+        recipe = create_recipe(self.user)
+        url = reverse('recipe:recipe-upload-image', args=[recipe.uuid])
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, format='JPEG')
+        image.name = 'image.jpg'
+        size = image.tell()
+        image.seek(0)
+        before = sample('api_image_upload_bytes_sum')
+
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                result = self.client.post(
+                    url, {'image': image}, format='multipart')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(sample('api_image_upload_bytes_sum'), before + size)
+
+    def test_export(self):
+        """
+        Test local clients read metrics in the text format
+        """
+        self.client.get(RECIPES_URL)
+
+        result = self.client.get(METRICS_URL)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            b'api_request_duration_seconds_bucket{action="list"',
+            result.content)
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8'])
+    def test_export_forbidden(self):
+        """
+        Test clients outside the allowed networks are refused
+        """
+        result = self.client.get(METRICS_URL)
+
+        self.assertEqual(result.status_code, 403)
+
+    def test_private_networks_refused_by_default(self):
+        """
+        Test only localhost is allowed unless networks are configured
+        """
+        result = self.client.get(METRICS_URL, REMOTE_ADDR='10.1.2.3')
+
+        self.assertEqual(result.status_code, 403)
+
+    def test_export_multiprocess(self):
+        """
+        Test values written by several processes are added up
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        with mock.patch.dict(
+                os.environ, PROMETHEUS_MULTIPROC_DIR=directory.name):
+            for pid in [101, 102]:
+                value_class = values.MultiProcessValue(lambda pid=pid: pid)
+                with mock.patch.object(values, 'ValueClass', value_class):
+                    Counter(
+                        'test_worker_requests', 'Requests', registry=None,
+                    ).inc()
+            result = self.client.get(METRICS_URL)
+
+        self.assertIn(b'test_worker_requests_total 2.0', result.content)
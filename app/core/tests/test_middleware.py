@@ -0,0 +1,201 @@
+"""
+Test the app middleware
+"""
+import glob
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.middleware import REDACTED, get_query_budget, redact
+from core.tests.test_models import create_user, create_recipe
+from recipe.views import RecipeViewSet
+from user.views import RetrieveUpdateUserAPIView
+
+
+class TrafficCaptureMiddlewareTests(TestCase):
+    """
+    Test sampling requests to JSONL files
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        settings = override_settings(
+            TRAFFIC_CAPTURE_RATE=1,
+            TRAFFIC_CAPTURE_PATH=os.path.join(
+                self.directory, 'traffic-{pid}.jsonl'),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+
+    def _records(self):
+        records = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*'))):
+            with open(path) as file:
+                records += [json.loads(line) for line in file]
+        return records
+
+    def test_redact(self):
+        """
+        Test sensitive keys are redacted in nested data
+        """
+        data = {'email': 'a@example.com', 'password': 'secret',
+                'items': [{'refresh': 'x', 'name': 'Vegan'}]}
+
+        self.assertEqual(redact(data), {
+            'email': 'a@example.com', 'password': REDACTED,
+            'items': [{'refresh': REDACTED, 'name': 'Vegan'}]})
+
+    def test_capture_request(self):
+        """
+        Test requests are recorded with route, timing and query count
+        """
+        res = self.client.post(reverse('user:token-create'), {
+            'email': 'test@example.com', 'password': 'test_password'},
+            format='json')
+        token = res.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(
+            reverse('recipe:recipe-list'), {'search': 'curry', 'token': 'x'})
+
+        login, search = self._records()
+        self.assertEqual(os.path.basename(glob.glob(
+            os.path.join(self.directory, '*'))[0]),
+            f'traffic-{os.getpid()}.jsonl')
+        self.assertEqual(login['method'], 'POST')
+        self.assertEqual(login['route'], 'api/user/token/create/')
+        self.assertEqual(login['body_type'], 'json')
+        self.assertEqual(login['body'], {
+            'email': 'test@example.com', 'password': REDACTED})
+        self.assertEqual(login['status'], status.HTTP_200_OK)
+        self.assertFalse(login['authenticated'])
+        self.assertGreater(login['duration_ms'], 0)
+        self.assertGreaterEqual(login['queries'], 1)
+        self.assertEqual(search['path'], '/api/recipes/')
+        self.assertEqual(
+            search['query'], {'search': ['curry'], 'token': REDACTED})
+        self.assertTrue(search['authenticated'])
+        self.assertNotIn(token, json.dumps(search))
+
+    def test_upload_body_not_recorded(self):
+        """
+        Test file uploads are recorded by content type and size only
+        """
+        self.client.force_authenticate(self.user)
+        recipe = create_recipe(self.user)
+        self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.uuid]),
+            {'image': SimpleUploadedFile('a.jpg', b'not an image')},
+            format='multipart')
+
+        record, = self._records()
+        self.assertEqual(record['body_type'], 'multipart/form-data')
+        self.assertGreater(record['body']['size'], 0)
+        self.assertEqual(record['status'], status.HTTP_400_BAD_REQUEST)
+
+    def test_rotation(self):
+        """
+        Test full files are rotated
+        """
+        with override_settings(TRAFFIC_CAPTURE_MAX_BYTES=500):
+            client = APIClient()
+            for i in range(5):
+                client.get(reverse('health-check'))
+
+        self.assertEqual(len(self._records()), 5)
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+
+    def test_sampling(self):
+        """
+        Test nothing is recorded when the rate is 0
+        """
+        with override_settings(TRAFFIC_CAPTURE_RATE=0):
+            client = APIClient()
+            client.get(reverse('health-check'))
+
+        self.assertEqual(self._records(), [])
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    """
+    Test enforcing the query budgets of views
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        create_recipe(self.user)
+        create_recipe(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_get_query_budget(self):
+        """
+        Test budgets are found by action, method or for the whole view
+        """
+        list_view = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        user_view = RetrieveUpdateUserAPIView.as_view()
+
+        self.assertEqual(get_query_budget(list_view, 'GET'), 6)
+        self.assertEqual(get_query_budget(list_view, 'POST'), 12)
+        self.assertEqual(get_query_budget(user_view, 'PATCH'), 2)
+        self.assertIsNone(get_query_budget(lambda request: None, 'GET'))
+        with mock.patch.object(RecipeViewSet, 'query_budget', {'get': 1}):
+            self.assertEqual(get_query_budget(list_view, 'GET'), 1)
+
+    def test_within_budget(self):
+        """
+        Test requests within budget are not logged
+        """
+        with self.assertNoLogs('core.querybudget', 'WARNING'):
+            result = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @mock.patch.object(RecipeViewSet, 'query_budget', {'list': 0})
+    def test_over_budget_warns(self):
+        """
+        Test requests over budget log their SQL fingerprints
+        """
+        with self.assertLogs('core.querybudget', 'WARNING') as logs:
+            result = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        record, = logs.records
+        self.assertEqual(record.view, 'recipe:recipe-list')
+        self.assertEqual(record.budget, 0)
+        self.assertEqual(
+            record.queries,
+            sum(item['count'] for item in record.fingerprints))
+        self.assertIn('FROM "core_recipe"', record.fingerprints[0]['sql'])
+        self.assertIn('over its budget of 0', record.getMessage())
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    @mock.patch.object(RecipeViewSet, 'query_budget', {'list': 0})
+    def test_strict_fails(self):
+        """
+        Test strict mode fails requests over budget
+        """
+        with self.assertLogs('core.querybudget', 'WARNING'):
+            result = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(
+            result.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        body = result.json()
+        self.assertEqual(body['detail'], 'Query budget exceeded.')
+        self.assertEqual(body['budget'], 0)
+        self.assertGreater(body['queries'], 0)
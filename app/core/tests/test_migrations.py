@@ -0,0 +1,55 @@
+"""
+Test for data migrations
+"""
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateNamesMigrationTests(TransactionTestCase):
+    """
+    Test duplicate tags and ingredients are merged per user
+    """
+    migrate_from = [('core', '0005_recipe_image')]
+    migrate_to = [('core', '0006_unique_user_tag_ingredient_name')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def test_duplicates_merged(self):
+        """
+        Test recipes link to the surviving tag after the merge
+        """
+        User = self.apps.get_model('core', 'User')
+        Recipe = self.apps.get_model('core', 'Recipe')
+        Tag = self.apps.get_model('core', 'Tag')
+        user = User.objects.create(email='test@example.com')
+        other_user = User.objects.create(email='test2@example.com')
+        kept = Tag.objects.create(created_by=user, name='Vegan')
+        duplicate = Tag.objects.create(created_by=user, name='vegan')
+        other = Tag.objects.create(created_by=other_user, name='vegan')
+        recipe_1 = Recipe.objects.create(
+            created_by=user, title='One', time_minutes=1, price='1.00')
+        recipe_2 = Recipe.objects.create(
+            created_by=user, title='Two', time_minutes=1, price='1.00')
+        recipe_1.tags.add(kept, duplicate)
+        recipe_2.tags.add(duplicate)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+        self.assertEqual(
+            set(Tag.objects.values_list('id', flat=True)),
+            {kept.id, other.id})
+        self.assertEqual(
+            list(recipe_1.tags.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(
+            list(recipe_2.tags.values_list('id', flat=True)), [kept.id])
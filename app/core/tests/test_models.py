@@ -5,6 +5,7 @@ Test for models
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -169,6 +170,82 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_per_user_ignoring_case(self):
+        """
+        Test a user cannot have two tags differing only by case
+        """
+        user = create_user(email='test@example.com', password='test_pass')
+        other_user = create_user(
+            email='test2@example.com', password='test_pass')
+        create_tag(user=user, name='Vegan')
+        create_tag(user=other_user, name='vegan')
+
+        with self.assertRaises(IntegrityError):
+            create_tag(user=user, name='VEGAN')
+
+    def test_get_or_create_by_names(self):
+        """
+        Test names resolve to existing items and missing ones are created
+        """
+        user = create_user(email='test@example.com', password='test_pass')
+        salt = create_ingredient(user=user, name='Salt')
+
+        ingredients = Ingredient.objects.get_or_create_by_names(
+            user, ['salt', 'Pepper', 'pepper'])
+
+        self.assertEqual(len(ingredients), 2)
+        self.assertIn(salt, ingredients)
+        self.assertEqual(
+            sorted(ingredient.name for ingredient in ingredients),
+            ['Pepper', 'Salt'])
+        self.assertEqual(
+            Ingredient.objects.filter(created_by=user).count(), 2)
+
+    def test_get_or_create_by_names_non_ascii(self):
+        """
+        Test every name is matched as the database folds its case
+        """
+        user = create_user(email='test@example.com', password='test_pass')
+        create_tag(user=user, name='i')
+        names = ['İ', 'i', 'I', 'É', 'é']
+
+        tags = Tag.objects.get_or_create_by_names(user, names)
+
+        self.assertEqual(
+            sorted(name for tag in tags for name in tag.input_names),
+            sorted(names))
+        self.assertEqual(
+            len(tags), Tag.objects.filter(created_by=user).count())
+
+    def test_recipe_link_ids_synced(self):
+        """
+        Test recipe tag and ingredient id arrays follow the links
+        """
+        user = create_user(email='test@example.com', password='test_pass')
+        recipe = create_recipe(user=user)
+        vegan = create_tag(user=user, name='Vegan')
+        spicy = create_tag(user=user, name='Spicy')
+        rice = create_ingredient(user=user, name='Rice')
+
+        recipe.tags.add(vegan, spicy)
+        recipe.ingredients.add(rice)
+        stale = Recipe.objects.get(pk=recipe.pk)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tag_ids, sorted([vegan.id, spicy.id]))
+        self.assertEqual(recipe.ingredient_ids, [rice.id])
+
+        recipe.tags.remove(vegan)
+        rice.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tag_ids, [spicy.id])
+        self.assertEqual(recipe.ingredient_ids, [])
+
+        stale.title = 'New title'
+        stale.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(recipe.tag_ids, [spicy.id])
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """
@@ -0,0 +1,119 @@
+"""
+Test on demand profiling of requests
+"""
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.profiling import Sampler
+from core.tests.test_models import create_user, create_recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def busy_wait(seconds):
+    """
+    Keep the thread running for some time
+    """
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class SamplerTests(SimpleTestCase):
+    """
+    Test sampling stacks
+    """
+
+    def test_folded_stacks(self):
+        """
+        Test stacks are folded from the root with their counts
+        """
+        with Sampler(interval=0.001) as sampler:
+            busy_wait(0.05)
+
+        lines = sampler.folded().splitlines()
+        self.assertGreater(sampler.samples, 5)
+        self.assertTrue(any(
+            'test_folded_stacks;core.tests.test_profiling:busy_wait ' in line
+            for line in lines))
+        self.assertEqual(
+            sum(int(line.rsplit(' ', 1)[1]) for line in lines),
+            sampler.samples)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """
+    Test profiling requests of staff users
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(PROFILING_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = create_user(
+            email='test@example.com', password='test_password',
+            is_staff=True)
+        create_recipe(self.user)
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_profile_header(self):
+        """
+        Test the header stores a profile of the request
+        """
+        result = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(result.data['results']), 1)
+        name = result['X-Profile']
+        self.assertRegex(
+            name, r'^\d{8}T\d{6}-recipe_recipe-list-\w{8}\.folded$')
+        self.assertEqual(os.listdir(self.directory), [name])
+
+    def test_profile_download(self):
+        """
+        Test the query param returns the stacks instead of the response
+        """
+        result = self.client.get(RECIPES_URL, {'profile': 'download'})
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result['Content-Type'], 'text/plain')
+        self.assertIn(b'recipe.views:', result.content)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_not_staff(self):
+        """
+        Test other users and invalid tokens are not profiled
+        """
+        self.user.is_staff = False
+        self.user.save()
+
+        result = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        invalid = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertNotIn('X-Profile', result)
+        self.assertEqual(invalid.status_code, 401)
+        self.assertNotIn('X-Profile', invalid)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_no_trigger(self):
+        """
+        Test staff requests without the trigger are not profiled
+        """
+        result = self.client.get(RECIPES_URL)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertNotIn('X-Profile', result)
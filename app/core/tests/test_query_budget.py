@@ -0,0 +1,131 @@
+"""
+Query budget assertions for API tests
+"""
+from collections import Counter
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Tag
+from core.slowqueries import normalize
+from core.tests.test_models import create_user, create_tag
+
+
+def describe_queries(queries):
+    """
+    Return the queries grouped by fingerprint, most frequent first
+    """
+    counts = Counter(normalize(query['sql']) for query in queries)
+    return '\n'.join(
+        f'  {count} x {sql}' for sql, count in counts.most_common())
+
+
+class QueryBudgetMixin:
+    """
+    Mixin for TestCase asserting how many queries requests run
+    """
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        """
+        Fail if calling func runs more than budget queries
+        """
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        if len(context) > budget:
+            self.fail(
+                f'{len(context)} queries over the budget of {budget}:\n'
+                + describe_queries(context.captured_queries))
+        return result
+
+    def assertQueriesFlat(self, func, add_rows, sizes=(1, 10),
+                          budget=None):
+        """
+        Fail if the queries of func grow with the number of rows
+
+        `add_rows(count)` creates count more rows, func is called once
+        the rows reach each of the sizes and every call must run the same
+        queries, and no more than budget when given.
+        """
+        runs = []
+        rows = 0
+        for size in sizes:
+            add_rows(size - rows)
+            rows = size
+            with CaptureQueriesContext(connection) as context:
+                result = func()
+            self.assertLess(
+                getattr(result, 'status_code', 200), 400,
+                f'Request failed at {size} rows')
+            runs.append((size, context.captured_queries))
+
+        (first_size, first), *others = runs
+        for size, queries in others:
+            if len(queries) != len(first):
+                grown = Counter(
+                    normalize(query['sql']) for query in queries)
+                grown.subtract(
+                    normalize(query['sql']) for query in first)
+                self.fail(
+                    f'{len(first)} queries at {first_size} rows but '
+                    f'{len(queries)} at {size} rows, changed:\n'
+                    + '\n'.join(
+                        f'  {count:+d} x {sql}'
+                        for sql, count in grown.most_common() if count))
+        if budget is not None:
+            for size, queries in runs:
+                if len(queries) > budget:
+                    self.fail(
+                        f'{len(queries)} queries over the budget of '
+                        f'{budget} at {size} rows:\n'
+                        + describe_queries(queries))
+        return result
+
+
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+    """
+    Test the query budget assertions
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+
+    def add_tags(self, count):
+        for i in range(count):
+            create_tag(user=self.user, name=f'Tag {Tag.objects.count()}')
+
+    def test_budget(self):
+        """
+        Test the budget fails with the queries run
+        """
+        self.assertQueryBudget(1, Tag.objects.count)
+
+        with self.assertRaisesRegex(
+                AssertionError, r'2 queries over the budget of 1:\n'
+                r'  2 x SELECT COUNT\(\*\)'):
+            self.assertQueryBudget(
+                1, lambda: [Tag.objects.count() for i in range(2)])
+
+    def test_flat(self):
+        """
+        Test a constant number of queries passes
+        """
+        names = self.assertQueriesFlat(
+            lambda: list(Tag.objects.values_list('name', flat=True)),
+            self.add_tags, budget=1)
+
+        self.assertEqual(len(names), 10)
+
+    def test_growing(self):
+        """
+        Test a query per row fails with the repeated query
+        """
+        def names():
+            return [
+                Tag.objects.get(id=tag.id).name for tag in Tag.objects.all()]
+
+        with self.assertRaisesRegex(
+                AssertionError, r'2 queries at 1 rows but 11 at 10 rows, '
+                r'changed:\n  \+9 x SELECT'):
+            self.assertQueriesFlat(names, self.add_tags)
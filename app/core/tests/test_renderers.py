@@ -0,0 +1,164 @@
+"""
+Test the fast JSON renderer and parser
+"""
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """
+    Test output is the same as JSONRenderer
+    """
+
+    def setUp(self):
+        self.data = ReturnList([
+            ReturnDict({
+                'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+                'price': Decimal('5.75'),
+                'created_at': datetime.datetime(
+                    2021, 6, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+                'naive': datetime.datetime(2021, 6, 1, 12, 30),
+                'date': datetime.date(2021, 6, 1),
+                'offset': datetime.datetime(
+                    2021, 6, 1, 12, 30,
+                    tzinfo=datetime.timezone(datetime.timedelta(hours=5))),
+                'title': 'Crème brûlée\u2028\u2029line',
+                'lazy': gettext_lazy('Vegan'),
+                'tags': [{'name': 'Vegan'}],
+                'link': None,
+                'minutes': 10,
+                'ratio': 0.5,
+                'ok': True,
+            }, serializer=None),
+        ], serializer=None)
+
+    def test_same_output_as_json_renderer(self):
+        """
+        Test native and fallback types render like the stdlib
+        """
+        self.assertEqual(
+            FastJSONRenderer().render(self.data),
+            JSONRenderer().render(self.data))
+
+    def test_datetime_precision(self):
+        """
+        Test microseconds and offsets render like the DRF encoder
+        """
+        data = [
+            datetime.datetime(2021, 6, 1, 12, 30, 15, microsecond,
+                              tzinfo=tzinfo)
+            for microsecond in [0, 1000, 123456]
+            for tzinfo in [None, timezone.utc, datetime.timezone(
+                datetime.timedelta(hours=-3, minutes=-30))]
+        ] + [datetime.time(8, 15, 0, 500), datetime.date(2021, 6, 1)]
+
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_non_finite_floats_render_null(self):
+        """
+        Test NaN and infinity render as null where JSONRenderer raises
+        """
+        for value in [float('nan'), float('inf'), float('-inf')]:
+            data = {'ratio': value}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+
+            self.assertEqual(
+                FastJSONRenderer().render(data), b'{"ratio":null}')
+
+    def test_indent_uses_stdlib(self):
+        """
+        Test pretty printing requests keep JSONRenderer formatting
+        """
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type))
+
+    def test_big_int_falls_back(self):
+        """
+        Test values orjson rejects are rendered by the stdlib
+        """
+        data = {'big': 2 ** 70}
+
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_without_orjson(self):
+        """
+        Test the renderer works when orjson is not installed
+        """
+        with mock.patch('core.renderers.orjson', None):
+            result = FastJSONRenderer().render(self.data)
+
+        self.assertEqual(result, JSONRenderer().render(self.data))
+
+    def test_none_renders_empty(self):
+        """
+        Test no data renders an empty body
+        """
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """
+    Test parsing matches JSONParser
+    """
+
+    def _parse(self, parser, body, encoding='utf-8'):
+        return parser.parse(
+            io.BytesIO(body), parser_context={'encoding': encoding})
+
+    def test_same_data_as_json_parser(self):
+        """
+        Test request bodies parse to the same data
+        """
+        body = '{"title": "Crème", "price": "5.75", "time": 1.5, ' \
+            '"tags": [{"name": "Vegan"}], "link": null}'.encode()
+
+        self.assertEqual(
+            self._parse(FastJSONParser(), body),
+            self._parse(JSONParser(), body))
+
+    def test_other_encoding(self):
+        """
+        Test non utf-8 bodies are decoded first
+        """
+        body = '{"title": "Crème"}'.encode('latin-1')
+
+        self.assertEqual(
+            self._parse(FastJSONParser(), body, 'latin-1'),
+            {'title': 'Crème'})
+
+    def test_invalid_json(self):
+        """
+        Test invalid bodies and NaN raise a parse error
+        """
+        for body in [b'{"title": ', b'{"price": NaN}', b'\xff']:
+            with self.assertRaises(ParseError):
+                self._parse(FastJSONParser(), body)
+
+    def test_without_orjson(self):
+        """
+        Test the parser works when orjson is not installed
+        """
+        with mock.patch('core.parsers.orjson', None):
+            result = self._parse(FastJSONParser(), b'{"title": "Curry"}')
+
+        self.assertEqual(result, {'title': 'Curry'})
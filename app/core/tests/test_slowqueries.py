@@ -0,0 +1,155 @@
+"""
+Test the slow query log
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, SlowQuery
+from core.slowqueries import SlowQueryLog, fingerprint, normalize
+from core.tests.test_models import create_user, create_recipe
+
+
+class FingerprintTests(SimpleTestCase):
+    """
+    Test grouping queries by fingerprint
+    """
+
+    def test_normalize(self):
+        """
+        Test literals, placeholders and IN lists are replaced
+        """
+        sql = normalize(
+            "SELECT \"T0\".\"id\" FROM t WHERE a = 'it''s'\n"
+            "  AND b IN (%s, %s, %s) AND c > 10 LIMIT %s")
+
+        self.assertEqual(
+            sql,
+            'SELECT "T0"."id" FROM t WHERE a = ? AND b IN (?+) '
+            'AND c > ? LIMIT ?')
+
+    def test_same_shape_same_fingerprint(self):
+        """
+        Test queries differing only in values share a fingerprint
+        """
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT 2 FROM t WHERE id IN (%s)'))
+        self.assertEqual(
+            fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO t VALUES (%s, %s)'))
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE a && ARRAY[%s, %s]'),
+            fingerprint('SELECT 1 FROM t WHERE a && ARRAY[%s]'))
+        self.assertNotEqual(
+            fingerprint('SELECT 1 FROM t WHERE id = %s'),
+            fingerprint('SELECT 1 FROM u WHERE id = %s'))
+
+
+@mock.patch.object(SlowQueryLog, 'start')
+class SlowQueryLogTests(TestCase):
+    """
+    Test catching and storing slow queries
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        create_recipe(self.user)
+
+    def test_threshold(self, patched_start):
+        """
+        Test only queries over the threshold are queued
+        """
+        log = SlowQueryLog(threshold_ms=50, explain_rate=1)
+
+        with connection.execute_wrapper(log.watch(lambda: 'view')):
+            Recipe.objects.count()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(%s)', [0.06])
+
+        entry = log.queue.get_nowait()
+        self.assertTrue(log.queue.empty())
+        self.assertEqual(entry['sql'], 'SELECT pg_sleep(%s)')
+        self.assertEqual(entry['params'], [0.06])
+        self.assertEqual(entry['view'], 'view')
+        self.assertTrue(entry['explain'])
+        self.assertGreaterEqual(entry['seconds'], 0.05)
+        patched_start.assert_called_once()
+
+    def test_full_queue_drops(self, patched_start):
+        """
+        Test queries are dropped instead of waiting for the thread
+        """
+        log = SlowQueryLog(threshold_ms=0, explain_rate=0, max_pending=1)
+
+        with connection.execute_wrapper(log.watch(lambda: 'view')):
+            Recipe.objects.count()
+            Recipe.objects.count()
+
+        self.assertEqual(log.queue.qsize(), 1)
+        self.assertEqual(log.dropped, 1)
+
+    def test_save_with_plan(self, patched_start):
+        """
+        Test a sampled query is stored with its analyzed plan
+        """
+        log = SlowQueryLog(threshold_ms=0)
+
+        slow_query = log.save(
+            'SELECT * FROM core_recipe WHERE created_by_id = %s',
+            [self.user.id], 1.5, 'recipe:recipe-list', explain=True)
+
+        slow_query.refresh_from_db()
+        self.assertEqual(slow_query.duration_ms, 1500)
+        self.assertEqual(
+            slow_query.sql,
+            'SELECT * FROM core_recipe WHERE created_by_id = ?')
+        self.assertIn('actual time=', slow_query.plan)
+        self.assertIn('Buffers:', slow_query.plan)
+
+    def test_explain_rolls_back(self, patched_start):
+        """
+        Test analyzing a query leaves no changes behind
+        """
+        log = SlowQueryLog(threshold_ms=0)
+
+        plan = log.explain(
+            'SELECT count(*) FROM core_recipe WHERE id > %s', [0])
+        failed = log.explain('SELECT missing FROM core_recipe', [])
+
+        self.assertIn('Aggregate', plan)
+        self.assertTrue(failed.startswith('EXPLAIN failed:'))
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_explain_locking_select(self, patched_start):
+        """
+        Test selects locking rows are planned without being run
+        """
+        log = SlowQueryLog(threshold_ms=0)
+
+        for clause in ['FOR UPDATE', 'for no key update', 'FOR SHARE',
+                       'FOR KEY SHARE', 'FOR UPDATE SKIP LOCKED']:
+            plan = log.explain(
+                f'SELECT * FROM core_recipe WHERE id = %s {clause}', [1])
+
+            self.assertIn('LockRows', plan)
+            self.assertNotIn('actual time=', plan)
+
+    @override_settings(SLOW_QUERY_MS=0.001, SLOW_QUERY_EXPLAIN_RATE=0)
+    def test_middleware_records_view(self, patched_start):
+        """
+        Test slow queries of a request are recorded with its view
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with mock.patch.object(SlowQueryLog, 'record') as patched_record:
+            client.get(reverse('recipe:recipe-list'))
+
+        views = {call.args[3] for call in patched_record.call_args_list}
+        self.assertEqual(views, {'recipe:recipe-list'})
@@ -0,0 +1,146 @@
+"""
+Test request timing and the Server-Timing header
+"""
+import json
+import logging
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import timing
+from core.tests.test_models import create_user, create_recipe, create_tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def parse_server_timing(header):
+    """
+    Return the duration and description of every Server-Timing metric
+    """
+    metrics = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class TimingTests(SimpleTestCase):
+    """
+    Test collecting metrics of a request
+    """
+
+    def test_timed_nested(self):
+        """
+        Test nested blocks of the same name are counted once
+        """
+        metrics, token = timing.start()
+        try:
+            with timing.timed('serializer'):
+                with timing.timed('serializer'):
+                    pass
+            timing.record('cache_hit')
+        finally:
+            timing.stop(token)
+
+        self.assertEqual(metrics.counts, {'serializer': 1, 'cache_hit': 1})
+        self.assertGreater(metrics.durations['serializer'], 0)
+
+    def test_outside_request(self):
+        """
+        Test timing outside a request records nothing
+        """
+        with timing.timed('serializer'):
+            timing.record('db', 1.0)
+
+    def test_json_formatter(self):
+        """
+        Test extra fields are formatted as JSON keys
+        """
+        record = logging.makeLogRecord({
+            'name': 'core.timing', 'levelname': 'INFO', 'msg': 'request',
+            'db_queries': 3,
+        })
+
+        data = json.loads(timing.JSONFormatter().format(record))
+
+        self.assertEqual(data['message'], 'request')
+        self.assertEqual(data['db_queries'], 3)
+        self.assertNotIn('args', data)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class ServerTimingMiddlewareTests(TestCase):
+    """
+    Test Server-Timing headers and timing logs
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='test_password')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(create_tag(user=self.user, name='Vegan'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_staff_only(self):
+        """
+        Test only staff users get the header by default
+        """
+        result = self.client.get(RECIPES_URL)
+        self.assertNotIn('Server-Timing', result)
+
+        self.user.is_staff = True
+        self.user.save()
+        result = self.client.get(RECIPES_URL)
+
+        metrics = parse_server_timing(result['Server-Timing'])
+        self.assertEqual(
+            list(metrics), ['db', 'cache', 'serializer', 'view'])
+        self.assertGreater(float(metrics['db']['dur']), 0)
+        self.assertRegex(metrics['db']['desc'], r'"[1-9]\d* queries"')
+        self.assertGreater(float(metrics['serializer']['dur']), 0)
+        self.assertGreaterEqual(
+            float(metrics['view']['dur']), float(metrics['db']['dur']))
+
+    @override_settings(SERVER_TIMING=True)
+    def test_flag_enables_header(self):
+        """
+        Test the flag adds the header for every user and cache use
+        """
+        url = reverse('recipe:tag-suggest')
+        self.client.get(url, {'q': 'veg'})
+
+        result = self.client.get(url, {'q': 'veg'})
+
+        metrics = parse_server_timing(result['Server-Timing'])
+        self.assertEqual(metrics['cache']['desc'], '"1 hits / 0 misses"')
+        self.assertEqual(metrics['db']['desc'], '"0 queries"')
+        anonymous = APIClient().get(reverse('health-check'))
+        self.assertIn('Server-Timing', anonymous)
+
+    @override_settings(SERVER_TIMING_LOG=True)
+    def test_structured_log(self):
+        """
+        Test the measures are logged as fields of a record
+        """
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            self.client.get(RECIPES_URL)
+
+        record, = logs.records
+        self.assertRegex(record.route, r'^api/recipes/')
+        self.assertEqual(record.status, 200)
+        self.assertGreater(record.db_queries, 0)
+        self.assertGreater(record.serializer_ms, 0)
+        self.assertGreaterEqual(record.view_ms, record.db_ms)
+
+    def test_no_log_by_default(self):
+        """
+        Test nothing is logged unless enabled
+        """
+        with self.assertNoLogs('core.timing', 'INFO'):
+            self.client.get(RECIPES_URL)
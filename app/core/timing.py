@@ -0,0 +1,100 @@
+"""
+Per request timing of database, cache and serializer work
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Durations in seconds and counts collected during one request
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+
+    def add(self, name, seconds=0.0, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+
+def start():
+    """
+    Start collecting metrics for the current request
+    """
+    metrics = RequestMetrics()
+    return metrics, _metrics.set(metrics)
+
+
+def stop(token):
+    _metrics.reset(token)
+
+
+def current():
+    """
+    Return the metrics of the request being timed, if any
+    """
+    return _metrics.get()
+
+
+def record(name, seconds=0.0, count=1):
+    """
+    Add a duration and count to the request, if one is being timed
+    """
+    metrics = current()
+    if metrics is not None:
+        metrics.add(name, seconds, count)
+
+
+@contextmanager
+def timed(name):
+    """
+    Time a block, nested blocks of the same name count once
+    """
+    metrics = current()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - begin)
+        metrics.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """
+    Mixin timing serialization as the serializer metric of the request
+    """
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as one JSON object with their extra fields
+    """
+    skipped = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in self.skipped)
+        return json.dumps(data, default=str)
@@ -1,11 +1,16 @@
 """
 View for core app
 """
+import ipaddress
 
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
+from core import metrics as core_metrics
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -16,3 +21,19 @@ def health_check(request):
     return Response(
         {'healthy': True}
         )
+
+
+def metrics(request):
+    """
+    Returns metrics of all workers to internal clients
+    """
+    try:
+        client = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return HttpResponseForbidden()
+    if not any(
+            client in ipaddress.ip_network(network.strip(), strict=False)
+            for network in settings.METRICS_ALLOWED_NETWORKS if network):
+        return HttpResponseForbidden()
+    content_type, content = core_metrics.export()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,64 @@
+"""
+Streaming recipe exports
+"""
+import csv
+from itertools import islice
+
+from core.renderers import FastJSONRenderer
+
+
+class Echo:
+    """
+    File like object handing back what csv.writer writes
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_chunks(rows, chunk_size):
+    """
+    Group an iterable into lists of at most chunk_size items
+    """
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, chunk_size))
+
+
+def ndjson_export(chunks, fields):
+    """
+    Yield one JSON document per recipe, a chunk of lines at a time
+    """
+    renderer = FastJSONRenderer()
+    for recipes in chunks:
+        yield b''.join(renderer.render(recipe) + b'\n' for recipe in recipes)
+
+
+def _csv_value(value):
+    """
+    Flatten tags and ingredients to their comma separated names
+    """
+    if isinstance(value, list):
+        return ', '.join(item['name'] for item in value)
+    return value
+
+
+def csv_export(chunks, fields):
+    """
+    Yield a header row then the recipe rows, a chunk at a time
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for recipes in chunks:
+        yield ''.join(
+            writer.writerow([_csv_value(recipe[name]) for name in fields])
+            for recipe in recipes
+        )
+
+
+EXPORTS = {
+    'ndjson': ('application/x-ndjson', ndjson_export),
+    'csv': ('text/csv', csv_export),
+}
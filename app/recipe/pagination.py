@@ -0,0 +1,193 @@
+"""
+Pagination for recipe apis
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, F, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class RowComparison(Func):
+    """
+    Row value comparison, e.g. `(name, id) < ('Veg', 42)`
+
+    Postgres resolves this with a single seek on a matching composite
+    index, unlike the equivalent chain of OR-ed column comparisons.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, lhs, operator, rhs):
+        super().__init__(*lhs, *rhs)
+        self.operator = operator
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql_parts, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            sql_parts.append(sql)
+            params.extend(expression_params)
+        arity = len(sql_parts) // 2
+        sql = '(%s) %s (%s)' % (
+            ', '.join(sql_parts[:arity]),
+            self.operator,
+            ', '.join(sql_parts[arity:]),
+        )
+        return sql, params
+
+
+def reverse_ordering(ordering):
+    """
+    Flip the direction of every field in an ordering tuple
+    """
+    return tuple(
+        field[1:] if field.startswith('-') else '-' + field
+        for field in ordering
+    )
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Opaque cursor pagination over a unique composite key
+
+    The cursor stores every value of the ordering key of the boundary
+    row, so each page is fetched with an index seek instead of an
+    OFFSET and page 500 costs the same as page 1. The last ordering
+    field must make the key unique.
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        assert len({field.startswith('-') for field in self.ordering}) == 1, (
+            'Keyset pagination requires every ordering field to share '
+            'the same direction.'
+        )
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = (
+                self.cursor.reverse, self.cursor.position)
+
+        ordering = reverse_ordering(self.ordering) if reverse \
+            else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._seek(queryset, ordering, current_position))
+
+        # Fetch one extra row to know whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+        else:
+            self.next_position = self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and \
+                self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Use the ordering the view picked for this request, if any
+        """
+        ordering = getattr(view, 'get_keyset_ordering', lambda: None)()
+        if ordering is not None:
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def _seek(self, queryset, ordering, position):
+        """
+        Return the filter selecting rows after the cursor position
+        """
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError(position)
+            values = [
+                self._to_python(queryset, field.lstrip('-'), value)
+                for field, value in zip(ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        operator = '<' if ordering[0].startswith('-') else '>'
+        return RowComparison(
+            [F(field.lstrip('-')) for field in ordering],
+            operator,
+            [Value(value) for value in values],
+        )
+
+    def _to_python(self, queryset, field_name, value):
+        """
+        Convert a cursor value back to the type of its ordering field
+        """
+        if field_name in queryset.query.annotations:
+            output_field = queryset.query.annotations[
+                field_name].output_field
+        else:
+            output_field = queryset.model._meta.get_field(field_name)
+        return output_field.to_python(value)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            field_name = field.lstrip('-')
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            values.append(str(attr))
+        return json.dumps(values)
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """
+    Cursor pagination for recipes, newest first
+    """
+    ordering = ('-id',)
+
+
+class NameCursorPagination(KeysetCursorPagination):
+    """
+    Cursor pagination for tags and ingredients, by name with id tiebreaker
+    """
+    ordering = ('-name', '-id')
@@ -2,16 +2,75 @@
 Serializer for recipe api
 """
 
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
+from core.timing import TimedSerializerMixin, timed
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Mixin dropping the fields not selected by the view
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Nested serializers are built without context and keep all fields
+        selected = kwargs.get('context', {}).get('fields')
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class UniqueNameMixin:
+    """
+    Mixin rejecting a rename onto another of the user's names
+    """
+
+    def validate_name(self, value):
+        """
+        Check no other item of the user has the name, ignoring case
+
+        Names are compared with lower() like the unique index.
+        """
+        if self.instance is None:
+            return value
+        duplicates = type(self.instance).objects.annotate(
+            name_key=Lower('name'),
+        ).filter(
+            created_by_id=self.instance.created_by_id,
+            name_key=Lower(Value(value)),
+        ).exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(
+                f'"{value}" already exists.')
+        return value
+
+    def update(self, instance, validated_data):
+        """
+        Reject a rename racing another onto the same name
+        """
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            name = validated_data.get('name')
+            raise serializers.ValidationError(
+                {'name': [f'"{name}" already exists.']})
+
+
+class IngredientSerializer(TimedSerializerMixin,
+                           SparseFieldsMixin,
+                           UniqueNameMixin,
+                           serializers.ModelSerializer):
     """
     Serialzier for ingredient
     """
@@ -23,7 +82,10 @@ class IngredientSerializer(serializers.ModelSerializer):
         ]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin,
+                    SparseFieldsMixin,
+                    UniqueNameMixin,
+                    serializers.ModelSerializer):
     """
     Serialzier for tags
     """
@@ -35,7 +97,67 @@ class TagSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    List serializer creating many recipes in a handful of queries
+    """
+    relations = {
+        'tags': (Tag, 'tag'),
+        'ingredients': (Ingredient, 'ingredient'),
+    }
+    batch_size = 1000
+
+    def _get_links(self, validated_data, recipes, field):
+        """
+        Return through table rows linking recipes to their tags/ingredients
+
+        Names of the whole batch are resolved with a single upsert.
+        """
+        model, column = self.relations[field]
+        through = getattr(Recipe, field).through
+        user = self.context['request'].user
+        items = {
+            name: obj
+            for obj in model.objects.get_or_create_by_names(user, [
+                item['name']
+                for data in validated_data for item in data.get(field, [])
+            ])
+            for name in obj.input_names
+        }
+        links = []
+        for recipe, data in zip(recipes, validated_data):
+            # Names differing only in case link the same item once
+            linked = {
+                items[item['name']].pk: items[item['name']]
+                for item in data.get(field, [])
+            }
+            links.extend(
+                through(recipe=recipe, **{column: obj})
+                for obj in linked.values()
+            )
+        return through, links
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Bulk insert recipes, then their tag and ingredient links
+        """
+        recipes = Recipe.objects.bulk_create([
+            Recipe(**{
+                name: value for name, value in data.items()
+                if name not in self.relations
+            })
+            for data in validated_data
+        ], batch_size=self.batch_size)
+        for field in self.relations:
+            through, links = self._get_links(validated_data, recipes, field)
+            through.objects.bulk_create(links, batch_size=self.batch_size)
+        return recipes
+
+
+class RecipeSerializer(TimedSerializerMixin,
+                       SparseFieldsMixin,
+                       serializers.ModelSerializer):
     """
     Serializer for recipe
     """
@@ -53,25 +175,24 @@ class RecipeSerializer(serializers.ModelSerializer):
             'tags',
             'ingredients',
         ]
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_tags(self, tags, instance):
+    def _get_or_create_items(self, model, items):
+        """
+        Resolve names to the user's objects, creating missing ones
+        """
         user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                created_by=user,
-                **tag
-            )
-            instance.tags.add(tag_obj)
+        return model.objects.get_or_create_by_names(
+            user, [item['name'] for item in items])
+
+    def _get_or_create_tags(self, tags, instance):
+        instance.tags.add(*self._get_or_create_items(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, instance):
-        user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                created_by=user,
-                **ingredient
-            )
-            instance.ingredients.add(ingredient_obj)
+        instance.ingredients.add(
+            *self._get_or_create_items(Ingredient, ingredients))
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Create recipe
@@ -83,19 +204,20 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Update Recipe
         """
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
+        # set() only deletes and inserts the links that changed
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_items(Tag, tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_items(Ingredient, ingredients))
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -113,7 +235,8 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """
     Serialzier for uploading image
     """
@@ -128,3 +251,110 @@ class RecipeImageSerializer(serializers.ModelSerializer):
                 'required': 'True'
             }
         }
+
+
+class RecipeReadSerializer:
+    """
+    Read only recipe serializer building output from values() rows
+
+    Returns the same data as RecipeSerializer and RecipeDetailSerializer
+    without their per field machinery. Tags and ingredients are read in
+    one query each from the trigger maintained id arrays, in id order.
+    """
+    relations = {
+        'tags': (Tag, 'tag_ids', TagSerializer),
+        'ingredients': (Ingredient, 'ingredient_ids', IngredientSerializer),
+    }
+
+    def __init__(self, serializer_class, fields=None, context=None):
+        self.context = context or {}
+        self.serializer_fields = serializer_class().fields
+        self.fields = [
+            name for name in serializer_class.Meta.fields
+            if fields is None or name in fields
+        ]
+        self.converters = {
+            name: self._get_converter(self.serializer_fields[name])
+            for name in self.fields if name not in self.relations
+        }
+
+    @property
+    def columns(self):
+        """
+        Return the values() names needed for the selected fields
+        """
+        return [
+            self.relations[name][1] if name in self.relations else name
+            for name in self.fields
+        ]
+
+    def _get_converter(self, field):
+        """
+        Return a function giving the field output for a database value
+        """
+        if isinstance(field, serializers.UUIDField):
+            return field.to_representation
+        if isinstance(field, serializers.ImageField):
+            return self._image_url
+        if isinstance(field, (
+                serializers.CharField, serializers.IntegerField)):
+            return None
+        return field.to_representation
+
+    def _image_url(self, name):
+        """
+        Return the image url the same way ImageField does
+        """
+        if not name:
+            return None
+        if not api_settings.UPLOADED_FILES_USE_URL:
+            return name
+        url = Recipe._meta.get_field('image').storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def _get_items(self, rows, name):
+        """
+        Return the serialized tags or ingredients of the rows by id
+        """
+        model, column, serializer_class = self.relations[name]
+        ids = {item_id for row in rows for item_id in row[column]}
+        fields = serializer_class.Meta.fields
+        items = model.objects.filter(id__in=ids).values('id', *fields)
+        return {
+            item['id']: {
+                field: str(item[field]) if field == 'uuid' else item[field]
+                for field in fields
+            }
+            for item in items
+        }
+
+    @timed('serializer')
+    def to_representation(self, rows):
+        """
+        Serialize a list of values() rows
+        """
+        items = {
+            name: self._get_items(rows, name)
+            for name in self.fields if name in self.relations
+        }
+        data = []
+        for row in rows:
+            recipe = {}
+            for name in self.fields:
+                if name in items:
+                    column = self.relations[name][1]
+                    # Items deleted since the rows were read are skipped
+                    recipe[name] = [
+                        items[name][item_id] for item_id in row[column]
+                        if item_id in items[name]]
+                    continue
+                value = row[name]
+                converter = self.converters[name]
+                if converter is not None and value is not None:
+                    value = converter(value)
+                recipe[name] = value
+            data.append(recipe)
+        return data
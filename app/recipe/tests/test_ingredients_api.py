@@ -3,7 +3,7 @@ Test for ingredient apis
 """
 
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework.test import APIClient
@@ -19,8 +19,10 @@ from core.tests.test_models import (
     create_user,
     create_ingredient,
 )
+from core.tests.test_query_budget import QueryBudgetMixin
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+SUGGEST_URL = reverse('recipe:ingredient-suggest')
 
 
 def detail_url(ingredient_uuid):
@@ -47,7 +49,7 @@ class PublicIngredientAPITests(TestCase):
         self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateIngredientAPITests(TestCase):
+class PrivateIngredientAPITests(QueryBudgetMixin, TestCase):
     """
     Test authenticated ingredient apis
     """
@@ -70,11 +72,11 @@ class PrivateIngredientAPITests(TestCase):
 
         result = self.client.get(INGREDIENTS_URL)
 
-        ingredients = Ingredient.objects.all().order_by('-name')
+        ingredients = Ingredient.objects.all().order_by('-name', '-id')
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
 
     def test_retrieve_user_limited_ingredient_list(self):
         """
@@ -86,19 +88,85 @@ class PrivateIngredientAPITests(TestCase):
             password='test2_password',
             name='Test Name 2'
         )
-        create_ingredient(self.user)
-        create_ingredient(self.user)
-        create_ingredient(self.other_user)
-        create_ingredient(self.other_user)
+        create_ingredient(self.user, name='First')
+        create_ingredient(self.user, name='Second')
+        create_ingredient(self.other_user, name='First')
+        create_ingredient(self.other_user, name='Second')
 
         result = self.client.get(INGREDIENTS_URL)
 
         ingredients = Ingredient.objects.filter(
-            created_by=self.user).order_by('-name')
+            created_by=self.user).order_by('-name', '-id')
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
+
+    def test_ingredient_list_paginated_by_name(self):
+        """
+        Test cursor pages follow name order
+        """
+        for name in ['Alpha', 'Beta', 'beta 2', 'Delta', 'Gamma']:
+            create_ingredient(user=self.user, name=name)
+
+        result = self.client.get(INGREDIENTS_URL, {'page_size': 2})
+        pages = [result.data['results']]
+        while result.data['next']:
+            result = self.client.get(result.data['next'])
+            pages.append(result.data['results'])
+
+        ingredients = Ingredient.objects.filter(
+            created_by=self.user).order_by('-name', '-id')
+        serializer = IngredientSerializer(ingredients, many=True)
+        self.assertEqual(sum(pages, []), serializer.data)
+
+    def test_ingredient_list_sparse_fields(self):
+        """
+        Test cursor pages of selected fields take a single query
+        """
+        for name in ['Alpha', 'Beta', 'Gamma']:
+            create_ingredient(user=self.user, name=name)
+
+        with self.assertNumQueries(1):
+            result = self.client.get(
+                INGREDIENTS_URL, {'fields': 'uuid', 'page_size': 2})
+        with self.assertNumQueries(1):
+            next_page = self.client.get(result.data['next'])
+
+        ingredients = Ingredient.objects.filter(
+            created_by=self.user).order_by('-name', '-id')
+        self.assertEqual(
+            result.data['results'] + next_page.data['results'],
+            [{'uuid': str(ingredient.uuid)} for ingredient in ingredients])
+
+    def test_ingredient_list_query_count_flat(self):
+        """
+        Test listing ingredients costs one query for any ingredient count
+        """
+        def add_ingredients(count):
+            start = Ingredient.objects.count()
+            for i in range(count):
+                create_ingredient(
+                    user=self.user, name=f'Ingredient {start + i}')
+
+        result = self.assertQueriesFlat(
+            lambda: self.client.get(INGREDIENTS_URL), add_ingredients,
+            budget=1)
+
+        self.assertEqual(len(result.data['results']), 10)
+
+    def test_patch_ingredient_query_budget(self):
+        """
+        Test updating an ingredient stays within its budget
+        """
+        ingredient = create_ingredient(user=self.user, name='Old')
+
+        # Two are the savepoint guarding the rename, which is only
+        # taken inside the test transaction
+        result = self.assertQueryBudget(
+            5, self.client.patch, detail_url(ingredient.uuid), {'name': 'New'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
 
     def test_patch_ingredient(self):
         """
@@ -142,6 +210,20 @@ class PrivateIngredientAPITests(TestCase):
         self.assertEqual(ingredient.created_by, self.user)
         self.assertEqual(ingredient.updated_by, self.user)
 
+    def test_patch_ingredient_duplicate_name(self):
+        """
+        Test renaming onto another ingredient name fails
+        """
+        create_ingredient(user=self.user, name='Breakfast')
+        ingredient = create_ingredient(user=self.user, name='Dinner')
+
+        url = detail_url(ingredient.uuid)
+        result = self.client.patch(url, {'name': 'breakfast'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Dinner')
+
     def test_put_ingredient_unsecssful(self):
         """
         Test ingredient update fail correctly for missing params
@@ -209,3 +291,37 @@ class PrivateIngredientAPITests(TestCase):
         self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Ingredient.objects.filter(
             uuid=ingredient.uuid).exists())
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class IngredientSuggestAPITests(TestCase):
+    """
+    Test ingredient suggest api
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+            name='Test Name'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_suggest_ingredients(self):
+        """
+        Test ingredient suggestions tolerate typos
+        """
+        for name in ['Tomato', 'Tomatillo', 'Potato', 'Rice']:
+            create_ingredient(user=self.user, name=name)
+
+        result = self.client.get(SUGGEST_URL, {'q': 'tomatoe'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        names = [ingredient['name'] for ingredient in result.data]
+        self.assertEqual(names[0], 'Tomato')
+        self.assertNotIn('Rice', names)
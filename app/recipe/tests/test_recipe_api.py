@@ -2,14 +2,23 @@
 Test for recipe apis
 """
 
+import csv
+import io
+import json
 import os
 import tempfile
+import tracemalloc
+from unittest import mock
 
 from PIL import Image
 
 from decimal import Decimal
 
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Lower
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
@@ -26,14 +35,18 @@ from recipe.serializers import (
     RecipeDetailSerializer,
 )
 
+from core.bulk import create_recipes
 from core.tests.test_models import (
     create_user,
     create_recipe,
     create_tag,
     create_ingredient,
 )
+from core.tests.test_query_budget import QueryBudgetMixin
 
 RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+BULK_URL = reverse('recipe:recipe-bulk')
 
 
 def detail_url(recipe_uuid):
@@ -94,7 +107,7 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
 
     def test_retrieve_user_limited_recipe_list(self):
         """
@@ -117,7 +130,37 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
+
+    def test_recipe_list_paginated(self):
+        """
+        Test walking the recipe list with next and previous cursors
+        """
+        for _ in range(5):
+            create_recipe(self.user)
+
+        result = self.client.get(RECIPES_URL, {'page_size': 2})
+        pages = [result.data['results']]
+        while result.data['next']:
+            result = self.client.get(result.data['next'])
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+            pages.append(result.data['results'])
+
+        recipes = Recipe.objects.filter(created_by=self.user).order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), serializer.data)
+
+        result = self.client.get(result.data['previous'])
+        self.assertEqual(result.data['results'], pages[1])
+
+    def test_recipe_list_invalid_cursor(self):
+        """
+        Test tampered cursor is rejected
+        """
+        result = self.client.get(RECIPES_URL, {'cursor': 'cD1pbnZhbGlk'})
+
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_get_recipe_detail(self):
         """
@@ -335,6 +378,36 @@ class PrivateRecipeAPITests(TestCase):
                 ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_query_count_flat(self):
+        """
+        Test creating recipe costs the same queries for any tag count
+        """
+        def payload(count):
+            return {
+                'title': 'New title',
+                'time_minutes': 10,
+                'price': Decimal('3.00'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ingredient {i}'} for i in range(count)],
+            }
+        create_tag(user=self.user, name='Tag 0')
+
+        with CaptureQueriesContext(connection) as small:
+            result = self.client.post(RECIPES_URL, payload(2), format='json')
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as large:
+            result = self.client.post(
+                RECIPES_URL, payload(20), format='json')
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+
+        recipe = Recipe.objects.get(uuid=result.data['uuid'])
+        self.assertEqual(recipe.tags.count(), 20)
+        self.assertEqual(recipe.ingredients.count(), 20)
+        self.assertEqual(
+            Tag.objects.filter(created_by=self.user).count(), 20)
+        self.assertEqual(len(small), len(large))
+
     def test_create_recipe_with_exisiting_tag(self):
         """
         Test recipe with exisiting tags
@@ -369,6 +442,30 @@ class PrivateRecipeAPITests(TestCase):
                 ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_tags_ignore_case(self):
+        """
+        Test tag names differing by case resolve to the same tag
+        """
+        tag = create_tag(user=self.user, name='Indian')
+        payload = {
+            'title': 'New title',
+            'time_minutes': 10,
+            'price': Decimal('3.00'),
+            'tags': [
+                {'name': 'indian'},
+                {'name': 'Thai'},
+                {'name': 'THAI'},
+            ]
+        }
+
+        result = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(uuid=result.data['uuid'])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(created_by=self.user).count(), 2)
+
     def test_update_recipe_with_tag(self):
         """
         Test update recipe with tags
@@ -410,6 +507,34 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(breakfast_tag, recipe.tags.all())
         self.assertNotIn(lunch_tag, recipe.tags.all())
 
+    def test_update_recipe_tags_keeps_unchanged_links(self):
+        """
+        Test updating tags only rewrites the links that changed
+        """
+        recipe = create_recipe(user=self.user)
+        lunch_tag = create_tag(user=self.user, name='Lunch')
+        dinner_tag = create_tag(user=self.user, name='Dinner')
+        recipe.tags.add(lunch_tag, dinner_tag)
+        through = Recipe.tags.through.objects
+        lunch_link = through.get(recipe=recipe, tag=lunch_tag)
+
+        payload = {
+            'tags': [
+                {'name': 'Lunch'},
+                {'name': 'Breakfast'},
+            ]
+        }
+
+        url = detail_url(recipe.uuid)
+        result = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.filter(pk=lunch_link.pk).exists())
+        self.assertFalse(through.filter(tag=dinner_tag).exists())
+        self.assertEqual(
+            sorted(tag.name for tag in recipe.tags.all()),
+            ['Breakfast', 'Lunch'])
+
     def test_clear_recipe_tags(self):
         """
         Test recipe clear tags
@@ -578,10 +703,11 @@ class PrivateRecipeAPITests(TestCase):
         recipe_1_serialized_data = RecipeSerializer(recipe_1)
         recipe_2_serialized_data = RecipeSerializer(recipe_2)
         recipe_3_serialized_data = RecipeSerializer(recipe_3)
+        results = result.data['results']
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertIn(recipe_1_serialized_data.data, result.data)
-        self.assertIn(recipe_2_serialized_data.data, result.data)
-        self.assertNotIn(recipe_3_serialized_data.data, result.data)
+        self.assertIn(recipe_1_serialized_data.data, results)
+        self.assertIn(recipe_2_serialized_data.data, results)
+        self.assertNotIn(recipe_3_serialized_data.data, results)
 
     def test_filter_by_ingredients(self):
         """
@@ -603,10 +729,601 @@ class PrivateRecipeAPITests(TestCase):
         recipe_1_serialized_data = RecipeSerializer(recipe_1)
         recipe_2_serialized_data = RecipeSerializer(recipe_2)
         recipe_3_serialized_data = RecipeSerializer(recipe_3)
+        results = result.data['results']
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertIn(recipe_1_serialized_data.data, result.data)
-        self.assertIn(recipe_2_serialized_data.data, result.data)
-        self.assertNotIn(recipe_3_serialized_data.data, result.data)
+        self.assertIn(recipe_1_serialized_data.data, results)
+        self.assertIn(recipe_2_serialized_data.data, results)
+        self.assertNotIn(recipe_3_serialized_data.data, results)
+
+    def test_filter_by_tag_uuid(self):
+        """
+        Test filtering recipes by tag uuid and case-insensitive name
+        """
+        recipe_1 = create_recipe(user=self.user, title='Vegetable Curry')
+        recipe_2 = create_recipe(user=self.user, title='Salad')
+        create_recipe(user=self.user, title='Fish')
+        tag_1 = create_tag(user=self.user, name='Vegan')
+        tag_2 = create_tag(user=self.user, name='Spicy')
+        recipe_1.tags.add(tag_1)
+        recipe_2.tags.add(tag_2)
+
+        params = {'tags': f'{tag_1.uuid},spicy'}
+        result = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {recipe['uuid'] for recipe in result.data['results']},
+            {str(recipe_1.uuid), str(recipe_2.uuid)})
+
+    def test_filter_match_all(self):
+        """
+        Test match=all only returns recipes with every tag and ingredient
+        """
+        recipe_1 = create_recipe(user=self.user, title='Vegetable Curry')
+        recipe_2 = create_recipe(user=self.user, title='Salad')
+        tag_1 = create_tag(user=self.user, name='vegan')
+        tag_2 = create_tag(user=self.user, name='spicy')
+        ingredient = create_ingredient(user=self.user, name='rice')
+        recipe_1.tags.add(tag_1, tag_2)
+        recipe_1.ingredients.add(ingredient)
+        recipe_2.tags.add(tag_1)
+        recipe_2.ingredients.add(ingredient)
+
+        params = {
+            'tags': f'{tag_1.uuid},{tag_2.name}',
+            'ingredients': ingredient.name,
+            'match': 'all',
+        }
+        result = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['uuid'] for recipe in result.data['results']],
+            [str(recipe_1.uuid)])
+
+        params['tags'] += ',unknown'
+        result = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(result.data['results'], [])
+
+    def test_filter_non_ascii_names(self):
+        """
+        Test names the database folds unlike str.lower() are matched
+        """
+        recipe = create_recipe(user=self.user, title='Börek')
+        create_recipe(user=self.user, title='Salad')
+        recipe.tags.add(
+            create_tag(user=self.user, name='İstanbul'),
+            create_tag(user=self.user, name='Été'))
+
+        for match in ['any', 'all']:
+            result = self.client.get(
+                RECIPES_URL, {'tags': 'İstanbul,Été', 'match': match})
+
+            self.assertEqual(
+                [item['uuid'] for item in result.data['results']],
+                [str(recipe.uuid)])
+
+    def test_search_recipes_ranked(self):
+        """
+        Test search matches title and description, title ranked first
+        """
+        described = create_recipe(
+            user=self.user,
+            title='Weeknight dinner',
+            description='A quick curry with rice',
+        )
+        titled = create_recipe(
+            user=self.user,
+            title='Chickpea curry',
+            description='Slow cooked',
+        )
+        create_recipe(user=self.user, title='Salad', description='Fresh')
+
+        result = self.client.get(RECIPES_URL, {'search': 'curries'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['uuid'] for recipe in result.data['results']],
+            [str(titled.uuid), str(described.uuid)])
+
+        result = self.client.get(
+            RECIPES_URL, {'search': 'curry', 'page_size': 1})
+        second_page = self.client.get(result.data['next'])
+        self.assertEqual(
+            second_page.data['results'][0]['uuid'], str(described.uuid))
+        self.assertIsNone(second_page.data['next'])
+
+    def test_search_combined_with_filter(self):
+        """
+        Test search only returns recipes matching the tag filter
+        """
+        tagged = create_recipe(user=self.user, title='Thai curry')
+        create_recipe(user=self.user, title='Indian curry')
+        tag = create_tag(user=self.user, name='Thai')
+        tagged.tags.add(tag)
+
+        result = self.client.get(
+            RECIPES_URL, {'search': 'curry', 'tags': tag.name})
+
+        self.assertEqual(
+            [recipe['uuid'] for recipe in result.data['results']],
+            [str(tagged.uuid)])
+
+    def test_search_follows_updates(self):
+        """
+        Test search sees a recipe title changed through the api
+        """
+        recipe = create_recipe(user=self.user, title='Salad')
+
+        url = detail_url(recipe.uuid)
+        self.client.patch(url, {'title': 'Green curry'})
+        result = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(
+            [recipe['uuid'] for recipe in result.data['results']],
+            [str(recipe.uuid)])
+
+    def test_filter_match_invalid(self):
+        """
+        Test unknown match value is rejected
+        """
+        result = self.client.get(
+            RECIPES_URL, {'tags': 'vegan', 'match': 'some'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_by_multiple_tags_no_duplicates(self):
+        """
+        Test recipe matching several filter tags is listed once
+        """
+        recipe = create_recipe(user=self.user)
+        tag_1 = create_tag(user=self.user, name='vegan')
+        tag_2 = create_tag(user=self.user, name='spicy')
+        ingredient = create_ingredient(user=self.user, name='rice')
+        recipe.tags.add(tag_1, tag_2)
+        recipe.ingredients.add(ingredient)
+
+        params = {
+            'tags': f'{tag_1.name},{tag_2.name}',
+            'ingredients': ingredient.name,
+        }
+        result = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(result.data['results']), 1)
+
+    def test_list_sparse_fields(self):
+        """
+        Test list returns and selects only the requested fields
+        """
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(create_tag(user=self.user, name='vegan'))
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(RECIPES_URL, {'fields': 'uuid,title'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            result.data['results'],
+            [{'uuid': str(recipe.uuid), 'title': recipe.title}])
+        recipe_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'core_recipe' in query['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('price', recipe_queries[0])
+
+    def test_list_omit_fields(self):
+        """
+        Test list leaves out omitted fields and their prefetch
+        """
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(create_ingredient(user=self.user, name='rice'))
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(
+                RECIPES_URL, {'omit': 'tags,ingredients'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(result.data['results'][0]),
+            ['uuid', 'title', 'time_minutes', 'price', 'link'])
+        self.assertFalse(any(
+            'core_ingredient' in query['sql']
+            for query in context.captured_queries))
+
+    def test_get_recipe_detail_sparse_fields(self):
+        """
+        Test recipe detail accepts detail only fields
+        """
+        recipe = create_recipe(user=self.user)
+
+        result = self.client.get(
+            detail_url(recipe.uuid), {'fields': 'title,description'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, {
+            'title': recipe.title,
+            'description': recipe.description,
+        })
+
+    def test_sparse_fields_unknown(self):
+        """
+        Test unknown field names are rejected
+        """
+        result = self.client.get(RECIPES_URL, {'fields': 'uuid,secret'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', result.data)
+
+    def test_sparse_fields_ignored_on_update(self):
+        """
+        Test writes still validate and return every field
+        """
+        recipe = create_recipe(user=self.user)
+
+        result = self.client.patch(
+            detail_url(recipe.uuid) + '?fields=uuid', {'title': 'New'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['title'], 'New')
+        self.assertIn('price', result.data)
+
+
+class RecipeListQueryCountTests(QueryBudgetMixin, TestCase):
+    """
+    Test recipe list query count does not grow with recipe count
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+            name='Test Name'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.tags = [
+            create_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        self.ingredients = [
+            create_ingredient(user=self.user, name=f'Ingredient {i}')
+            for i in range(3)]
+
+    def _create_recipes(self, count):
+        create_recipes(self.user, count, self.tags, self.ingredients)
+
+    def _list(self, params=None):
+        """
+        Return a full recipe list page
+        """
+        return self.client.get(
+            RECIPES_URL, dict(params or {}, page_size=1000))
+
+    def test_list_query_count_flat(self):
+        """
+        Test listing 10 and 1000 recipes costs the same queries
+        """
+        result = self.assertQueriesFlat(
+            self._list, self._create_recipes, sizes=(10, 1000), budget=3)
+
+        self.assertEqual(len(result.data['results']), 1000)
+
+    def test_filtered_list_query_count_flat(self):
+        """
+        Test filtered list query count is flat and rows are distinct
+        """
+        params = {
+            'tags': ','.join(tag.name for tag in self.tags),
+            'ingredients': ','.join(
+                ingredient.name for ingredient in self.ingredients),
+        }
+
+        result = self.assertQueriesFlat(
+            lambda: self._list(params), self._create_recipes,
+            sizes=(10, 1000), budget=5)
+
+        self.assertEqual(len(result.data['results']), 1000)
+
+    def test_detail_query_count_flat(self):
+        """
+        Test a recipe detail costs the same queries for any tag count
+        """
+        recipe = create_recipe(user=self.user)
+
+        def add_links(count):
+            start = recipe.tags.count()
+            recipe.tags.add(*[
+                create_tag(user=self.user, name=f'Linked {start + i}')
+                for i in range(count)])
+            recipe.ingredients.add(*[
+                create_ingredient(user=self.user, name=f'Linked {start + i}')
+                for i in range(count)])
+
+        result = self.assertQueriesFlat(
+            lambda: self.client.get(detail_url(recipe.uuid)), add_links,
+            budget=3)
+
+        self.assertEqual(len(result.data['tags']), 10)
+
+    def test_update_query_budget(self):
+        """
+        Test updating a recipe with tags stays within its budget
+        """
+        recipe = create_recipe(user=self.user)
+        payload = {
+            'tags': [{'name': f'Tag {i}'} for i in range(3)],
+            'ingredients': [{'name': 'Ingredient 0'}],
+        }
+
+        result = self.assertQueryBudget(
+            14, self.client.patch, detail_url(recipe.uuid), payload,
+            format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+
+class RecipeBulkCreateTests(TestCase):
+    """
+    Test creating many recipes in one request
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _payload(self, count, **params):
+        """
+        Return recipes in the RecipeSerializer format
+        """
+        return [
+            dict({
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': Decimal('5.50'),
+                'tags': [{'name': 'Vegan'}, {'name': f'Tag {i % 3}'}],
+                'ingredients': [{'name': 'Rice'}],
+            }, **params)
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """
+        Test every recipe is created with its tags and ingredients
+        """
+        create_tag(user=self.user, name='vegan')
+        payload = self._payload(3)
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        recipes = Recipe.objects.filter(created_by=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(
+            [item['status'] for item in result.data['results']], [201] * 3)
+        self.assertEqual(
+            [item['data']['title'] for item in result.data['results']],
+            [recipe['title'] for recipe in payload])
+        self.assertEqual(
+            Tag.objects.filter(created_by=self.user).count(), 4)
+        for recipe, item in zip(recipes, result.data['results']):
+            self.assertEqual(item['data']['uuid'], str(recipe.uuid))
+            tags = [tag['name'] for tag in item['data']['tags']]
+            self.assertEqual(
+                sorted(tag.name for tag in recipe.tags.all()), sorted(tags))
+            self.assertIn('vegan', tags)
+            self.assertEqual(len(recipe.tag_ids), 2)
+            self.assertEqual(recipe.created_by, self.user)
+
+    def test_bulk_create_non_ascii_names(self):
+        """
+        Test names the database folds unlike str.lower() are linked
+        """
+        create_tag(user=self.user, name='i')
+        create_tag(user=self.user, name='É')
+        payload = self._payload(2)
+        payload[0]['tags'] = [{'name': 'İ'}, {'name': 'é'}]
+        payload[1]['tags'] = [{'name': 'I'}, {'name': 'É'}]
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        tags = Tag.objects.filter(created_by=self.user).annotate(
+            name_key=Lower('name'))
+        recipes = Recipe.objects.filter(created_by=self.user).order_by('id')
+        for recipe, data in zip(recipes, payload):
+            expected = set()
+            for tag in data['tags']:
+                expected.update(tags.filter(
+                    name_key=Lower(Value(tag['name']))))
+            self.assertEqual(set(recipe.tags.all()), expected)
+            self.assertEqual(len(expected), 2)
+
+    def test_bulk_create_query_count_flat(self):
+        """
+        Test the number of queries does not grow with the batch size
+        """
+        def count_queries(count):
+            with CaptureQueriesContext(connection) as context:
+                result = self.client.post(
+                    BULK_URL, self._payload(count), format='json')
+            self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+            return len(context)
+
+        self.assertEqual(count_queries(2), count_queries(50))
+
+    def test_bulk_create_atomic_rejects_all(self):
+        """
+        Test one invalid recipe creates nothing in atomic mode
+        """
+        payload = self._payload(3)
+        payload[1]['time_minutes'] = 'soon'
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [item['status'] for item in result.data['results']],
+            [424, 400, 424])
+        self.assertIn('time_minutes', result.data['results'][1]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_create_partial(self):
+        """
+        Test partial mode creates the valid recipes only
+        """
+        payload = self._payload(3)
+        del payload[0]['title']
+
+        result = self.client.post(
+            BULK_URL + '?mode=partial', payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [item['status'] for item in result.data['results']],
+            [400, 201, 201])
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'title', flat=True)),
+            ['Recipe 1', 'Recipe 2'])
+
+    def test_bulk_create_duplicate_names_in_recipe(self):
+        """
+        Test names repeated in another case link a single tag
+        """
+        payload = self._payload(1, tags=[{'name': 'Spicy'}, {'name': 'spicy'}])
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.tags.count(), 1)
+
+    def test_bulk_create_invalid_request(self):
+        """
+        Test non list bodies, oversized batches and bad modes are rejected
+        """
+        for url, payload in [
+            (BULK_URL, {'title': 'One'}),
+            (BULK_URL + '?mode=some', self._payload(1)),
+        ]:
+            result = self.client.post(url, payload, format='json')
+            self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(API_MAX_BULK_SIZE=2):
+            result = self.client.post(
+                BULK_URL, self._payload(3), format='json')
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class RecipeExportTests(TestCase):
+    """
+    Test streaming recipe exports
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.tag = create_tag(user=self.user, name='Vegan')
+        self.ingredient = create_ingredient(user=self.user, name='Rice')
+
+    def _create_recipes(self, count):
+        create_recipes(self.user, count, [self.tag], [self.ingredient])
+
+    def test_export_ndjson(self):
+        """
+        Test NDJSON export streams every recipe like the detail api
+        """
+        self._create_recipes(3)
+        create_recipe(user=create_user(email='other@example.com'))
+
+        result = self.client.get(EXPORT_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertTrue(result.streaming)
+        self.assertEqual(result['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(result.streaming_content).decode().splitlines()
+        recipes = Recipe.objects.filter(created_by=self.user).order_by('-id')
+        serializer = RecipeDetailSerializer(recipes, many=True)
+        self.assertEqual(
+            [json.loads(line) for line in lines], serializer.data)
+
+    def test_export_csv(self):
+        """
+        Test CSV export has a header and flattened tag names
+        """
+        self._create_recipes(2)
+
+        result = self.client.get(
+            EXPORT_URL, {'format': 'csv', 'fields': 'title,price,tags'},
+            HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result['Content-Type'], 'text/csv')
+        content = b''.join(result.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows, [
+            ['title', 'price', 'tags'],
+            ['Recipe 1', '5.00', 'Vegan'],
+            ['Recipe 0', '5.00', 'Vegan'],
+        ])
+
+    def test_export_invalid_format(self):
+        """
+        Test unknown export formats are rejected
+        """
+        result = self.client.get(EXPORT_URL, {'format': 'xml'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('recipe.views.RecipeViewSet.export_chunk_size', 10)
+    def test_export_resolves_items_per_chunk(self):
+        """
+        Test tags and ingredients are looked up once per chunk
+        """
+        self._create_recipes(25)
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(EXPORT_URL)
+            lines = b''.join(result.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 25)
+        item_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "core_tag"' in query['sql']
+            or 'FROM "core_ingredient"' in query['sql']
+        ]
+        self.assertEqual(len(item_queries), 6)
+
+    @mock.patch('recipe.views.RecipeViewSet.export_chunk_size', 100)
+    def test_export_memory_flat(self):
+        """
+        Test peak memory while streaming does not grow with recipe count
+        """
+        def peak_memory():
+            result = self.client.get(EXPORT_URL)
+            tracemalloc.start()
+            for chunk in result.streaming_content:
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        self._create_recipes(300)
+        small = peak_memory()
+        self._create_recipes(2700)
+        large = peak_memory()
+
+        self.assertLess(large, small * 2)
 
 
 class ImageUploadTests(TestCase):
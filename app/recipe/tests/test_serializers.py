@@ -0,0 +1,226 @@
+"""
+Test the read only recipe serializer matches the model serializers
+"""
+
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    RecipeReadSerializer,
+)
+
+from core.tests.test_models import (
+    create_user,
+    create_recipe,
+    create_tag,
+    create_ingredient,
+)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_uuid):
+    """
+    Create and return a recipe details url
+    """
+    return reverse('recipe:recipe-detail', args=[recipe_uuid])
+
+
+class RecipeReadSerializerParityTests(TestCase):
+    """
+    Test values() based output is identical to RecipeSerializer output
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+        )
+        self.request = APIRequestFactory().get(RECIPES_URL)
+        self.tags = [
+            create_tag(user=self.user, name=name)
+            for name in ['Vegan', 'Spicy', 'Quick']]
+        self.ingredients = [
+            create_ingredient(user=self.user, name=name)
+            for name in ['Rice', 'Chilli']]
+
+        empty = create_recipe(
+            user=self.user,
+            title='Plain',
+            description='',
+            link='',
+            price=Decimal('0.50'),
+        )
+        full = create_recipe(
+            user=self.user,
+            title='Curry',
+            price=Decimal('999.99'),
+            time_minutes=45,
+        )
+        full.tags.add(*self.tags)
+        full.ingredients.add(*self.ingredients)
+        with_image = create_recipe(user=self.user, title='Pictured')
+        with_image.image = 'uploads/recipe/pictured.jpg'
+        with_image.save()
+        with_image.tags.add(self.tags[1])
+        self.recipes = [empty, full, with_image]
+
+    def _instances(self):
+        """
+        Return the recipes prefetched the way the viewset does
+        """
+        return Recipe.objects.filter(created_by=self.user).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredients', queryset=Ingredient.objects.order_by('id')),
+        ).order_by('-id')
+
+    def _read(self, serializer_class, fields=None, context=None):
+        """
+        Return the read serializer output for the recipes
+        """
+        serializer = RecipeReadSerializer(
+            serializer_class, fields=fields, context=context)
+        rows = Recipe.objects.filter(created_by=self.user).order_by(
+            '-id').values(*serializer.columns)
+        return serializer.to_representation(list(rows))
+
+    def test_list_parity(self):
+        """
+        Test list output matches RecipeSerializer
+        """
+        expected = RecipeSerializer(self._instances(), many=True).data
+
+        self.assertEqual(self._read(RecipeSerializer), expected)
+
+    def test_detail_parity(self):
+        """
+        Test detail output matches RecipeDetailSerializer
+        """
+        expected = RecipeDetailSerializer(self._instances(), many=True).data
+
+        self.assertEqual(self._read(RecipeDetailSerializer), expected)
+
+    def test_detail_parity_with_request(self):
+        """
+        Test image urls are absolute with a request in the context
+        """
+        context = {'request': self.request}
+        expected = RecipeDetailSerializer(
+            self._instances(), many=True, context=context).data
+
+        result = self._read(RecipeDetailSerializer, context=context)
+
+        self.assertEqual(result, expected)
+        self.assertTrue(result[0]['image'].startswith('http://testserver/'))
+        self.assertIsNone(result[1]['image'])
+
+    def test_sparse_fields_parity(self):
+        """
+        Test selected fields match RecipeSerializer with the same fields
+        """
+        fields = ['uuid', 'price', 'ingredients']
+        expected = RecipeSerializer(
+            self._instances(), many=True, context={'fields': fields}).data
+
+        self.assertEqual(self._read(RecipeSerializer, fields=fields), expected)
+
+    def test_json_types_parity(self):
+        """
+        Test values have the same python types, not only equal values
+        """
+        expected = RecipeDetailSerializer(self._instances(), many=True).data
+
+        for row, expected_row in zip(
+                self._read(RecipeDetailSerializer), expected):
+            self.assertEqual(
+                {name: type(value) for name, value in row.items()},
+                {name: type(value) for name, value in expected_row.items()})
+
+    def test_items_deleted_after_read(self):
+        """
+        Test ids of items deleted after the rows were read are skipped
+        """
+        serializer = RecipeReadSerializer(RecipeSerializer)
+        rows = list(Recipe.objects.filter(created_by=self.user).order_by(
+            '-id').values(*serializer.columns))
+        self.tags[0].delete()
+
+        result = serializer.to_representation(rows)
+
+        self.assertEqual(
+            [tag['name'] for tag in result[1]['tags']], ['Spicy', 'Quick'])
+
+
+class RecipeFastReadAPIParityTests(TestCase):
+    """
+    Test list and retrieve responses are the same with fast reads off
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        tag = create_tag(user=self.user, name='Vegan')
+        ingredient = create_ingredient(user=self.user, name='Rice')
+        for i in range(3):
+            recipe = create_recipe(user=self.user, title=f'Rice curry {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        self.recipe = recipe
+
+    def _get_both(self, url, params=None):
+        """
+        Return the response content with fast reads on and off
+        """
+        with override_settings(API_FAST_READ=True):
+            fast = self.client.get(url, params)
+        with override_settings(API_FAST_READ=False):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, slow.status_code)
+        return fast.content, slow.content
+
+    def test_list_parity(self):
+        """
+        Test list pages render the same json
+        """
+        for params in [
+            {},
+            {'page_size': 2},
+            {'search': 'curry', 'tags': 'vegan'},
+            {'fields': 'uuid,title,tags'},
+        ]:
+            fast, slow = self._get_both(RECIPES_URL, params)
+            self.assertEqual(fast, slow)
+
+    def test_retrieve_parity(self):
+        """
+        Test recipe detail renders the same json
+        """
+        fast, slow = self._get_both(detail_url(self.recipe.uuid))
+
+        self.assertEqual(fast, slow)
+
+    def test_retrieve_not_found(self):
+        """
+        Test unknown and invalid uuids are a 404 on the fast path
+        """
+        for lookup in ['00000000-0000-0000-0000-000000000000', 'invalid']:
+            fast, slow = self._get_both(detail_url(lookup))
+            self.assertEqual(fast, slow)
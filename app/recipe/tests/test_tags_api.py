@@ -1,9 +1,11 @@
 """
 Test for tag apis
 """
+from unittest import mock
 
-
-from django.test import TestCase
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework.test import APIClient
@@ -19,8 +21,10 @@ from core.tests.test_models import (
     create_user,
     create_tag,
 )
+from core.tests.test_query_budget import QueryBudgetMixin
 
 TAGS_URL = reverse('recipe:tag-list')
+SUGGEST_URL = reverse('recipe:tag-suggest')
 
 
 def detail_url(tag_uuid):
@@ -47,7 +51,7 @@ class PublicTagAPITests(TestCase):
         self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagAPITests(TestCase):
+class PrivateTagAPITests(QueryBudgetMixin, TestCase):
     """
     Test authenticated tag apis
     """
@@ -70,11 +74,11 @@ class PrivateTagAPITests(TestCase):
 
         result = self.client.get(TAGS_URL)
 
-        tags = Tag.objects.all().order_by('-name')
+        tags = Tag.objects.all().order_by('-name', '-id')
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
 
     def test_retrieve_user_limited_tag_list(self):
         """
@@ -86,18 +90,83 @@ class PrivateTagAPITests(TestCase):
             password='test2_password',
             name='Test Name 2'
         )
-        create_tag(self.user)
-        create_tag(self.user)
-        create_tag(self.other_user)
-        create_tag(self.other_user)
+        create_tag(self.user, name='First')
+        create_tag(self.user, name='Second')
+        create_tag(self.other_user, name='First')
+        create_tag(self.other_user, name='Second')
 
         result = self.client.get(TAGS_URL)
 
-        tags = Tag.objects.filter(created_by=self.user).order_by('-name')
+        tags = Tag.objects.filter(
+            created_by=self.user).order_by('-name', '-id')
+        serializer = TagSerializer(tags, many=True)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['results'], serializer.data)
+
+    def test_tag_list_paginated_by_name(self):
+        """
+        Test cursor pages follow name order
+        """
+        for name in ['Alpha', 'Beta', 'beta 2', 'Delta', 'Gamma']:
+            create_tag(user=self.user, name=name)
+
+        result = self.client.get(TAGS_URL, {'page_size': 2})
+        pages = [result.data['results']]
+        while result.data['next']:
+            result = self.client.get(result.data['next'])
+            pages.append(result.data['results'])
+
+        tags = Tag.objects.filter(
+            created_by=self.user).order_by('-name', '-id')
         serializer = TagSerializer(tags, many=True)
+        self.assertEqual(sum(pages, []), serializer.data)
+
+    def test_tag_list_sparse_fields(self):
+        """
+        Test cursor pages of selected fields take a single query
+        """
+        for name in ['Alpha', 'Beta', 'Gamma']:
+            create_tag(user=self.user, name=name)
+
+        with self.assertNumQueries(1):
+            result = self.client.get(
+                TAGS_URL, {'fields': 'uuid', 'page_size': 2})
+        with self.assertNumQueries(1):
+            next_page = self.client.get(result.data['next'])
+
+        tags = Tag.objects.filter(
+            created_by=self.user).order_by('-name', '-id')
+        self.assertEqual(
+            result.data['results'] + next_page.data['results'],
+            [{'uuid': str(tag.uuid)} for tag in tags])
+
+    def test_tag_list_query_count_flat(self):
+        """
+        Test listing tags costs one query for any tag count
+        """
+        def add_tags(count):
+            start = Tag.objects.count()
+            for i in range(count):
+                create_tag(user=self.user, name=f'Tag {start + i}')
+
+        result = self.assertQueriesFlat(
+            lambda: self.client.get(TAGS_URL), add_tags, budget=1)
+
+        self.assertEqual(len(result.data['results']), 10)
+
+    def test_patch_tag_query_budget(self):
+        """
+        Test updating a tag stays within its budget
+        """
+        tag = create_tag(user=self.user, name='Old')
+
+        # Two are the savepoint guarding the rename, which is only
+        # taken inside the test transaction
+        result = self.assertQueryBudget(
+            5, self.client.patch, detail_url(tag.uuid), {'name': 'New'})
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
 
     def test_patch_tag(self):
         """
@@ -141,6 +210,54 @@ class PrivateTagAPITests(TestCase):
         self.assertEqual(tag.created_by, self.user)
         self.assertEqual(tag.updated_by, self.user)
 
+    def test_patch_tag_duplicate_name(self):
+        """
+        Test renaming onto another tag name fails
+        """
+        create_tag(user=self.user, name='Breakfast')
+        tag = create_tag(user=self.user, name='Dinner')
+
+        url = detail_url(tag.uuid)
+        result = self.client.patch(url, {'name': 'breakfast'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dinner')
+
+    def test_patch_tag_duplicate_name_as_index_folds(self):
+        """
+        Test renames clash when lower() folds them like the unique index
+        """
+        create_tag(user=self.user, name='k')
+        tag = create_tag(user=self.user, name='Dinner')
+        kelvin = '\u212a'
+        clash = Tag.objects.annotate(name_key=Lower('name')).filter(
+            created_by=self.user, name_key=Lower(Value(kelvin))).exists()
+
+        result = self.client.patch(detail_url(tag.uuid), {'name': kelvin})
+
+        self.assertEqual(
+            result.status_code,
+            status.HTTP_400_BAD_REQUEST if clash else status.HTTP_200_OK)
+
+    def test_patch_tag_duplicate_name_race(self):
+        """
+        Test a rename passing the check but hitting the index fails
+        """
+        create_tag(user=self.user, name='Breakfast')
+        tag = create_tag(user=self.user, name='Dinner')
+
+        with mock.patch.object(
+                TagSerializer, 'validate_name', lambda self, value: value):
+            result = self.client.patch(
+                detail_url(tag.uuid), {'name': 'breakfast'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            result.data['name'], ['"breakfast" already exists.'])
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dinner')
+
     def test_put_tag_unsecssful(self):
         """
         Test tag update fail correctly for missing params
@@ -206,3 +323,70 @@ class PrivateTagAPITests(TestCase):
 
         self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Tag.objects.filter(uuid=tag.uuid).exists())
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class TagSuggestAPITests(TestCase):
+    """
+    Test tag suggest api
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='test_password',
+            name='Test Name'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_suggest_prefix_and_typo(self):
+        """
+        Test prefix matches come first and typos still match
+        """
+        for name in ['Chicken', 'Chickpea', 'Dinner', 'Quick chili']:
+            create_tag(user=self.user, name=name)
+        other_user = create_user(
+            email='test2@example.com',
+            password='test2_password',
+        )
+        create_tag(user=other_user, name='Chicory')
+
+        result = self.client.get(SUGGEST_URL, {'q': 'chi'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in result.data]
+        self.assertEqual(names[:2], ['Chicken', 'Chickpea'])
+        self.assertIn('Quick chili', names)
+        self.assertNotIn('Dinner', names)
+        self.assertNotIn('Chicory', names)
+
+        result = self.client.get(SUGGEST_URL, {'q': 'chiken', 'limit': 1})
+
+        self.assertEqual([tag['name'] for tag in result.data], ['Chicken'])
+
+    def test_suggest_cached(self):
+        """
+        Test repeated suggestions are served from the cache
+        """
+        create_tag(user=self.user, name='Chicken')
+        self.client.get(SUGGEST_URL, {'q': 'chi'})
+
+        with self.assertNumQueries(0):
+            result = self.client.get(SUGGEST_URL, {'q': 'CHI'})
+
+        self.assertEqual([tag['name'] for tag in result.data], ['Chicken'])
+
+    def test_suggest_invalid_params(self):
+        """
+        Test suggest requires a query and a bounded limit
+        """
+        result = self.client.get(SUGGEST_URL)
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+        result = self.client.get(SUGGEST_URL, {'q': 'chi', 'limit': 500})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,14 @@
 """
 Views for recipe apis
 """
+import uuid
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Prefetch, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Lower
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -14,40 +22,172 @@ from rest_framework import (
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.response import Response
 
+from core import metrics
+from core.cache import Cache
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from recipe import exports, serializers
+from recipe.pagination import (
+    RecipeCursorPagination,
+    NameCursorPagination,
+)
+
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma seperated list of fields to return'
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma seperated list of fields to leave out'
+    ),
+]
+
+
+class SparseFieldsMixin:
+    """
+    Mixin returning and selecting only the fields asked for
+
+    `sparse_required_fields` are model fields always loaded, such as the
+    pagination ordering.
+    """
+    sparse_required_fields = ()
+
+    def _get_field_list(self, param):
+        """
+        Split a comma separated query parameter into field names
+        """
+        value = self.request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def get_sparse_fields(self):
+        """
+        Return the selected serializer fields, None to return all
+        """
+        if self.request is None or self.request.method != 'GET':
+            return None
+        fields = self._get_field_list('fields')
+        omit = self._get_field_list('omit')
+        if not fields and not omit:
+            return None
+
+        available = self.get_serializer_class().Meta.fields
+        for param, names in [('fields', fields), ('omit', omit)]:
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                raise ValidationError({
+                    param: f'Unknown field "{unknown[0]}".'})
+        return [
+            name for name in available
+            if name in (fields or available) and name not in omit
+        ]
+
+    def apply_sparse_fields(self, queryset, prefetch=()):
+        """
+        Load only the selected columns and prefetch selected relations
+        """
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset.prefetch_related(*prefetch)
+
+        model_fields = {
+            field.name for field in queryset.model._meta.concrete_fields}
+        columns = [
+            name for name in fields + list(self.sparse_required_fields)
+            if name in model_fields
+        ]
+        return queryset.only(*columns).prefetch_related(*[
+            lookup for lookup in prefetch
+            if getattr(lookup, 'prefetch_to', lookup) in fields
+        ])
+
+    def get_serializer_context(self):
+        """
+        Pass the selected fields to the serializer
+        """
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Always use the first parser and renderer, for non DRF responses
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
 
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=SPARSE_FIELDS_PARAMETERS + [
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
-                description='Comma seperated list of tag uuid to filter'
+                description='Comma seperated list of tag uuid or name to '
+                            'filter'
             ),
             OpenApiParameter(
                 'ingredients',
                 OpenApiTypes.STR,
-                description='Comma seperated list of ingredient uuid to filter'
-            )
+                description='Comma seperated list of ingredient uuid or '
+                            'name to filter'
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full text search over title and description, '
+                            'results are ranked by relevance'
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Whether recipes need any (default) or all of '
+                            'the listed tags and ingredients'
+            ),
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """
     View to manage recipe apis
     """
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer(*Recipe.TRIGGER_MANAGED_FIELDS)
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    export_chunk_size = 2000
     lookup_field = "uuid"
+    # Most queries per action, including authentication, see
+    # core.middleware.QueryBudgetMiddleware. Exports stream their queries
+    # after the middleware returns and have no budget.
+    query_budget = {
+        'list': 6,
+        'retrieve': 4,
+        'create': 12,
+        'bulk': 14,
+        'update': 20,
+        'partial_update': 16,
+        'destroy': 8,
+        'upload_image': 6,
+    }
 
     def _get_item_list_from_string(self, query):
         """
@@ -55,36 +195,281 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         return [str(item) for item in query.split(',')]
 
+    def _get_item_ids(self, model, query):
+        """
+        Resolve comma separated uuids or names to the user's item ids
+
+        Items which do not exist resolve to None. Names match as folded
+        by the database's lower(), which can differ from str.lower().
+        """
+        keys, uuids, names = [], [], []
+        for item in self._get_item_list_from_string(query):
+            try:
+                key = str(uuid.UUID(item))
+                uuids.append(key)
+            except ValueError:
+                key = item.strip()
+                names.append(key)
+            keys.append(key)
+
+        items = model.objects.annotate(
+            name_key=Lower('name'),
+            input_names=RawSQL(
+                'array(SELECT input FROM unnest(%s::text[]) AS input '
+                f'WHERE lower(input) = lower("{model._meta.db_table}".name))',
+                [names]),
+        ).filter(
+            Q(uuid__in=uuids)
+            | Q(name_key__in=[Lower(Value(name)) for name in names]),
+            created_by=self.request.user,
+        ).values_list('id', 'uuid', 'input_names')
+        ids = {}
+        for item_id, item_uuid, input_names in items:
+            ids[str(item_uuid)] = item_id
+            for name in input_names:
+                ids[name] = item_id
+        return [ids.get(key) for key in keys]
+
+    def _filter_by_items(self, queryset, field, model, query, match):
+        """
+        Filter recipes on a GIN indexed array of linked item ids
+        """
+        item_ids = self._get_item_ids(model, query)
+        if match == 'all':
+            if None in item_ids:
+                return queryset.none()
+            return queryset.filter(**{f'{field}__contains': item_ids})
+        return queryset.filter(**{
+            f'{field}__overlap': [
+                item_id for item_id in item_ids if item_id is not None]
+        })
+
     def get_queryset(self):
         """
         Retrieve recipe of the user
         """
-        queryset = self.queryset
+        queryset = self.queryset.filter(created_by=self.request.user)
         if self.action == 'list':
             tags = self.request.query_params.get('tags')
             ingredients = self.request.query_params.get('ingredients')
+            match = self.request.query_params.get('match', 'any')
+            if match not in ('any', 'all'):
+                raise ValidationError(
+                    {'match': 'Must be one of "any" or "all".'})
             if tags:
-                tags_name_list = self._get_item_list_from_string(tags)
-                queryset = queryset.filter(
-                    tags__name__in=tags_name_list)
+                queryset = self._filter_by_items(
+                    queryset, 'tag_ids', Tag, tags, match)
             if ingredients:
-                ingredients_name_list = self._get_item_list_from_string(
-                    ingredients)
-                queryset = queryset.filter(
-                    ingredients__name__in=ingredients_name_list)
-            return queryset.filter(
-                created_by=self.request.user).order_by('-id')
-        return queryset.filter(
-                created_by=self.request.user).order_by(
-                    '-id').distinct().prefetch_related(
-                        'tags',
-                        'ingredients')
+                queryset = self._filter_by_items(
+                    queryset, 'ingredient_ids', Ingredient, ingredients,
+                    match)
+            search = self.request.query_params.get('search')
+            if search:
+                query = SearchQuery(
+                    search,
+                    config=Recipe.SEARCH_CONFIG,
+                    search_type='websearch',
+                )
+                # Cast the float4 rank so cursor positions round trip
+                queryset = queryset.annotate(rank=Cast(
+                    SearchRank(F('search_vector'), query),
+                    FloatField(),
+                )).filter(search_vector=query)
+        return self.apply_sparse_fields(
+            queryset.order_by(*self.get_keyset_ordering()),
+            prefetch=(
+                # Same id order as the fast read serializer
+                Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                Prefetch(
+                    'ingredients', queryset=Ingredient.objects.order_by('id')),
+            ),
+        )
+
+    def get_keyset_ordering(self):
+        """
+        Rank search results by relevance, otherwise newest first
+        """
+        if self.action == 'list' and self.request.query_params.get('search'):
+            return ('-rank', '-id')
+        return ('-id',)
+
+    def get_read_serializer(self):
+        """
+        Return the values() based serializer for list and retrieve
+        """
+        return serializers.RecipeReadSerializer(
+            self.get_serializer_class(),
+            fields=self.get_sparse_fields(),
+            context=self.get_serializer_context(),
+        )
+
+    def _get_values(self, queryset, serializer):
+        """
+        Return recipe rows holding the serializer and cursor columns
+        """
+        columns = ['id'] + serializer.columns
+        if 'rank' in queryset.query.annotations:
+            columns.append('rank')
+        return queryset.prefetch_related(None).values(*columns)
+
+    def list(self, request, *args, **kwargs):
+        """
+        List recipes without model instances when fast reads are on
+        """
+        if not settings.API_FAST_READ:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_read_serializer()
+        queryset = self._get_values(
+            self.filter_queryset(self.get_queryset()), serializer)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serializer.to_representation(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a recipe without a model instance when fast reads are on
+        """
+        if not settings.API_FAST_READ:
+            return super().retrieve(request, *args, **kwargs)
+
+        serializer = self.get_read_serializer()
+        queryset = self._get_values(
+            self.filter_queryset(self.get_queryset()), serializer)
+        row = get_object_or_404(
+            queryset, **{self.lookup_field: kwargs[self.lookup_field]})
+        self.check_object_permissions(request, row)
+        return Response(serializer.to_representation([row])[0])
+
+    @extend_schema(
+        parameters=SPARSE_FIELDS_PARAMETERS + [
+            OpenApiParameter(
+                'format',
+                OpenApiTypes.STR,
+                enum=['ndjson', 'csv'],
+                description='Export file format, ndjson (default) or csv'
+            ),
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR,
+                   (200, 'text/csv'): OpenApiTypes.STR},
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        content_negotiation_class=IgnoreClientContentNegotiation,
+    )
+    def export(self, request):
+        """
+        Stream every recipe of the user as NDJSON or CSV
+
+        Rows are read through a server side cursor and serialized a chunk
+        at a time, so memory does not grow with the number of recipes.
+        """
+        output = request.query_params.get('format', 'ndjson')
+        if output not in exports.EXPORTS:
+            raise ValidationError({
+                'format': f'Must be one of {", ".join(exports.EXPORTS)}.'})
+
+        serializer = self.get_read_serializer()
+        rows = self._get_values(self.get_queryset(), serializer).iterator(
+            chunk_size=self.export_chunk_size)
+        chunks = (
+            serializer.to_representation(chunk)
+            for chunk in exports.iter_chunks(rows, self.export_chunk_size)
+        )
+        content_type, export = exports.EXPORTS[output]
+        response = StreamingHttpResponse(
+            export(chunks, serializer.fields), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{output}"')
+        return response
+
+    @extend_schema(
+        request=serializers.RecipeSerializer(many=True),
+        parameters=[
+            OpenApiParameter(
+                'mode',
+                OpenApiTypes.STR,
+                enum=['atomic', 'partial'],
+                description='Create nothing if any recipe is invalid '
+                            '(atomic, default) or only the valid ones'
+            ),
+        ],
+        responses={
+            (201, 'application/json'): OpenApiTypes.OBJECT,
+            (207, 'application/json'): OpenApiTypes.OBJECT,
+            (400, 'application/json'): OpenApiTypes.OBJECT,
+        },
+    )
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """
+        Create many recipes at once, returning a result per recipe
+
+        Each result has the status the recipe would get from its own
+        POST, 201 with the recipe or 400 with its errors. Valid recipes
+        not created because another one failed in atomic mode get 424.
+        """
+        mode = request.query_params.get('mode', 'atomic')
+        if mode not in ('atomic', 'partial'):
+            raise ValidationError(
+                {'mode': 'Must be one of "atomic" or "partial".'})
+        if not isinstance(request.data, list):
+            raise ValidationError(
+                {'non_field_errors': ['Expected a list of recipes.']})
+        if len(request.data) > settings.API_MAX_BULK_SIZE:
+            raise ValidationError({'non_field_errors': [
+                f'At most {settings.API_MAX_BULK_SIZE} recipes per request.'
+            ]})
+
+        serializer = self.get_serializer(many=True)
+        valid, results = {}, {}
+        for index, item in enumerate(request.data):
+            try:
+                valid[index] = dict(
+                    serializer.child.run_validation(item),
+                    created_by=request.user,
+                )
+            except ValidationError as exc:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': exc.detail,
+                }
+
+        if results and mode == 'atomic':
+            for index in valid:
+                results[index] = {'status': status.HTTP_424_FAILED_DEPENDENCY}
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            recipes = serializer.create(list(valid.values()))
+            read_serializer = self.get_read_serializer()
+            rows = list(self._get_values(
+                Recipe.objects.filter(id__in=[
+                    recipe.id for recipe in recipes]),
+                read_serializer,
+            ))
+            data = dict(zip(
+                [row['id'] for row in rows],
+                read_serializer.to_representation(rows),
+            ))
+            for index, recipe in zip(valid, recipes):
+                results[index] = {
+                    'status': status.HTTP_201_CREATED,
+                    'data': data[recipe.id],
+                }
+            response_status = (
+                status.HTTP_207_MULTI_STATUS if len(valid) < len(results)
+                else status.HTTP_201_CREATED)
+
+        return Response(
+            {'results': [results[index] for index in sorted(results)]},
+            status=response_status,
+        )
 
     def get_serializer_class(self):
         """
         Return serializer class for request
         """
-        if self.action == 'list':
+        if self.action in ('list', 'bulk'):
             return serializers.RecipeSerializer
 
         elif self.action == 'upload_image':
@@ -114,12 +499,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             serializer.save()
+            metrics.IMAGE_UPLOAD_BYTES.observe(
+                serializer.validated_data['image'].size)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TagViewSet(mixins.DestroyModelMixin,
+NAMED_ITEM_QUERY_BUDGET = {
+    'list': 2,
+    'suggest': 3,
+    'update': 4,
+    'partial_update': 4,
+    'destroy': 5,
+}
+
+
+class SuggestMixin:
+    """
+    Mixin adding typo tolerant name suggestions to tags and ingredients
+    """
+    suggest_limit = 10
+    max_suggest_limit = 50
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='Partial or misspelled name to complete'
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of suggestions, at most 50'
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False)
+    def suggest(self, request):
+        """
+        Return the best matching names of the user
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        try:
+            limit = int(request.query_params.get('limit', self.suggest_limit))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= self.max_suggest_limit:
+            raise ValidationError({
+                'limit': f'Must be between 1 and {self.max_suggest_limit}.'})
+
+        model = self.queryset.model
+        cache = Cache(':'.join([
+            'suggest',
+            model._meta.model_name,
+            str(request.user.pk),
+            str(limit),
+            ','.join(self.get_sparse_fields() or []),
+            query.lower(),
+        ]))
+        data = cache.get()
+        if data is None:
+            items = model.objects.suggest(request.user, query, limit)
+            data = list(self.get_serializer(items, many=True).data)
+            cache.set(data, settings.SUGGEST_CACHE_TTL)
+        return Response(data)
+
+
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+)
+class TagViewSet(SparseFieldsMixin,
+                 SuggestMixin,
+                 mixins.DestroyModelMixin,
                  mixins.UpdateModelMixin,
                  mixins.ListModelMixin,
                  viewsets.GenericViewSet):
@@ -130,14 +586,17 @@ class TagViewSet(mixins.DestroyModelMixin,
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = NameCursorPagination
+    sparse_required_fields = ('name',)
     lookup_field = "uuid"
+    query_budget = NAMED_ITEM_QUERY_BUDGET
 
     def get_queryset(self):
         """
         Retrieve tags of the user
         """
-        return self.queryset.filter(
-            created_by=self.request.user).order_by('-name')
+        return self.apply_sparse_fields(self.queryset.filter(
+            created_by=self.request.user).order_by('-name', '-id'))
 
     def perform_update(self, serializer):
         """
@@ -146,7 +605,12 @@ class TagViewSet(mixins.DestroyModelMixin,
         serializer.save(updated_by=self.request.user)
 
 
-class IngredientViewSet(mixins.DestroyModelMixin,
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+)
+class IngredientViewSet(SparseFieldsMixin,
+                        SuggestMixin,
+                        mixins.DestroyModelMixin,
                         mixins.UpdateModelMixin,
                         mixins.ListModelMixin,
                         viewsets.GenericViewSet):
@@ -156,14 +620,17 @@ class IngredientViewSet(mixins.DestroyModelMixin,
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = NameCursorPagination
+    sparse_required_fields = ('name',)
     lookup_field = "uuid"
+    query_budget = NAMED_ITEM_QUERY_BUDGET
 
     def get_queryset(self):
         """
         Retrieve tags of the user
         """
-        return self.queryset.filter(
-            created_by=self.request.user).order_by('-name')
+        return self.apply_sparse_fields(self.queryset.filter(
+            created_by=self.request.user).order_by('-name', '-id'))
 
     def perform_update(self, serializer):
         """
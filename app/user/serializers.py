@@ -4,8 +4,10 @@ User api serializers
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from core.timing import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     User object serialzier
     """
@@ -28,10 +30,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
-
         if password:
-            user.set_password(password)
-            user.save()
+            # Hashed before the update so the user is saved once
+            instance.set_password(password)
 
-        return user
+        return super().update(instance, validated_data)
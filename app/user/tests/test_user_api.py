@@ -11,6 +11,7 @@ from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.tests.test_models import create_user
+from core.tests.test_query_budget import QueryBudgetMixin
 
 CREATE_USER_URL = reverse('user:create')
 JWT_TOKEN_CREATE_URL = reverse('user:token-create')
@@ -19,7 +20,7 @@ JWT_TOKEN_VERIFY_URL = reverse('user:token-verify')
 USER_URL = reverse('user:self')
 
 
-class PublicUserAPITests(TestCase):
+class PublicUserAPITests(QueryBudgetMixin, TestCase):
     """
     Test the public featuers of the user API.
     """
@@ -37,7 +38,8 @@ class PublicUserAPITests(TestCase):
             'name': 'Test',
         }
 
-        result = self.client.post(CREATE_USER_URL, payload)
+        result = self.assertQueryBudget(
+            2, self.client.post, CREATE_USER_URL, payload)
 
         self.assertEqual(result.status_code, status.HTTP_201_CREATED)
         user = get_user_model().objects.get(email=payload['email'])
@@ -89,7 +91,8 @@ class PublicUserAPITests(TestCase):
             'email': 'test@example.com',
             'password': 'test__pass'
         }
-        result = self.client.post(JWT_TOKEN_CREATE_URL, payload)
+        result = self.assertQueryBudget(
+            1, self.client.post, JWT_TOKEN_CREATE_URL, payload)
         self.assertIn('access', result.data)
         self.assertIn('refresh', result.data)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
@@ -184,7 +187,7 @@ class PublicUserAPITests(TestCase):
         self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateUserAPITests(TestCase):
+class PrivateUserAPITests(QueryBudgetMixin, TestCase):
     """
     Test authenticated apis
     """
@@ -202,7 +205,7 @@ class PrivateUserAPITests(TestCase):
         """
         Test retrieve self details
         """
-        result = self.client.get(USER_URL)
+        result = self.assertQueryBudget(0, self.client.get, USER_URL)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
         self.assertEqual(result.data, {
@@ -229,7 +232,8 @@ class PrivateUserAPITests(TestCase):
             'password': 'test__pass',
             'name': 'Updated Name'
         }
-        result = self.client.patch(USER_URL, payload)
+        result = self.assertQueryBudget(
+            1, self.client.patch, USER_URL, payload)
 
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password(payload['password']))
@@ -12,6 +12,7 @@ class CreateUserAPIView(generics.CreateAPIView):
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
 
 
 class RetrieveUpdateUserAPIView(generics.RetrieveUpdateAPIView):
@@ -20,6 +21,7 @@ class RetrieveUpdateUserAPIView(generics.RetrieveUpdateAPIView):
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
 
     def get_object(self):
         """
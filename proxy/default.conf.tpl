@@ -1,6 +1,15 @@
 server {
     listen ${LISTEN_PORT};
 
+    # Prometheus scrapes worker metrics through the proxy from the
+    # internal network only, the app checks the client address again
+    location = /metrics {
+        allow                   ${METRICS_ALLOWED_CIDR};
+        deny                    all;
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+    }
+
     location /static {
         alias /vol/static;
     }